@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .replicas import check_pin_cache
+        from .shards import reserve_ids
+        from .sqlite import configure_connection
+
+        check_pin_cache()
+
+        connection_created.connect(configure_connection)
+        post_migrate.connect(reserve_ids, sender=self)
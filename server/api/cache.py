@@ -0,0 +1,361 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+MISSING = object()
+
+
+class LRUCache:
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._data: OrderedDict[str, tuple[float, Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: str, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value, _ = entry
+            if expires_at and expires_at < time.monotonic():
+                self._pop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value, ttl: Optional[float] = None, size: int = 0):
+        ttl = self.ttl if ttl is None else ttl
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (time.monotonic() + ttl if ttl else 0.0, value, size)
+            self.bytes += size
+            while len(self._data) > self.max_size or (
+                self.max_bytes is not None and self.bytes > self.max_bytes
+            ):
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key: str):
+        with self._lock:
+            self._pop(key)
+
+    def delete_where(self, predicate: Callable[[str, Any], bool]):
+        with self._lock:
+            for key in [k for k, v in self._data.items() if predicate(k, v[1])]:
+                self._pop(key)
+
+    def items(self):
+        with self._lock:
+            return [(key, value) for key, (_, value, _) in self._data.items()]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def _pop(self, key: str):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class SharedBackend:
+    """Second-tier cache shared between workers, backed by a Django cache alias."""
+
+    def __init__(self, alias: str = "default", ttl: Optional[float] = None):
+        self.alias = alias
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key: str, default=MISSING):
+        value = self.cache.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value, ttl: Optional[float] = None):
+        self.cache.set(key, value, self.ttl if ttl is None else ttl)
+
+    def delete(self, key: str):
+        self.cache.delete(key)
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "alias": self.alias,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class ObjectCache:
+    def __init__(
+        self,
+        max_size: int = 4096,
+        ttl: Optional[float] = 300,
+        shared: Optional[dict] = None,
+        enabled: bool = True,
+    ):
+        self.enabled = enabled
+        self.local = LRUCache(max_size, ttl)
+        self.shared = None
+        if shared:
+            options = dict(shared)
+            backend = import_string(options.pop("BACKEND", "api.cache.SharedBackend"))
+            self.shared = backend(**{k.lower(): v for k, v in options.items()})
+
+    @staticmethod
+    def make_key(model, pk) -> str:
+        return f"object:{model._meta.db_table}:{model._meta.pk.to_python(pk)}"
+
+    def get(self, model, pk):
+        key = self.make_key(model, pk)
+        instance = self.local.get(key)
+        if instance is MISSING and self.shared is not None:
+            instance = self.shared.get(key)
+            if instance is not MISSING:
+                self.local.set(key, instance)
+        if instance is MISSING:
+            return MISSING
+        # Callers mutate and save what they get, so never hand out the cached copy.
+        return self.detach(instance)
+
+    @staticmethod
+    def detach(instance):
+        """A copy of `instance` that shares no mutable column values with it."""
+        instance = copy.copy(instance)
+        for field in instance._meta.concrete_fields:
+            value = instance.__dict__.get(field.attname)
+            if isinstance(value, (dict, list)):
+                instance.__dict__[field.attname] = copy.deepcopy(value)
+        return instance
+
+    def set(self, instance):
+        key = self.make_key(type(instance), instance.pk)
+        instance = self.detach(instance)
+        # Related rows are invalidated independently, so never cache them here.
+        instance._state.fields_cache = {}
+        self.local.set(key, instance)
+        if self.shared is not None:
+            self.shared.set(key, instance)
+
+    def delete(self, model, pk):
+        key = self.make_key(model, pk)
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "local": self.local.stats(),
+            "shared": self.shared.stats() if self.shared is not None else None,
+        }
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    last_modified: Optional[float]
+    tables: list[str]
+    created_at: float
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 16 * 1024 * 1024,
+        ttl: Optional[float] = 30,
+        enabled: bool = True,
+    ):
+        self.enabled = enabled
+        self.entries = LRUCache(max_entries, ttl, max_bytes)
+        # Bumped on every invalidation; a response computed across a bump may
+        # already be stale and must not be stored.
+        self.epoch = 0
+
+    def get(self, key: str):
+        return self.entries.get(key)
+
+    def set(
+        self,
+        key: str,
+        response: CachedResponse,
+        epoch: int,
+        ttl: Optional[float] = None,
+    ):
+        if epoch != self.epoch:
+            return
+        self.entries.set(key, response, ttl, size=len(response.body) + len(key))
+
+    def invalidate(self, table: str):
+        self.epoch += 1
+        self.entries.delete_where(lambda _, response: table in response.tables)
+
+    def clear(self):
+        self.epoch += 1
+        self.entries.clear()
+
+    def stats(self, limit: int = 100):
+        now = time.time()
+        return {
+            "enabled": self.enabled,
+            **self.entries.stats(),
+            "entries": [
+                {
+                    "key": key,
+                    "bytes": len(response.body),
+                    "age": round(now - response.created_at, 3),
+                    "tables": response.tables,
+                }
+                for key, response in reversed(self.entries.items()[-limit:])
+            ],
+        }
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Runs one computation per key at a time and shares its outcome.
+
+    Callers arriving while a computation for the same key is in flight block
+    until it finishes and receive its result, or re-raise its exception. Under
+    ASGI, Django runs sync views in per-request threads, so blocking here never
+    stalls the event loop.
+    """
+
+    def __init__(self, timeout: float = 10.0):
+        self.timeout = timeout
+        self.calls = 0
+        self.shared = 0
+        self.timeouts = 0
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not is_leader:
+            return self._wait(call)
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _wait(self, call: _Call):
+        if not call.done.wait(self.timeout):
+            self.timeouts += 1
+            raise TimeoutError("Timed out waiting for an in-flight computation.")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "shared": self.shared,
+            "timeouts": self.timeouts,
+        }
+
+
+def _build_object_cache():
+    options = getattr(settings, "OBJECT_CACHE", {})
+    return ObjectCache(
+        max_size=options.get("MAX_SIZE", 4096),
+        ttl=options.get("TTL", 300),
+        shared=options.get("SHARED"),
+        enabled=options.get("ENABLED", True),
+    )
+
+
+object_cache = _build_object_cache()
+
+
+def _build_response_cache():
+    options = getattr(settings, "RESPONSE_CACHE", {})
+    return ResponseCache(
+        max_entries=options.get("MAX_ENTRIES", 1024),
+        max_bytes=options.get("MAX_BYTES", 16 * 1024 * 1024),
+        ttl=options.get("TTL", 30),
+        enabled=options.get("ENABLED", True),
+    )
+
+
+response_cache = _build_response_cache()
+
+single_flight = SingleFlight(
+    getattr(settings, "RESPONSE_CACHE", {}).get("COALESCE_TIMEOUT", 10.0)
+)
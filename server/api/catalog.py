@@ -0,0 +1,420 @@
+import bisect
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Diet, Food, MealPlan, Nutrition, TableVersion
+
+logger = logging.getLogger("api.catalog")
+
+MAGIC = b"APICAT01"
+TABLES = [model._meta.db_table for model in (Food, Nutrition, Diet, MealPlan)]
+NUTRIENT_FIELDS = ("vitamins", "minerals", "amino_acids")
+
+# Strings are (offset, length) pairs into the string table. A food's flags mark
+# whether it has nutrition and, per nutrient field, whether the value is kept as
+# raw JSON text instead of in the matrix.
+FOOD = struct.Struct("<qq4d12IB")
+DIET = struct.Struct("<q8I")
+MEAL_PLAN = struct.Struct("<qqh2I")
+PK = struct.Struct("<q")
+_HEADER_LENGTH = struct.Struct("<I")
+
+HAS_NUTRITION = 1
+
+
+def _raw_flag(index: int) -> int:
+    return 2 << index
+
+
+def get_nutrient_names() -> dict[str, list[str]]:
+    # api.utils imports this module through the View base class.
+    from .utils.validators import AMINO_ACIDS, MINERALS, VITAMINS
+
+    return {"vitamins": VITAMINS, "minerals": MINERALS, "amino_acids": AMINO_ACIDS}
+
+
+class _StringTable:
+    def __init__(self):
+        self.parts: list[bytes] = []
+        self.size = 0
+
+    def add(self, value: Optional[str]) -> tuple[int, int]:
+        encoded = (value or "").encode()
+        offset = self.size
+        self.parts.append(encoded)
+        self.size += len(encoded)
+        return offset, len(encoded)
+
+
+def _to_row(text: str, names: list[str]) -> Optional[list[float]]:
+    """Matrix row for a nutrient JSON text, or None when the row could not
+    reproduce it exactly (unknown keys, another key order, non-float values)."""
+    try:
+        values = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(values, dict):
+        return None
+    if [name for name in names if name in values] != list(values):
+        return None
+    if not all(type(v) is float and not math.isnan(v) for v in values.values()):
+        return None
+    return [values.get(name, math.nan) for name in names]
+
+
+def build_catalog(path: str) -> dict:
+    """Writes the snapshot to `path` atomically and returns its header."""
+    from .serializers import DietSerializer
+    from .loader import Loader
+    from .utils import Fields, Lang
+
+    names = get_nutrient_names()
+    width = sum(len(i) for i in names.values())
+    strings = _StringTable()
+    foods = bytearray()
+    nutrients = bytearray()
+    diets = bytearray()
+    meal_plans = bytearray()
+
+    with transaction.atomic():
+        # Versions are read first: a write racing the build makes the snapshot
+        # look older than it is, never newer.
+        versions = {
+            table: version
+            for table, (version, _) in TableVersion.get_versions(TABLES).items()
+        }
+        for food in (
+            Food.objects.select_related("fk_nutrition")
+            .order_by("pk")
+            .iterator(chunk_size=2000)
+        ):
+            nutrition = food.fk_nutrition
+            flags, row, raw = 0, [], []
+            if nutrition is not None:
+                flags |= HAS_NUTRITION
+            for index, field in enumerate(NUTRIENT_FIELDS):
+                text = getattr(nutrition, field, None)
+                values = _to_row(text, names[field]) if text is not None else None
+                if values is None and nutrition is not None:
+                    flags |= _raw_flag(index)
+                    raw += strings.add(text)
+                else:
+                    raw += (0, 0)
+                row += values or [math.nan] * len(names[field])
+            foods += FOOD.pack(
+                food.food_id,
+                nutrition.nutrition_id if nutrition is not None else -1,
+                food.carbs,
+                food.protein,
+                food.fat,
+                food.calories,
+                *strings.add(food.name),
+                *strings.add(food.description),
+                *strings.add(food.photo_url),
+                *raw,
+                flags,
+            )
+            nutrients += struct.pack(f"<{width}d", *row)
+
+        loader = Loader()
+        lang = Lang("us")
+        all_diets = list(Diet.objects.order_by("pk"))
+        for i in range(0, len(all_diets), 500):
+            batch = all_diets[i : i + 500]
+            DietSerializer.prime(loader, batch, Fields())
+            for diet in batch:
+                intake = DietSerializer(lang, diet, loader)._get_average_intake(diet)
+                diets += DIET.pack(
+                    diet.diet_id,
+                    *strings.add(diet.name),
+                    *strings.add(diet.description),
+                    *strings.add(diet.photo_url),
+                    *strings.add(json.dumps(intake)),
+                )
+            loader = Loader()  # keep memory flat on large catalogs
+
+        for plan in MealPlan.objects.order_by("pk").iterator(chunk_size=2000):
+            meal_plans += MEAL_PLAN.pack(
+                plan.meal_plan_id, plan.fk_diet_id, plan.time, *strings.add(plan.foods)
+            )
+
+    header = {
+        "built_at": time.time(),
+        "versions": versions,
+        "nutrients": names,
+        "counts": {
+            "foods": len(foods) // FOOD.size,
+            "diets": len(diets) // DIET.size,
+            "meal_plans": len(meal_plans) // MEAL_PLAN.size,
+        },
+    }
+    sections = [
+        ("foods", foods),
+        ("nutrients", nutrients),
+        ("diets", diets),
+        ("meal_plans", meal_plans),
+        ("strings", b"".join(strings.parts)),
+    ]
+    # Offsets are relative to the first section, which starts after the header.
+    offset, header["sections"] = 0, {}
+    for name, data in sections:
+        header["sections"][name] = [offset, len(data)]
+        offset = _align(offset + len(data))
+    encoded = json.dumps(header).encode()
+    base = _align(len(MAGIC) + _HEADER_LENGTH.size + len(encoded))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile("wb", dir=directory, delete=False) as file:
+        file.write(MAGIC + _HEADER_LENGTH.pack(len(encoded)) + encoded)
+        for name, data in sections:
+            file.seek(base + header["sections"][name][0])
+            file.write(data)
+        file.truncate(base + offset)
+    os.chmod(file.name, 0o644)  # workers may run as another user
+    os.replace(file.name, path)
+    return header
+
+
+def _align(offset: int) -> int:
+    return offset + (-offset % 8)
+
+
+class _Ids:
+    """Sequence view of the sorted primary keys of a record section."""
+
+    def __init__(self, data, offset: int, count: int, size: int):
+        self.data, self.offset, self.count, self.size = data, offset, count, size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index: int) -> int:
+        return PK.unpack_from(self.data, self.offset + index * self.size)[0]
+
+
+class Catalog:
+    """Read-only, memory-mapped snapshot of foods, nutrition, diets and meal plans.
+
+    Records are fixed width and sorted by primary key, so lookups are binary
+    searches over the mapping and pages are plain slices. Rows come back as
+    unsaved model instances with their relations already attached.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self.mtime = os.fstat(file.fileno()).st_mtime
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        (length,) = _HEADER_LENGTH.unpack_from(self._map, len(MAGIC))
+        start = len(MAGIC) + _HEADER_LENGTH.size
+        self.header = json.loads(self._map[start : start + length])
+        base = _align(start + length)
+        self.versions: dict[str, int] = self.header["versions"]
+        self.counts: dict[str, int] = self.header["counts"]
+        self._sections = {
+            name: [base + offset, size]
+            for name, (offset, size) in self.header["sections"].items()
+        }
+        self._names: dict[str, list[str]] = self.header["nutrients"]
+        self._width = sum(len(i) for i in self._names.values())
+        self._ids = {
+            "foods": self._get_ids("foods", FOOD),
+            "diets": self._get_ids("diets", DIET),
+            "meal_plans": self._get_ids("meal_plans", MEAL_PLAN),
+        }
+
+    def _get_ids(self, section: str, record: struct.Struct) -> _Ids:
+        return _Ids(
+            self._map, self._sections[section][0], self.counts[section], record.size
+        )
+
+    def is_current(self, versions: dict[str, int], tables: list[str]) -> bool:
+        return all(versions.get(t, 0) == self.versions.get(t, 0) for t in tables)
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._sections["strings"][0] + offset
+        return self._map[start : start + length].decode()
+
+    def _find(self, section: str, pk) -> Optional[int]:
+        ids = self._ids[section]
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            return None
+        index = bisect.bisect_left(ids, pk)
+        return index if index < len(ids) and ids[index] == pk else None
+
+    def _food(self, index: int) -> Food:
+        fields = FOOD.unpack_from(
+            self._map, self._sections["foods"][0] + index * FOOD.size
+        )
+        food_id, nutrition_id, carbs, protein, fat, calories = fields[:6]
+        strings = fields[6:18]
+        flags = fields[18]
+        food = Food(
+            food_id=food_id,
+            name=self._string(*strings[0:2]),
+            description=self._string(*strings[2:4]),
+            photo_url=self._string(*strings[4:6]),
+            carbs=carbs,
+            protein=protein,
+            fat=fat,
+            calories=calories,
+            fk_nutrition_id=nutrition_id if flags & HAS_NUTRITION else None,
+        )
+        nutrition = None
+        if flags & HAS_NUTRITION:
+            row = struct.unpack_from(
+                f"<{self._width}d",
+                self._map,
+                self._sections["nutrients"][0] + index * self._width * 8,
+            )
+            values, start = {}, 0
+            for i, field in enumerate(NUTRIENT_FIELDS):
+                names = self._names[field]
+                if flags & _raw_flag(i):
+                    values[field] = self._string(*strings[6 + 2 * i : 8 + 2 * i])
+                else:
+                    values[field] = json.dumps(
+                        {
+                            name: value
+                            for name, value in zip(
+                                names, row[start : start + len(names)]
+                            )
+                            if not math.isnan(value)
+                        }
+                    )
+                start += len(names)
+            nutrition = _loaded(Nutrition(nutrition_id=nutrition_id, **values))
+        Food.fk_nutrition.field.set_cached_value(food, nutrition)
+        return _loaded(food)
+
+    def _diet(self, index: int) -> Diet:
+        fields = DIET.unpack_from(
+            self._map, self._sections["diets"][0] + index * DIET.size
+        )
+        return _loaded(
+            Diet(
+                diet_id=fields[0],
+                name=self._string(*fields[1:3]),
+                description=self._string(*fields[3:5]),
+                photo_url=self._string(*fields[5:7]),
+            )
+        )
+
+    def _meal_plan(self, index: int) -> MealPlan:
+        fields = MEAL_PLAN.unpack_from(
+            self._map, self._sections["meal_plans"][0] + index * MEAL_PLAN.size
+        )
+        meal_plan = MealPlan(
+            meal_plan_id=fields[0],
+            fk_diet_id=fields[1],
+            time=fields[2],
+            foods=self._string(*fields[3:5]),
+        )
+        diet = self.get(Diet, fields[1])
+        MealPlan.fk_diet.field.set_cached_value(meal_plan, diet)
+        return _loaded(meal_plan)
+
+    def get(self, model, pk):
+        section, read = self._readers[model]
+        index = self._find(section, pk)
+        return None if index is None else read(self, index)
+
+    def page(self, model, offset: int, size: int) -> list:
+        section, read = self._readers[model]
+        end = min(self.counts[section], offset + size)
+        return [read(self, index) for index in range(max(0, offset), end)]
+
+    def count(self, model) -> int:
+        return self.counts[self._readers[model][0]]
+
+    def get_average_intake(self, diet_id) -> Optional[dict]:
+        index = self._find("diets", diet_id)
+        if index is None:
+            return None
+        fields = DIET.unpack_from(
+            self._map, self._sections["diets"][0] + index * DIET.size
+        )
+        return json.loads(self._string(*fields[7:9]))
+
+    _readers = {
+        Food: ("foods", _food),
+        Diet: ("diets", _diet),
+        MealPlan: ("meal_plans", _meal_plan),
+    }
+
+    def covers(self, model) -> bool:
+        return model in self._readers
+
+
+def _loaded(instance):
+    instance._state.adding = False
+    instance._state.db = "default"
+    return instance
+
+
+class CatalogFile:
+    """The configured snapshot, re-opened when the file on disk is replaced."""
+
+    def __init__(self, path: Optional[str], check_interval: float = 5.0):
+        self.check_interval = check_interval
+        self._checked_at = 0.0
+        self.load(path)
+
+    def load(self, path: Optional[str]):
+        self.path = path
+        self._catalog: Optional[Catalog] = None
+        if path:
+            self._open()
+
+    def _open(self):
+        self._checked_at = time.monotonic()
+        try:
+            self._catalog = Catalog(self.path)  # type: ignore
+        except (OSError, ValueError):
+            logger.warning("Catalog snapshot %s could not be loaded", self.path)
+            self._catalog = None
+
+    def get(self, versions: dict[str, int], tables: list[str]) -> Optional[Catalog]:
+        """The snapshot when it is current for `tables`, else None."""
+        if not self.path:
+            return None
+        catalog = self._catalog
+        if catalog is not None and catalog.is_current(versions, tables):
+            return catalog
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return None
+        # Stale or missing: a newer build may have replaced the file.
+        self._checked_at = time.monotonic()
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return None
+        if catalog is None or mtime != catalog.mtime:
+            self._open()
+            catalog = self._catalog
+        if catalog is not None and catalog.is_current(versions, tables):
+            return catalog
+        return None
+
+
+def _build_catalog_file():
+    options = getattr(settings, "CATALOG", {})
+    return CatalogFile(options.get("PATH"), options.get("CHECK_INTERVAL", 5.0))
+
+
+catalog_file = _build_catalog_file()
@@ -0,0 +1,129 @@
+from collections import defaultdict
+from typing import Callable, Iterable
+
+from .models import Food, MealPlan, Profile, Submission
+
+# Relations fetched together with a batch of rows, so serializing them later
+# does not issue one query per row.
+SELECT_RELATED = {
+    Food: ["fk_nutrition"],
+    MealPlan: ["fk_diet"],
+    Profile: ["fk_user", "fk_nutrition"],
+    Submission: ["fk_user"],
+}
+
+BATCH_SIZE = 500
+
+
+class Loader:
+    """Request-scoped identity map that batches primary-key and foreign-key lookups.
+
+    Ids are queued with `prime`/`prime_children` while walking a page of results
+    and fetched with one query per model on the first `load`. Computed nested
+    payloads can be shared through `memo` for the lifetime of the loader.
+    """
+
+    def __init__(self):
+        self._objects: dict[type, dict] = defaultdict(dict)
+        self._pending: dict[type, set] = defaultdict(set)
+        self._children: dict[tuple[type, str], dict] = defaultdict(dict)
+        self._pending_children: dict[tuple[type, str], set] = defaultdict(set)
+        self._memo = {}
+        self.queries = 0
+        # Set by views when the catalog snapshot is current; models it covers
+        # are then read from it instead of the database.
+        self.catalog = None
+
+    @staticmethod
+    def _to_pk(model, pk):
+        return model._meta.pk.to_python(pk)
+
+    def add(self, instances: Iterable):
+        for instance in instances:
+            self._objects[type(instance)][instance.pk] = instance
+
+    def prime(self, model, pks: Iterable):
+        loaded = self._objects[model]
+        for pk in pks:
+            if pk is None:
+                continue
+            pk = self._to_pk(model, pk)
+            if pk not in loaded:
+                self._pending[model].add(pk)
+
+    def load(self, model, pk):
+        if pk is None:
+            return None
+        pk = self._to_pk(model, pk)
+        if pk not in self._objects[model]:
+            self._pending[model].add(pk)
+            self._flush(model)
+        return self._objects[model].get(pk)
+
+    def load_many(self, model, pks: Iterable) -> list:
+        pks = [self._to_pk(model, pk) for pk in pks]
+        self.prime(model, pks)
+        self._flush(model)
+        return [self._objects[model].get(pk) for pk in pks]
+
+    def get_related(self, instance, name: str):
+        field = instance._meta.get_field(name)
+        if field.is_cached(instance):
+            return getattr(instance, name)
+        related = self.load(field.related_model, getattr(instance, field.attname))
+        if related is not None:
+            field.set_cached_value(instance, related)
+        return related
+
+    def prime_related(self, instances: Iterable, *names: str):
+        for instance in instances:
+            for name in names:
+                field = instance._meta.get_field(name)
+                if not field.is_cached(instance):
+                    self.prime(field.related_model, [getattr(instance, field.attname)])
+
+    def prime_children(self, model, field: str, values: Iterable):
+        loaded = self._children[(model, field)]
+        self._pending_children[(model, field)].update(
+            value for value in values if value not in loaded
+        )
+
+    def children(self, model, field: str, value) -> list:
+        key = (model, field)
+        if value not in self._children[key]:
+            self._pending_children[key].add(value)
+            self._flush_children(model, field)
+        return self._children[key].get(value, [])
+
+    def memo(self, key, fn: Callable):
+        if key not in self._memo:
+            self._memo[key] = fn()
+        return self._memo[key]
+
+    def _flush(self, model):
+        pending = list(self._pending.pop(model, ()))
+        if self.catalog is not None and self.catalog.covers(model):
+            for pk in pending:
+                self._objects[model][pk] = self.catalog.get(model, pk)
+            return
+        queryset = model.objects.select_related(*SELECT_RELATED.get(model, []))
+        for i in range(0, len(pending), BATCH_SIZE):
+            batch = pending[i : i + BATCH_SIZE]
+            found = queryset.in_bulk(batch)
+            self.queries += 1
+            for pk in batch:
+                self._objects[model][pk] = found.get(pk)
+
+    def _flush_children(self, model, field: str):
+        key = (model, field)
+        pending = list(self._pending_children.pop(key, ()))
+        queryset = model.objects.select_related(*SELECT_RELATED.get(model, []))
+        attname = model._meta.get_field(field).attname
+        for i in range(0, len(pending), BATCH_SIZE):
+            batch = pending[i : i + BATCH_SIZE]
+            grouped = {value: [] for value in batch}
+            for child in queryset.filter(**{f"{attname}__in": batch}).order_by("pk"):
+                grouped[getattr(child, attname)].append(child)
+                self._objects[model][child.pk] = child
+            self.queries += 1
+            self._children[key].update(grouped)
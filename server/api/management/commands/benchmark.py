@@ -0,0 +1,603 @@
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+
+from api.cache import object_cache, response_cache
+from api.models import Diet, Food, MealPlan, Nutrition, Profile, Submission, User
+from api.replicas import get_aliases, sync_replica
+from api.utils import Password, View, transform_name
+
+PASSWORD = "Bench-Passw0rd!x"
+LANGS = ["us", "ua"]
+RESOURCES = ["users", "profiles", "diets", "meal_plans", "submissions", "foods"]
+
+
+def get_all_routes() -> set[str]:
+    import api.views  # noqa: F401  (registers the View subclasses)
+
+    return {
+        " ".join(transform_name(name)).replace(" ", f" {cls._get_prefix()}/")
+        for cls in View.__subclasses__()
+        for name, _ in cls._get_locals()
+    }
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def summarize(latencies: list[float], statuses: Counter, seconds: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "throughput": round(len(latencies) / seconds, 2) if seconds else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "errors": sum(n for status, n in statuses.items() if status >= 500),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+
+class Fixture:
+    """Ids of the rows seeded for a run, shared read-only between workers."""
+
+    def __init__(self, scale: int):
+        self.scale = scale
+        self.food_ids: list[int] = []
+        self.diet_ids: list[int] = []
+        self.meal_plan_ids: list[int] = []
+        self.submission_ids: list[int] = []
+        self.user_ids: list[str] = []
+        self.tokens: dict[str, str] = {}
+        self.backup = ""
+
+    def seed(self, rng: random.Random):
+        password = Password.encrypt(PASSWORD).decode()
+        users = [
+            User(
+                user_id=f"bench{i}",
+                email=f"bench{i}@example.com",
+                password=password,
+                first_name="Bench",
+                last_name=str(i),
+                date_of_birth="1990-01-01",
+                role=2 if i == 0 else 1 if i == 1 else 0,
+            )
+            for i in range(max(3, self.scale))
+        ]
+        User.objects.bulk_create(users)
+        self.user_ids = [user.user_id for user in users]
+        self.tokens = {"admin": users[0].token, "manager": users[1].token}
+        Profile.objects.bulk_create([Profile(fk_user=user) for user in users])
+
+        nutrition = Nutrition.objects.bulk_create(
+            [
+                Nutrition(
+                    vitamins=json.dumps({"vitamin_c": rng.random()}),
+                    minerals=json.dumps({"iron": rng.random()}),
+                    amino_acids=json.dumps({"alanine": rng.random()}),
+                )
+                for _ in range(self.scale * 4)
+            ]
+        )
+        foods = Food.objects.bulk_create(
+            [
+                Food(
+                    name=f"Food {i}",
+                    description="",
+                    photo_url="https://example.com/food.png",
+                    carbs=rng.uniform(0, 50),
+                    protein=rng.uniform(0, 30),
+                    fat=rng.uniform(0, 30),
+                    calories=rng.uniform(20, 600),
+                    fk_nutrition=item,
+                )
+                for i, item in enumerate(nutrition)
+            ]
+        )
+        self.food_ids = [food.pk for food in foods]
+        diets = Diet.objects.bulk_create(
+            [
+                Diet(name=f"Diet {i}", photo_url="https://example.com/diet.png")
+                for i in range(max(1, self.scale // 2))
+            ]
+        )
+        self.diet_ids = [diet.pk for diet in diets]
+        meal_plans = MealPlan.objects.bulk_create(
+            [
+                MealPlan(
+                    fk_diet=rng.choice(diets),
+                    time=rng.randrange(4),
+                    foods=",".join(map(str, rng.sample(self.food_ids, 4))),
+                )
+                for _ in range(self.scale * 2)
+            ]
+        )
+        self.meal_plan_ids = [meal_plan.pk for meal_plan in meal_plans]
+        submissions = Submission.objects.bulk_create(
+            [
+                Submission(note=f"Note {i}", fk_user=rng.choice(users))
+                for i in range(self.scale)
+            ]
+        )
+        self.submission_ids = [submission.pk for submission in submissions]
+
+        # Replicas, if configured, need the rows before the first read.
+        for alias in get_aliases():
+            sync_replica(alias)
+        response = Client().get(
+            "/api/us/system/backup/@diets", HTTP_AUTHORIZATION=self.tokens["admin"]
+        )
+        self.backup = response.content.decode()
+
+
+class Session:
+    """One benchmark worker: its own client, random stream and results."""
+
+    def __init__(self, fixture: Fixture, rng: random.Random, index: int):
+        self.fixture = fixture
+        self.rng = rng
+        self.index = index
+        # One address per worker, like separate clients (replica pins use it).
+        self.client = Client(
+            raise_request_exception=False,
+            REMOTE_ADDR=f"10.0.{index // 256}.{index % 256}",
+        )
+        self.latencies: list[float] = []
+        self.statuses: Counter[int] = Counter()
+        self.routes: dict[str, list[float]] = defaultdict(list)
+        self.route_statuses: dict[str, Counter[int]] = defaultdict(Counter)
+        self.counter = 0
+
+    def request(
+        self,
+        route: str,
+        path: str,
+        body: Optional[dict] = None,
+        user: Optional[str] = None,
+    ):
+        method = route.split(" ")[0]
+        headers = {}
+        if user is not None:
+            headers["HTTP_AUTHORIZATION"] = self.fixture.tokens[user]
+        url = f"/api/{self.rng.choice(LANGS)}/{path}"
+        start = time.perf_counter()
+        if method == "POST":
+            response = self.client.post(
+                url, body or {}, content_type="application/json", **headers
+            )
+        elif method == "DELETE":
+            response = self.client.delete(url, **headers)
+        else:
+            response = self.client.get(url, **headers)
+        elapsed = time.perf_counter() - start
+        self.latencies.append(elapsed)
+        self.routes[route].append(elapsed)
+        self.statuses[response.status_code] += 1
+        self.route_statuses[route][response.status_code] += 1
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    def unique(self, prefix: str) -> str:
+        self.counter += 1
+        return f"{prefix}{self.index}x{self.counter}"
+
+    def ids(self, values: list, count: int) -> str:
+        return ",".join(map(str, self.rng.sample(values, min(count, len(values)))))
+
+    def page(self) -> str:
+        return f"{self.rng.randrange(5)}:{self.rng.choice([10, 20, 50])}"
+
+
+def browse_foods(s: Session):
+    f = s.fixture
+    s.request("GET food/all", f"food/all/@{s.page()}")
+    s.request("GET food/query", f"food/query/@{s.rng.choice(f.food_ids)}")
+    s.request("GET food/many", f"food/many/@{s.ids(f.food_ids, 10)}")
+    s.request(
+        "GET food/all",
+        "food/all/@0:20?filter=calories:lt:300&order=-calories&fields=food_id,name",
+    )
+
+
+def browse_diets(s: Session):
+    f = s.fixture
+    s.request("GET diet/all", f"diet/all/@{s.page()}")
+    s.request("GET diet/query", f"diet/query/@{s.rng.choice(f.diet_ids)}")
+    s.request("GET diet/many", f"diet/many/@{s.ids(f.diet_ids, 5)}")
+    s.request("GET mealplan/all", f"mealplan/all/@{s.page()}")
+    s.request("GET mealplan/query", f"mealplan/query/@{s.rng.choice(f.meal_plan_ids)}")
+    s.request("GET mealplan/many", f"mealplan/many/@{s.ids(f.meal_plan_ids, 10)}")
+
+
+def browse_users(s: Session):
+    f = s.fixture
+    s.request("GET account/all", f"account/all/@{s.page()}")
+    s.request("GET account/query", f"account/query/@{s.rng.choice(f.user_ids)}")
+    s.request("GET account/many", f"account/many/@{s.ids(f.user_ids, 10)}")
+    s.request("GET account/profile", f"account/profile/@{s.rng.choice(f.user_ids)}")
+    s.request("GET submission/all", f"submission/all/@{s.page()}")
+    s.request(
+        "GET submission/query", f"submission/query/@{s.rng.choice(f.submission_ids)}"
+    )
+    s.request("GET submission/many", f"submission/many/@{s.ids(f.submission_ids, 10)}")
+
+
+def login(s: Session):
+    password = PASSWORD if s.rng.random() < 0.9 else "Wrong-Passw0rd!x"
+    user_id = s.rng.choice(s.fixture.user_ids)
+    s.request(
+        "POST account/login",
+        "account/login",
+        {"user_id": user_id, "password": password},
+    )
+
+
+def register(s: Session):
+    user_id = s.unique("r")
+    s.request(
+        "POST account/register",
+        "account/register",
+        {
+            "user_id": user_id,
+            "password": PASSWORD,
+            "email": f"{user_id}@example.com",
+            "first_name": "Bench",
+            "last_name": "User",
+            "date_of_birth": "1990-01-01",
+        },
+    )
+
+
+def iot_update(s: Session):
+    s.request(
+        "POST iot/update",
+        "iot/update",
+        {
+            "user_id": s.rng.choice(s.fixture.user_ids),
+            "blood_pressure": s.rng.randint(90, 140),
+            "heart_rate": s.rng.randint(50, 120),
+            "oxygen_level": s.rng.randint(90, 100),
+        },
+    )
+
+
+def backup_and_rollback(s: Session):
+    s.request(
+        "GET system/backup", f"system/backup/@{s.rng.choice(RESOURCES)}", user="admin"
+    )
+    s.request(
+        "POST system/rollback",
+        "system/rollback",
+        {"resource": "diets", "data": s.fixture.backup},
+        user="admin",
+    )
+
+
+def edit_catalog(s: Session):
+    f = s.fixture
+    food = s.request(
+        "POST food/create",
+        "food/create",
+        {
+            "name": s.unique("f")[:32],
+            "description": "",
+            "photo_url": "https://example.com/food.png",
+            "carbs": "1",
+            "protein": "2",
+            "fat": "3",
+            "calories": "4",
+            "vitamins": {"vitamin_c": 1.0},
+            "minerals": {"iron": 1.0},
+            "amino_acids": {"alanine": 1.0},
+        },
+        user="manager",
+    )
+    food_id = (food or {}).get("food_id", 0)
+    s.request(
+        "POST food/edit", "food/edit", {"food_id": food_id, "fat": "2"}, user="manager"
+    )
+    diet = s.request(
+        "POST diet/create",
+        "diet/create",
+        {"name": s.unique("d")[:32], "description": "", "photo_url": "https://x"},
+        user="manager",
+    )
+    diet_id = (diet or {}).get("diet_id", 0)
+    s.request(
+        "POST diet/edit",
+        "diet/edit",
+        {"diet_id": diet_id, "name": "Edited"},
+        user="manager",
+    )
+    meal_plan = s.request(
+        "POST mealplan/create",
+        "mealplan/create",
+        {"time": 0, "diet_id": diet_id, "foods": s.ids(f.food_ids, 3)},
+        user="manager",
+    )
+    s.request(
+        "DELETE mealplan/delete",
+        f"mealplan/delete/@{(meal_plan or {}).get('meal_plan_id', 0)}",
+    )
+    s.request("DELETE food/delete", f"food/delete/@{food_id}", user="manager")
+    s.request("DELETE diet/delete", f"diet/delete/@{diet_id}", user="manager")
+    s.request("POST food/bulk_delete", "food/bulk_delete", {"ids": [0]}, user="manager")
+    s.request("POST diet/bulk_delete", "diet/bulk_delete", {"ids": [0]}, user="manager")
+
+
+def review(s: Session):
+    submission = s.request(
+        "POST submission/create", "submission/create", {"note": "Bench"}, user="manager"
+    )
+    submission_id = (submission or {}).get("submission_id", 0)
+    s.request("GET submission/queue", "submission/queue/@0:20", user="manager")
+    s.request("POST submission/claim", "submission/claim", {"count": 1}, user="manager")
+    s.request(
+        "DELETE submission/claim", f"submission/claim/@{submission_id}", user="manager"
+    )
+    s.request(
+        "POST submission/edit",
+        "submission/edit",
+        {"submission_id": submission_id, "is_accepted": "true"},
+        user="manager",
+    )
+    s.request(
+        "DELETE submission/delete",
+        f"submission/delete/@{submission_id}",
+        user="manager",
+    )
+
+
+def manage_accounts(s: Session):
+    s.request(
+        "POST account/edit",
+        "account/edit",
+        {"user_id": "bench1", "last_name": "Manager"},
+        user="manager",
+    )
+    s.request("DELETE account/delete", "account/delete/@nobody", user="admin")
+    s.request(
+        "POST account/bulk_delete",
+        "account/bulk_delete",
+        {"ids": ["nobody"]},
+        user="admin",
+    )
+
+
+def administer(s: Session):
+    s.request(
+        "POST system/batch",
+        "system/batch",
+        {"operations": [{"route": "submission/create", "body": {"note": "Batch"}}]},
+        user="admin",
+    )
+    s.request("GET system/cache", "system/cache", user="admin")
+    s.request("DELETE system/cache", "system/cache/@responses", user="admin")
+    s.request("GET system/vitals", "system/vitals", user="admin")
+    s.request("GET system/metrics", "system/metrics", user="admin")
+    s.request("GET system/profiles", "system/profiles", user="admin")
+    s.request("GET system/profile", "system/profile/@missing", user="admin")
+
+
+# Each scenario is a weighted mix of operations; an operation may issue several
+# requests. "mixed" touches every route at least once per few iterations.
+SCENARIOS: dict[str, list[tuple[int, Callable[[Session], None]]]] = {
+    "catalog": [(6, browse_foods), (3, browse_diets), (1, browse_users)],
+    "login": [(9, login), (1, register)],
+    "iot": [(1, iot_update)],
+    # Readers and writers on the same tables; compare SQLITE_PROFILE values.
+    "contention": [(2, iot_update), (2, browse_foods), (1, browse_diets)],
+    "backup": [(1, backup_and_rollback)],
+    "mixed": [
+        (4, browse_foods),
+        (3, browse_diets),
+        (2, browse_users),
+        (2, login),
+        (1, register),
+        (3, iot_update),
+        (1, backup_and_rollback),
+        (1, edit_catalog),
+        (1, review),
+        (1, manage_accounts),
+        (1, administer),
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs reproducible load scenarios against every API route on a fresh "
+        "SQLite database and reports throughput and latency percentiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "scenarios",
+            nargs="*",
+            default=list(SCENARIOS),
+            help=f"Scenarios to run (default: all of {', '.join(SCENARIOS)}).",
+        )
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--scale", type=int, default=100)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write results to this JSON file.")
+        parser.add_argument("--compare", help="JSON results of an earlier run.")
+        parser.add_argument(
+            "--sync-interval",
+            type=float,
+            default=1.0,
+            help="Seconds between replica syncs when SQLITE_REPLICAS is set.",
+        )
+        parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="Disable the object and response caches for the run.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The benchmark runs against SQLite only.")
+        scenarios = options["scenarios"]
+        unknown = [name for name in scenarios if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(
+                f"Unknown scenarios {', '.join(unknown)}; "
+                f"choose from {', '.join(SCENARIOS)}."
+            )
+
+        path = tempfile.NamedTemporaryFile(suffix=".sqlite3", delete=False).name
+        settings.DATABASES["default"].setdefault("TEST", {})["NAME"] = path
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        object_cache.enabled = response_cache.enabled = not options["no_cache"]
+        # Expected 4xx responses would otherwise be logged one by one.
+        logging.getLogger("django.request").setLevel(logging.ERROR)
+        # Replicas follow the temporary database, synced like `sync_replicas --every`.
+        for alias in get_aliases():
+            connections[alias].settings_dict["NAME"] = f"{path}.{alias}"
+        stop_syncing = threading.Event()
+        syncer = threading.Thread(
+            target=self.sync_replicas,
+            args=(stop_syncing, options["sync_interval"]),
+            daemon=True,
+        )
+        try:
+            fixture = Fixture(options["scale"])
+            fixture.seed(random.Random(options["seed"]))
+            if get_aliases():
+                syncer.start()
+            results = {
+                "started_at": time.time(),
+                "options": {
+                    k: options[k]
+                    for k in ("iterations", "concurrency", "scale", "seed", "no_cache")
+                },
+                "replicas": len(get_aliases()),
+                "scenarios": {
+                    name: self.run_scenario(name, fixture, options)
+                    for name in scenarios
+                },
+            }
+        finally:
+            stop_syncing.set()
+            if syncer.is_alive():
+                syncer.join()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            for alias in get_aliases():
+                connections[alias].close()
+                for suffix in ["", ".versions.json"]:
+                    if os.path.exists(f"{path}.{alias}{suffix}"):
+                        os.remove(f"{path}.{alias}{suffix}")
+
+        covered = {
+            route
+            for scenario in results["scenarios"].values()
+            for route in scenario["routes"]
+        }
+        results["uncovered_routes"] = sorted(get_all_routes() - covered)
+        self.report(results, options.get("compare"))
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(results, file, indent=2)
+
+    @staticmethod
+    def sync_replicas(stopped: Optional[threading.Event] = None, interval: float = 0):
+        while True:
+            for alias in get_aliases():
+                sync_replica(alias)
+            if stopped is None or stopped.wait(interval):
+                return
+
+    def run_scenario(self, name: str, fixture: Fixture, options) -> dict:
+        object_cache.clear()
+        response_cache.clear()
+        weights, operations = zip(*SCENARIOS[name])
+        sessions = [
+            Session(fixture, random.Random(f"{options['seed']}:{name}:{i}"), i)
+            for i in range(options["concurrency"])
+        ]
+        per_session = max(1, options["iterations"] // len(sessions))
+
+        def work(session: Session):
+            # The first worker starts with one pass over every operation, so
+            # each route of the scenario shows up in the results.
+            plan = list(operations) if session.index == 0 else []
+            plan += session.rng.choices(
+                operations, weights, k=max(0, per_session - len(plan))
+            )
+            for operation in plan:
+                operation(session)
+
+        threads = [threading.Thread(target=work, args=(s,)) for s in sessions]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+
+        statuses = sum((s.statuses for s in sessions), Counter())
+        routes = defaultdict(list)
+        route_statuses = defaultdict(Counter)
+        for session in sessions:
+            for route, latencies in session.routes.items():
+                routes[route] += latencies
+                route_statuses[route] += session.route_statuses[route]
+        return {
+            **summarize([i for s in sessions for i in s.latencies], statuses, seconds),
+            "seconds": round(seconds, 3),
+            "routes": {
+                route: summarize(latencies, route_statuses[route], seconds)
+                for route, latencies in sorted(routes.items())
+            },
+        }
+
+    def report(self, results: dict, compare: Optional[str]):
+        baseline = {}
+        if compare:
+            with open(compare) as file:
+                baseline = json.load(file).get("scenarios", {})
+
+        columns = ("requests", "throughput", "p50_ms", "p95_ms", "p99_ms", "errors")
+        self.stdout.write(f"{'scenario':<10}" + "".join(f"{c:>12}" for c in columns))
+        for name, scenario in results["scenarios"].items():
+            self.stdout.write(
+                f"{name:<10}" + "".join(f"{scenario[c]:>12}" for c in columns)
+            )
+            if name in baseline:
+                self.stdout.write(
+                    f"{'  vs base':<10}"
+                    + "".join(
+                        f"{self.delta(scenario[c], baseline[name].get(c)):>12}"
+                        for c in columns
+                    )
+                )
+        if "mixed" in results["scenarios"] and results["uncovered_routes"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    "Routes not exercised: " + ", ".join(results["uncovered_routes"])
+                )
+            )
+
+    @staticmethod
+    def delta(value, base) -> str:
+        if not base:
+            return "-"
+        return f"{(value - base) / base * 100:+.1f}%"
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.catalog import build_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes the read-only catalog snapshot (foods, nutrition, diets and meal "
+        "plans) that workers memory-map to serve catalog reads without queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            help="Snapshot file; defaults to CATALOG['PATH'] (env CATALOG_PATH).",
+        )
+
+    def handle(self, *args, **options):
+        path = options["output"] or getattr(settings, "CATALOG", {}).get("PATH")
+        if not path:
+            raise CommandError("Set CATALOG_PATH or pass --output.")
+
+        started = time.perf_counter()
+        header = build_catalog(path)
+        counts = ", ".join(
+            f"{v:,} {k.replace('_', ' ')}" for k, v in header["counts"].items()
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {path} ({counts}) in {time.perf_counter() - started:.1f}s."
+            )
+        )
@@ -0,0 +1,76 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.querylog import read_query_log
+
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+
+def find_scans(cursor, sql: str, params) -> list[str]:
+    # SEARCH narrows an index to its terms; every SCAN, including one over an
+    # index (`SCAN Food USING INDEX ...`), reads the whole table or index.
+    cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+    return [
+        detail
+        for *_, detail in cursor.fetchall()
+        if (detail.startswith("SCAN ") and detail != "SCAN CONSTANT ROW")
+        or detail.startswith("USE TEMP B-TREE")
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays a QUERY_LOG through EXPLAIN QUERY PLAN and reports full table "
+        "and index scans and temporary sorts per route."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("log", help="JSON-lines file written via QUERY_LOG.")
+        parser.add_argument("--database", default="default")
+        parser.add_argument(
+            "--fail-on-scan",
+            action="store_true",
+            help="Exit with an error when any scan is found.",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if connection.vendor != "sqlite":
+            raise CommandError("Only SQLite query plans are supported.")
+
+        seen = set()
+        scans: dict[str, dict[str, set[str]]] = defaultdict(lambda: defaultdict(set))
+        with connection.cursor() as cursor:
+            for entry in read_query_log(options["log"]):
+                sql = entry["sql"]
+                if (entry["route"], sql) in seen:
+                    continue
+                seen.add((entry["route"], sql))
+                if not sql.lstrip().upper().startswith(EXPLAINABLE):
+                    continue
+                params = entry["params"]
+                if entry.get("many"):
+                    params = params[0] if params else []
+                try:
+                    found = find_scans(cursor, sql, params)
+                except Exception as e:
+                    self.stderr.write(f"{entry['route']}: could not explain: {e}")
+                    continue
+                for detail in found:
+                    scans[entry["route"]][detail].add(sql)
+
+        if not scans:
+            self.stdout.write(self.style.SUCCESS("No full scans found."))
+            return
+
+        for route in sorted(scans):
+            self.stdout.write(self.style.WARNING(route))
+            for detail, statements in sorted(scans[route].items()):
+                self.stdout.write(f"  {detail} ({len(statements)} statement(s))")
+                for sql in sorted(statements):
+                    self.stdout.write(f"    {sql}")
+
+        if options["fail_on_scan"]:
+            raise CommandError(f"Full scans found in {len(scans)} route(s).")
@@ -0,0 +1,406 @@
+import json
+import random
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from itertools import accumulate, islice
+from typing import Iterable, Iterator
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.utils import timezone
+
+from api import shards
+from api.cache import object_cache, response_cache
+from api.models import (
+    Diet,
+    Food,
+    MealPlan,
+    Nutrition,
+    Profile,
+    Submission,
+    TableVersion,
+    User,
+    Vital,
+)
+from api.utils import AMINO_ACIDS, MINERALS, VITAMINS, Password
+
+# Row counts at --scale 1; every count can also be set on its own.
+SIZES = {
+    "users": 1_000_000,
+    "foods": 100_000,
+    "diets": 10_000,
+    "meal_plans": 200_000,
+    "submissions": 50_000,
+    "vitals": 3_000_000,
+}
+
+# Children before parents, so clearing never violates a foreign key.
+MODELS = [Vital, Submission, Profile, MealPlan, Food, Nutrition, Diet, User]
+
+FIRST_NAMES = ["Anna", "Denys", "Iryna", "Maksym", "Olena", "Petro", "Sofia", "Taras"]
+LAST_NAMES = ["Bondar", "Hnatiuk", "Koval", "Lysenko", "Melnyk", "Shevchenko"]
+ADJECTIVES = ["Baked", "Fresh", "Grilled", "Pickled", "Roasted", "Smoked", "Steamed"]
+NOUNS = ["Apple", "Beans", "Buckwheat", "Cheese", "Chicken", "Oats", "Rice", "Salmon"]
+
+
+class Zipf:
+    """Draws items with Zipf-distributed popularity: rank r has weight 1/r^skew.
+
+    Items are ranked in a shuffled order, so popular rows are spread over the
+    whole id range instead of being the lowest ids.
+    """
+
+    def __init__(self, rng: random.Random, items: list, skew: float):
+        self.rng = rng
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(
+            accumulate(1 / rank**skew for rank in range(1, len(self.items) + 1))
+        )
+
+    def sample(self, k: int) -> list:
+        return self.rng.choices(self.items, cum_weights=self.cum_weights, k=k)
+
+    def one(self):
+        return self.sample(1)[0]
+
+
+def batched(rows: Iterable, size: int) -> Iterator[list]:
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def insert_rows(
+    model,
+    names: list[str],
+    rows: Iterable[tuple],
+    batch_size: int,
+    using: str = DEFAULT_DB_ALIAS,
+) -> int:
+    """Inserts plain tuples with `executemany`, skipping model instances and
+    `save()` entirely; values still go through each field's db preparation."""
+    db = connections[using]  # the proxy is slow per value
+    quote = db.ops.quote_name
+    fields = [model._meta.get_field(name) for name in names]
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        quote(model._meta.db_table),
+        ", ".join(quote(field.column) for field in fields),
+        ", ".join(["%s"] * len(fields)),
+    )
+    count = 0
+    with db.cursor() as cursor:
+        for batch in batched(rows, batch_size):
+            cursor.executemany(
+                sql,
+                [
+                    tuple(
+                        field.get_db_prep_save(value, db)
+                        for field, value in zip(fields, row)
+                    )
+                    for row in batch
+                ],
+            )
+            count += len(batch)
+    return count
+
+
+def insert_sharded(
+    model, names: list[str], rows: Iterable[tuple], batch_size: int
+) -> int:
+    """Like `insert_rows`, but sends each row to the shard of its user and leaves
+    the ids to the shard's own range."""
+    pk, user = names.index(model._meta.pk.name), names.index("fk_user")
+    columns = names[:pk] + names[pk + 1 :]
+    count = 0
+    for batch in batched(rows, batch_size):
+        groups = defaultdict(list)
+        for row in batch:
+            groups[shards.shard_for(row[user])].append(row[:pk] + row[pk + 1 :])
+        for alias, group in groups.items():
+            with transaction.atomic(using=alias):
+                count += insert_rows(model, columns, group, batch_size, alias)
+    return count
+
+
+class Generator:
+    def __init__(self, sizes: dict[str, int], seed: int, skew: float, password: str):
+        self.sizes = sizes
+        self.seed = seed
+        self.skew = skew
+        self.password = password
+        self.now = timezone.now()
+
+    def rng(self, table: str) -> random.Random:
+        # One stream per table, so changing one size leaves the others as-is.
+        return random.Random(f"{self.seed}:{table}")
+
+    def user_ids(self) -> list[str]:
+        return [f"user{i}" for i in range(self.sizes["users"])]
+
+    def nutrition(self):
+        rng = self.rng("nutrition")
+
+        def values(names: list[str]) -> str:
+            # Stored as JSON text, the same way FoodView.post_create does.
+            return json.dumps({name: round(rng.uniform(0, 100), 3) for name in names})
+
+        return (
+            Nutrition,
+            ["nutrition_id", "vitamins", "minerals", "amino_acids"],
+            (
+                (i, values(VITAMINS), values(MINERALS), values(AMINO_ACIDS))
+                for i in range(1, self.sizes["foods"] + 1)
+            ),
+        )
+
+    def foods(self):
+        rng = self.rng("foods")
+
+        def row(i: int):
+            carbs, protein, fat = (round(rng.uniform(0, 60), 1) for _ in range(3))
+            return (
+                i,
+                f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+                "",
+                f"https://example.com/foods/{i}.jpg",
+                carbs,
+                protein,
+                fat,
+                round(4 * carbs + 4 * protein + 9 * fat, 1),
+                i,
+            )
+
+        names = ["food_id", "name", "description", "photo_url"]
+        names += ["carbs", "protein", "fat", "calories", "fk_nutrition"]
+        return Food, names, (row(i) for i in range(1, self.sizes["foods"] + 1))
+
+    def diets(self):
+        return (
+            Diet,
+            ["diet_id", "name", "description", "photo_url"],
+            (
+                (i, f"Diet {i}", "", f"https://example.com/diets/{i}.jpg")
+                for i in range(1, self.sizes["diets"] + 1)
+            ),
+        )
+
+    def meal_plans(self):
+        rng = self.rng("meal_plans")
+        diets = Zipf(rng, range(1, self.sizes["diets"] + 1), self.skew)
+        foods = Zipf(rng, range(1, self.sizes["foods"] + 1), self.skew)
+
+        def row(i: int):
+            food_ids = dict.fromkeys(foods.sample(rng.randint(2, 6)))
+            return i, rng.randrange(4), diets.one(), ",".join(map(str, food_ids))
+
+        return (
+            MealPlan,
+            ["meal_plan_id", "time", "fk_diet", "foods"],
+            (row(i) for i in range(1, self.sizes["meal_plans"] + 1)),
+        )
+
+    def users(self):
+        rng = self.rng("users")
+        # bcrypt is deliberately slow; every generated user shares one hash.
+        password = Password.encrypt(self.password).decode()
+
+        def row(i: int):
+            created_at = self.now - timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))
+            role = 2 if i == 0 else 1 if i % 1000 == 1 else 0
+            return (
+                f"user{i}",
+                f"user{i}@example.com",
+                password,
+                rng.choice(FIRST_NAMES),
+                rng.choice(LAST_NAMES),
+                round(rng.gauss(75, 12), 1),
+                round(rng.uniform(8, 35), 1),
+                rng.randint(95, 145),
+                rng.randint(50, 110),
+                rng.randint(92, 100),
+                role,
+                date(1950, 1, 1) + timedelta(days=rng.randrange(58 * 365)),
+                created_at,
+                created_at,
+                created_at + (self.now - created_at) * rng.random(),
+            )
+
+        names = ["user_id", "email", "password", "first_name", "last_name"]
+        names += ["weight", "body_fat", "blood_pressure", "heart_rate"]
+        names += ["oxygen_level", "role", "date_of_birth", "created_at"]
+        names += ["updated_at", "last_seen_at"]
+        return User, names, (row(i) for i in range(self.sizes["users"]))
+
+    def profiles(self):
+        rng = self.rng("profiles")
+        diets = Zipf(rng, range(1, self.sizes["diets"] + 1), self.skew)
+        return (
+            Profile,
+            ["profile_id", "preferences", "fk_diet", "fk_user"],
+            (
+                (
+                    i + 1,
+                    {},
+                    diets.one() if diets.items and rng.random() < 0.8 else None,
+                    user_id,
+                )
+                for i, user_id in enumerate(self.user_ids())
+            ),
+        )
+
+    def submissions(self):
+        rng = self.rng("submissions")
+        users = Zipf(rng, self.user_ids(), self.skew)
+        reviewers = [f"user{i}" for i in range(1, self.sizes["users"], 1000)]
+
+        def row(i: int):
+            is_accepted = bool(reviewers) and rng.random() < 0.7
+            reviewer = rng.choice(reviewers) if is_accepted else None
+            return i, f"Submission {i}", users.one(), is_accepted, reviewer
+
+        names = ["submission_id", "note", "fk_user", "is_accepted", "fk_reviewer"]
+        return (
+            Submission,
+            names,
+            (row(i) for i in range(1, self.sizes["submissions"] + 1)),
+        )
+
+    def vitals(self):
+        rng = self.rng("vitals")
+        users = Zipf(rng, self.user_ids(), self.skew)
+        names = ["vital_id", "fk_user", "blood_pressure", "heart_rate"]
+        names += ["oxygen_level", "recorded_at"]
+        return (
+            Vital,
+            names,
+            (
+                (
+                    i,
+                    users.one(),
+                    rng.randint(95, 145),
+                    rng.randint(50, 110),
+                    rng.randint(92, 100),
+                    self.now - timedelta(seconds=rng.randrange(90 * 24 * 60 * 60)),
+                )
+                for i in range(1, self.sizes["vitals"] + 1)
+            ),
+        )
+
+    def tables(self):
+        # Parents before children.
+        yield self.users
+        yield self.diets
+        yield self.nutrition
+        yield self.foods
+        yield self.meal_plans
+        yield self.profiles
+        yield self.submissions
+        if self.sizes["users"]:
+            yield self.vitals
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with deterministic synthetic data for scale "
+        "testing: users with profiles and vitals history, foods with full "
+        "nutrition, diets, meal plans and submissions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--scale",
+            type=float,
+            default=1.0,
+            help="Multiplier for every default row count.",
+        )
+        for name, size in SIZES.items():
+            parser.add_argument(
+                f"--{name.replace('_', '-')}",
+                type=int,
+                help=f"Number of {name.replace('_', ' ')} (default {size:,} x scale).",
+            )
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.1,
+            help="Zipf exponent for popularity of foods, diets and active users.",
+        )
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument(
+            "--password",
+            default="Generated-Passw0rd",
+            help="Password of every generated user.",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete existing rows first instead of refusing to run.",
+        )
+
+    def handle(self, *args, **options):
+        sizes = {
+            name: (
+                max(0, options[name])
+                if options[name] is not None
+                else round(size * options["scale"])
+            )
+            for name, size in SIZES.items()
+        }
+        if sizes["users"] == 0 and sizes["submissions"]:
+            raise CommandError("Submissions need at least one user.")
+        if sizes["diets"] == 0 and sizes["meal_plans"]:
+            raise CommandError("Meal plans need at least one diet.")
+        if sizes["foods"] == 0 and sizes["meal_plans"]:
+            raise CommandError("Meal plans need at least one food.")
+
+        quote = connection.ops.quote_name
+        if options["clear"]:
+            with transaction.atomic(), connection.cursor() as cursor:
+                for model in MODELS:
+                    cursor.execute(f"DELETE FROM {quote(model._meta.db_table)}")
+            for alias in shards.get_aliases():
+                with (
+                    transaction.atomic(using=alias),
+                    connections[alias].cursor() as cursor,
+                ):
+                    for model in shards.get_models():
+                        cursor.execute(f"DELETE FROM {quote(model._meta.db_table)}")
+        elif any(model.objects.exists() for model in MODELS) or any(
+            model.objects.using(alias).exists()
+            for alias in shards.get_aliases()
+            for model in shards.get_models()
+        ):
+            raise CommandError("The database already has data; pass --clear.")
+
+        generator = Generator(
+            sizes, options["seed"], options["skew"], options["password"]
+        )
+        started = time.perf_counter()
+        for table in generator.tables():
+            start = time.perf_counter()
+            model, names, rows = table()
+            if shards.is_sharded(model):
+                count = insert_sharded(model, names, rows, options["batch_size"])
+            else:
+                with transaction.atomic():
+                    count = insert_rows(model, names, rows, options["batch_size"])
+            self.stdout.write(
+                f"{model._meta.db_table:<12}{count:>12,} rows"
+                f"{time.perf_counter() - start:>10.1f}s"
+            )
+
+        for alias in shards.get_locations():
+            if connections[alias].vendor == "sqlite":
+                with connections[alias].cursor() as cursor:
+                    # Refresh planner statistics after the bulk load.
+                    cursor.execute("ANALYZE")
+        for model in MODELS:
+            TableVersion.bump(model._meta.db_table)
+        object_cache.clear()
+        response_cache.clear()
+        self.stdout.write(
+            self.style.SUCCESS(f"Done in {time.perf_counter() - started:.1f}s.")
+        )
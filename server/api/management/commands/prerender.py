@@ -0,0 +1,58 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.prerender import Prerenderer, RenderError
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-renders anonymous catalog responses (food/all, diet/all, "
+        "food/query, diet/query) into static files the host can serve."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            help="Directory to write to; defaults to PRERENDER['DIRECTORY'] "
+            "(env PRERENDER_DIR).",
+        )
+        parser.add_argument(
+            "--pending",
+            action="store_true",
+            help="Only re-render pages affected by changes queued since the last run.",
+        )
+        parser.add_argument("--page-size", type=int)
+        parser.add_argument(
+            "--lang", action="append", help="Defaults to every language."
+        )
+
+    def handle(self, *args, **options):
+        directory = options["output"] or settings.PRERENDER["DIRECTORY"]
+        if not directory:
+            raise CommandError("Set PRERENDER_DIR or pass --output.")
+
+        # One timing record per rendered page would drown the summary.
+        logging.getLogger("api.timing").setLevel(logging.ERROR)
+        started = time.perf_counter()
+        prerenderer = Prerenderer(
+            directory,
+            options["page_size"] or settings.PRERENDER["PAGE_SIZE"],
+            options["lang"],
+        )
+        try:
+            if options["pending"]:
+                prerenderer.update()
+            else:
+                prerenderer.render_all()
+        except RenderError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rendered {prerenderer.rendered:,} and removed "
+                f"{prerenderer.removed:,} pages in "
+                f"{time.perf_counter() - started:.1f}s."
+            )
+        )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.shards import get_aliases, get_models, rebalance
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves profiles and vitals that are not on the shard of their user "
+        "there: rows still on the primary, and rows whose shard changed after "
+        "a file was added to SQLITE_SHARDS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the rows that would move.",
+        )
+
+    def handle(self, *args, **options):
+        if not get_aliases():
+            raise CommandError("No shards configured; set SQLITE_SHARDS.")
+
+        for model in get_models():
+            moved = rebalance(model, options["batch_size"], options["dry_run"])
+            for (source, target), count in sorted(moved.items()):
+                self.stdout.write(
+                    f"{model._meta.db_table:<12}{source:>10} -> {target:<10}"
+                    f"{count:>12,} rows"
+                )
+            if not moved:
+                self.stdout.write(f"{model._meta.db_table:<12}balanced")
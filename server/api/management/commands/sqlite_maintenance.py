@@ -0,0 +1,62 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.sqlite import (
+    CHECKPOINT_MODES,
+    MaintenanceLock,
+    enable_incremental_vacuum,
+    run_maintenance,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs SQLite maintenance: WAL checkpoint, ANALYZE and incremental "
+        "vacuum. Safe to run while the API is serving."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--every",
+            type=float,
+            help="Keep running, once every this many seconds.",
+        )
+        parser.add_argument("--vacuum-pages", type=int, default=1000)
+        parser.add_argument(
+            "--checkpoint",
+            choices=CHECKPOINT_MODES,
+            default="passive",
+            help="truncate also resets the WAL file, but waits for readers.",
+        )
+        parser.add_argument(
+            "--enable-incremental-vacuum",
+            action="store_true",
+            help="Switch the database to incremental auto-vacuum first (runs "
+            "a full VACUUM once).",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Maintenance is only needed for SQLite.")
+        if options["enable_incremental_vacuum"]:
+            enable_incremental_vacuum()
+
+        while True:
+            lock = MaintenanceLock()
+            if lock.acquire():
+                try:
+                    stats = run_maintenance(
+                        options["vacuum_pages"], options["checkpoint"]
+                    )
+                finally:
+                    lock.release()
+                self.stdout.write(json.dumps(stats))
+            else:
+                self.stderr.write("Maintenance is already running elsewhere.")
+            if not options["every"]:
+                return
+            connection.close()
+            time.sleep(options["every"])
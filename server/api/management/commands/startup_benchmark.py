@@ -0,0 +1,192 @@
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.management.commands.benchmark import get_all_routes
+
+# Runs in a fresh interpreter per measurement, so every import is cold. The
+# request goes straight to the WSGI callable: django.test would pre-import
+# modules a real cold start pays for during the first request.
+CHILD = """
+import io, json, os, sys, time
+start = time.perf_counter()
+from server.wsgi import application
+imported = time.perf_counter()
+method, path, body, token = sys.argv[1:5]
+from wsgiref.util import setup_testing_defaults
+
+def request():
+    environ = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": io.BytesIO(body.encode()),
+    }
+    if token:
+        environ["HTTP_AUTHORIZATION"] = token
+    setup_testing_defaults(environ)
+    status = []
+    begin = time.perf_counter()
+    b"".join(application(environ, lambda s, h, e=None: status.append(s)))
+    return int(status[0].split()[0]), time.perf_counter() - begin
+
+status, first = request()
+_, second = request()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_response_ms": first * 1000,
+    "warm_response_ms": second * 1000,
+    "status": status,
+    "modules": len(sys.modules),
+}))
+"""
+
+BODIES = {
+    "POST account/login": {"user_id": "user0", "password": "Generated-Passw0rd"},
+}
+QUERY_IDS = {"all": "0:10", "queue": "0:10", "backup": "diets", "profile": "user0"}
+
+
+def get_request(route: str) -> tuple[str, str, str]:
+    method, path = route.split(" ")
+    name = path.split("/")[1]
+    if method != "POST":
+        path = f"{path}/@{QUERY_IDS.get(name, '1')}"
+    return method, f"/api/us/{path}", json.dumps(BODIES.get(route, {}))
+
+
+def parse_import_times(stderr: str, top: int) -> list[dict]:
+    """Self time of `-X importtime` output summed per top-level package."""
+    totals: dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, _, name = line[len("import time:") :].split("|")
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + int(own)
+    return [
+        {"package": package, "ms": round(us / 1000, 1)}
+        for package, us in sorted(totals.items(), key=lambda i: -i[1])[:top]
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures cold-start cost: import time of the WSGI application and "
+        "time to first response per route, each in a fresh interpreter."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "routes",
+            nargs="*",
+            help="Only routes containing one of these strings, e.g. food/all.",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=["lean", "full", "both"],
+            default="both",
+            help="lean sets SERVERLESS=1, full runs with every app installed.",
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--top", type=int, default=10)
+        parser.add_argument("--output", help="Write results to this JSON file.")
+
+    def handle(self, *args, **options):
+        routes = sorted(
+            route
+            for route in get_all_routes()
+            if not options["routes"] or any(i in route for i in options["routes"])
+        )
+        if not routes:
+            raise CommandError("No route matches.")
+        modes = ["lean", "full"] if options["mode"] == "both" else [options["mode"]]
+
+        with tempfile.TemporaryDirectory() as directory:
+            database = os.path.join(directory, "db.sqlite3")
+            self.prepare(database)
+            with sqlite3.connect(database) as db:
+                (password,) = db.execute(
+                    'SELECT password FROM "User" WHERE user_id = ?', ["user0"]
+                ).fetchone()
+            token = f"@user0:{password}"
+
+            results = {}
+            for mode in modes:
+                env = {**os.environ, "SQLITE_PATH": database}
+                env["SERVERLESS"] = "1" if mode == "lean" else "0"
+                results[mode] = {
+                    "imports": self.profile_imports(env, options["top"]),
+                    "routes": {
+                        route: self.measure(route, env, token, options["repeat"])
+                        for route in routes
+                    },
+                }
+
+        self.report(results)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(results, file, indent=2)
+
+    def run(self, args: list[str], env: dict, **kwargs) -> subprocess.CompletedProcess:
+        process = subprocess.run(
+            [sys.executable, *args],
+            cwd=Path(settings.BASE_DIR),
+            env=env,
+            capture_output=True,
+            text=True,
+            **kwargs,
+        )
+        if process.returncode:
+            raise CommandError(process.stderr.strip().splitlines()[-1])
+        return process
+
+    def prepare(self, database: str):
+        env = {**os.environ, "SQLITE_PATH": database}
+        self.run(["manage.py", "migrate", "--verbosity", "0"], env)
+        sizes = ["--users", "2", "--foods", "5", "--diets", "2"]
+        sizes += ["--meal-plans", "5", "--submissions", "2", "--vitals", "5"]
+        self.run(["manage.py", "generate_data", *sizes], env)
+
+    def profile_imports(self, env: dict, top: int) -> list[dict]:
+        # The URLconf is imported on the first request, so include it here.
+        code = (
+            "import server.wsgi, django.urls; django.urls.get_resolver().urlconf_module"
+        )
+        process = self.run(["-X", "importtime", "-c", code], env)
+        return parse_import_times(process.stderr, top)
+
+    def measure(self, route: str, env: dict, token: str, repeat: int) -> dict:
+        samples = [
+            json.loads(self.run(["-c", CHILD, *get_request(route), token], env).stdout)
+            for _ in range(repeat)
+        ]
+        return {
+            "status": samples[0]["status"],
+            "modules": samples[0]["modules"],
+            **{
+                key: round(statistics.median(i[key] for i in samples), 1)
+                for key in ("import_ms", "first_response_ms", "warm_response_ms")
+            },
+        }
+
+    def report(self, results: dict):
+        columns = ("status", "import_ms", "first_response_ms", "warm_response_ms")
+        for mode, result in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{mode} start"))
+            for item in result["imports"]:
+                self.stdout.write(f"  import {item['package']:<28}{item['ms']:>8} ms")
+            self.stdout.write(f"  {'route':<28}" + "".join(f"{c:>19}" for c in columns))
+            for route, row in result["routes"].items():
+                self.stdout.write(
+                    f"  {route:<28}" + "".join(f"{row[c]:>19}" for c in columns)
+                )
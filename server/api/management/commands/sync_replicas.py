@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.replicas import PRIMARY, get_aliases, sync_replica
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the primary SQLite database into every replica in "
+        "SQLITE_REPLICAS, once or in a loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--every",
+            type=float,
+            help="Keep running, once every this many seconds.",
+        )
+
+    def handle(self, *args, **options):
+        if not get_aliases():
+            raise CommandError("No replicas configured; set SQLITE_REPLICAS.")
+        if connections[PRIMARY].vendor != "sqlite":
+            raise CommandError("Replicas are copied with SQLite's backup API.")
+
+        while True:
+            for alias in get_aliases():
+                started = time.perf_counter()
+                sync_replica(alias)
+                self.stdout.write(
+                    f"{alias:<12}{connections[alias].settings_dict['NAME']} "
+                    f"{(time.perf_counter() - started) * 1000:.0f} ms"
+                )
+            if not options["every"]:
+                return
+            time.sleep(options["every"])
@@ -0,0 +1,299 @@
+import atexit
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+FAMILIES = {
+    "api_requests_total": ("counter", "Requests handled, by route, method and status."),
+    "api_request_duration_seconds": ("histogram", "Request latency by route."),
+    "api_request_queries": ("histogram", "SQL statements run per request by route."),
+    "api_bcrypt_in_flight": ("gauge", "bcrypt hash or compare calls running now."),
+    "api_bcrypt_duration_seconds": ("histogram", "Duration of bcrypt calls."),
+    "api_cache_hits_total": ("counter", "Cache hits by cache."),
+    "api_cache_misses_total": ("counter", "Cache misses by cache."),
+}
+
+# Values are kept either for every process that ever wrote them ("all"), which
+# suits counters and histograms, or only for processes still alive ("live").
+ALL, LIVE = "all", "live"
+
+_HEADER = struct.Struct("<Q")
+_LENGTH = struct.Struct("<I")
+_VALUE = struct.Struct("<d")
+
+
+class MmapValues:
+    """Float values keyed by string in a memory-mapped file owned by one process.
+
+    Layout: an 8-byte count of used bytes, then entries of a 4-byte key length,
+    the UTF-8 key padded to 8 bytes and an 8-byte double. Other processes read
+    the file with `read_file` without taking any lock.
+    """
+
+    def __init__(self, path: str, initial_size: int = 64 * 1024):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a+b")
+        if os.fstat(self._file.fileno()).st_size < initial_size:
+            self._file.truncate(initial_size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._offsets: dict[str, int] = {}
+        used = _HEADER.unpack_from(self._map, 0)[0]
+        if not used:
+            used = _HEADER.size
+            _HEADER.pack_into(self._map, 0, used)
+        self._used = used
+        for key, _, offset in _read_entries(self._map, used):
+            self._offsets[key] = offset
+
+    def inc(self, key: str, amount: float = 1.0):
+        with self._lock:
+            offset = self._get_offset(key)
+            value = _VALUE.unpack_from(self._map, offset)[0]
+            _VALUE.pack_into(self._map, offset, value + amount)
+
+    def set(self, key: str, value: float):
+        with self._lock:
+            _VALUE.pack_into(self._map, self._get_offset(key), value)
+
+    def _get_offset(self, key: str) -> int:
+        offset = self._offsets.get(key)
+        if offset is not None:
+            return offset
+        encoded = key.encode()
+        padded = len(encoded) + (-(len(encoded) + _LENGTH.size) % 8)
+        size = _LENGTH.size + padded + _VALUE.size
+        if self._used + size > len(self._map):
+            self._grow(self._used + size)
+        _LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + 4 : self._used + 4 + len(encoded)] = encoded
+        offset = self._used + _LENGTH.size + padded
+        _VALUE.pack_into(self._map, offset, 0.0)
+        self._used += size
+        # Publish the entry only once it is fully written.
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._offsets[key] = offset
+        return offset
+
+    def _grow(self, needed: int):
+        size = len(self._map)
+        while size < needed:
+            size *= 2
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+
+def _read_entries(data, used: int) -> Iterator[tuple[str, float, int]]:
+    position = _HEADER.size
+    while position < used:
+        length = _LENGTH.unpack_from(data, position)[0]
+        padded = length + (-(length + _LENGTH.size) % 8)
+        key = bytes(data[position + 4 : position + 4 + length]).decode()
+        offset = position + _LENGTH.size + padded
+        yield key, _VALUE.unpack_from(data, offset)[0], offset
+        position = offset + _VALUE.size
+
+
+def read_file(path: str) -> Iterator[tuple[str, float]]:
+    with open(path, "rb") as file:
+        data = file.read()
+    if len(data) < _HEADER.size:
+        return
+    used = min(_HEADER.unpack_from(data, 0)[0], len(data))
+    for key, value, _ in _read_entries(data, used):
+        yield key, value
+
+
+def is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _sort_key(item):
+    # Histogram buckets must be listed in increasing order of `le`.
+    (name, labels), _ = item
+    rest = tuple(label for label in labels if label[0] != "le")
+    le = dict(labels).get("le")
+    return name.split("_bucket")[0], rest, name, float(le) if le else 0.0
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = [
+        '{}="{}"'.format(
+            k, str(v).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+        )
+        for k, v in sorted(labels.items())
+    ]
+    return "{" + ",".join(escaped) + "}"
+
+
+class Metrics:
+    """Process-wide metrics aggregated across workers through per-pid mmap files.
+
+    Every worker writes only its own `<pid>.db` file in DIRECTORY; a scrape
+    from any worker sums all of them. Without a DIRECTORY each process uses a
+    private temporary one, removed when it exits, and reports only itself.
+    """
+
+    def __init__(self, directory: Optional[str] = None, enabled: bool = True):
+        self.enabled = enabled
+        self.directory = directory
+        self._values: Optional[MmapValues] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._bcrypt_lock = threading.Lock()
+        self._bcrypt_in_flight = 0
+        # Encoded keys by (mode, name, labels), so hot paths skip json.dumps.
+        self._keys: dict[tuple, str] = {}
+
+    @property
+    def values(self) -> MmapValues:
+        pid = os.getpid()
+        if self._pid != pid:
+            # Forked workers must not share the parent's file.
+            with self._lock:
+                if self._pid != pid:
+                    if self.directory is None:
+                        self.directory = tempfile.mkdtemp(prefix="api-metrics-")
+                        atexit.register(_remove_directory, self.directory, pid)
+                    os.makedirs(self.directory, exist_ok=True)
+                    path = os.path.join(self.directory, f"{pid}.db")
+                    self._values = MmapValues(path)
+                    self._pid = pid
+        return self._values  # type: ignore
+
+    def make_key(self, mode: str, name: str, labels: dict) -> str:
+        memo = (mode, name, *labels.items())
+        key = self._keys.get(memo)
+        if key is None:
+            key = self._keys[memo] = json.dumps([mode, name, sorted(labels.items())])
+        return key
+
+    def inc(self, name: str, labels: dict, amount: float = 1.0):
+        if self.enabled:
+            self.values.inc(self.make_key(ALL, name, labels), amount)
+
+    def set(self, name: str, labels: dict, value: float, mode: str = LIVE):
+        """Sets a gauge; with mode ALL the value outlives the process, which
+        suits counters kept by the process itself."""
+        if self.enabled:
+            self.values.set(self.make_key(mode, name, labels), value)
+
+    def observe(self, name: str, labels: dict, value: float, buckets: tuple):
+        if not self.enabled:
+            return
+        for bucket in buckets:
+            # Empty buckets are written too, so every series has the full set.
+            self.inc(
+                f"{name}_bucket",
+                {**labels, "le": repr(float(bucket))},
+                1.0 if value <= bucket else 0.0,
+            )
+        self.inc(f"{name}_bucket", {**labels, "le": "+Inf"})
+        self.inc(f"{name}_sum", labels, value)
+        self.inc(f"{name}_count", labels)
+
+    def observe_request(
+        self, route: str, method: str, status: int, seconds: float, queries: int
+    ):
+        self.inc(
+            "api_requests_total", {"route": route, "method": method, "status": status}
+        )
+        self.observe(
+            "api_request_duration_seconds", {"route": route}, seconds, LATENCY_BUCKETS
+        )
+        self.observe("api_request_queries", {"route": route}, queries, QUERY_BUCKETS)
+
+    def observe_caches(self, caches: dict):
+        for name, cache in caches.items():
+            # Totals of exited workers still count.
+            self.set("api_cache_hits_total", {"cache": name}, cache.hits, ALL)
+            self.set("api_cache_misses_total", {"cache": name}, cache.misses, ALL)
+
+    @contextmanager
+    def track_bcrypt(self):
+        if not self.enabled:
+            yield
+            return
+        with self._bcrypt_lock:
+            self._bcrypt_in_flight += 1
+            self.set("api_bcrypt_in_flight", {}, self._bcrypt_in_flight)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(
+                "api_bcrypt_duration_seconds",
+                {},
+                time.perf_counter() - start,
+                LATENCY_BUCKETS,
+            )
+            with self._bcrypt_lock:
+                self._bcrypt_in_flight -= 1
+                self.set("api_bcrypt_in_flight", {}, self._bcrypt_in_flight)
+
+    def collect(self) -> dict[tuple[str, tuple], float]:
+        self.values  # make sure this process has a file to report
+        totals: dict[tuple[str, tuple], float] = defaultdict(float)
+        for filename in os.listdir(self.directory):
+            pid, extension = os.path.splitext(filename)
+            if extension != ".db" or not pid.isdigit():
+                continue
+            alive = is_alive(int(pid))
+            for key, value in read_file(os.path.join(self.directory, filename)):
+                mode, name, labels = json.loads(key)
+                if mode == LIVE and not alive:
+                    continue
+                totals[(name, tuple(tuple(i) for i in labels))] += value
+        return totals
+
+    def render(self) -> str:
+        samples: dict[str, list[str]] = defaultdict(list)
+        for (name, labels), value in sorted(self.collect().items(), key=_sort_key):
+            family = name
+            for suffix in ("_bucket", "_sum", "_count"):
+                if name.endswith(suffix) and name[: -len(suffix)] in FAMILIES:
+                    family = name[: -len(suffix)]
+            samples[family].append(f"{name}{format_labels(dict(labels))} {value!r}")
+
+        lines = []
+        for family, family_samples in samples.items():
+            kind, description = FAMILIES.get(family, ("untyped", ""))
+            lines += [f"# HELP {family} {description}", f"# TYPE {family} {kind}"]
+            lines += family_samples
+        return "\n".join(lines) + "\n"
+
+
+def _remove_directory(directory: str, pid: int):
+    # Forked children inherit exit handlers; only the owner removes its files.
+    if os.getpid() == pid:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _build_metrics():
+    options = getattr(settings, "METRICS", {})
+    return Metrics(options.get("DIRECTORY"), options.get("ENABLED", True))
+
+
+metrics = _build_metrics()
@@ -1,3 +1,15 @@
+import json
+import logging
+
+from django.conf import settings
+
+from .cache import object_cache, response_cache
+from .metrics import metrics
+from .timing import track
+
+logger = logging.getLogger("api.timing")
+
+
 class DisableCSRFMiddleware(object):
 
     def __init__(self, get_response):
@@ -7,3 +19,52 @@ class DisableCSRFMiddleware(object):
         setattr(request, "_dont_enforce_csrf_checks", True)
         response = self.get_response(request)
         return response
+
+
+class TimingMiddleware(object):
+    """Reports query count, DB time and view phases of every request.
+
+    Timings go to the `Server-Timing` header and, as one JSON object per request,
+    to the `api.timing` logger. SQL shapes repeated more than
+    N_PLUS_ONE_THRESHOLD times in one request are logged as a warning.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = getattr(settings, "REQUEST_TIMING", {})
+        is_enabled = options.get("ENABLED", True)
+        if not is_enabled and not metrics.enabled:
+            return self.get_response(request)
+
+        with track() as timings:
+            response = self.get_response(request)
+
+        if metrics.enabled:
+            metrics.observe_request(
+                timings.route or "other",
+                request.method,
+                response.status_code,
+                timings.total,
+                timings.queries,
+            )
+            metrics.observe_caches(
+                {"objects": object_cache.local, "responses": response_cache.entries}
+            )
+        if not is_enabled:
+            return response
+
+        response["Server-Timing"] = timings.get_header()
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+        }
+        logger.info(json.dumps({**record, **timings.as_dict()}))
+        repeated = timings.repeated(options.get("N_PLUS_ONE_THRESHOLD", 10))
+        if repeated:
+            logger.warning(
+                json.dumps({**record, "event": "n_plus_one", "queries": repeated})
+            )
+        return response
@@ -0,0 +1,82 @@
+# Generated by Django 5.0.4 on 2026-10-19 08:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_reviewers(apps, schema_editor):
+    Submission = apps.get_model("api", "Submission")
+    User = apps.get_model("api", "User")
+    # Reviewers were stored as bare user ids; drop those whose user is gone.
+    users = set(User.objects.values_list("user_id", flat=True))
+    for submission in Submission.objects.exclude(reviewer=None):
+        if submission.reviewer in users:
+            submission.fk_reviewer_id = submission.reviewer
+            submission.save(update_fields=["fk_reviewer"])
+
+
+def restore_reviewers(apps, schema_editor):
+    Submission = apps.get_model("api", "Submission")
+    for submission in Submission.objects.exclude(fk_reviewer=None):
+        submission.reviewer = submission.fk_reviewer_id
+        submission.save(update_fields=["reviewer"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_tableversion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="submission",
+            name="fk_reviewer",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="reviewed_submissions",
+                to="api.user",
+            ),
+        ),
+        migrations.RunPython(copy_reviewers, restore_reviewers),
+        migrations.RemoveField(
+            model_name="submission",
+            name="reviewer",
+        ),
+        migrations.AlterField(
+            model_name="diet",
+            name="name",
+            field=models.CharField(db_index=True, max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="food",
+            name="name",
+            field=models.CharField(db_index=True, max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="mealplan",
+            name="time",
+            field=models.SmallIntegerField(
+                choices=[(0, "breakfast"), (1, "lunch"), (2, "snack"), (3, "dinner")],
+                db_index=True,
+                default=0,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="role",
+            field=models.SmallIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddIndex(
+            model_name="food",
+            index=models.Index(fields=["calories"], name="food_calories_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="submission",
+            index=models.Index(
+                fields=["is_accepted", "submission_id"], name="submission_status_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.4 on 2026-10-19 08:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_indexes_and_reviewer_fk"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="submission",
+            name="claimed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="submission",
+            name="fk_claimer",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="claimed_submissions",
+                to="api.user",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="submission",
+            index=models.Index(
+                condition=models.Q(("is_accepted", False)),
+                fields=["submission_id"],
+                name="submission_pending_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.4 on 2026-10-19 08:47
+
+import api.models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_submission_claim"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Vital",
+            fields=[
+                ("vital_id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("blood_pressure", models.IntegerField()),
+                ("heart_rate", models.IntegerField()),
+                ("oxygen_level", models.IntegerField()),
+                (
+                    "recorded_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "fk_user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="api.user"
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "Vital",
+                "indexes": [
+                    models.Index(
+                        fields=["fk_user", "recorded_at"], name="vital_history_idx"
+                    )
+                ],
+            },
+            bases=(api.models.Model, models.Model),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.4 on 2026-10-19 09:01
+
+import api.models
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_vital"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingRender",
+            fields=[
+                (
+                    "pending_render_id",
+                    models.BigAutoField(primary_key=True, serialize=False),
+                ),
+                ("table", models.CharField(max_length=32)),
+                ("object_id", models.CharField(max_length=64)),
+                ("queued_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "db_table": "PendingRender",
+            },
+            bases=(api.models.Model, models.Model),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.0.4 on 2026-10-19 09:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_pending_render"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="profile",
+            name="fk_diet",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="api.diet",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="profile",
+            name="fk_nutrition",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="api.nutrition",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="profile",
+            name="fk_user",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="api.user",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="vital",
+            name="fk_user",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="api.user",
+            ),
+        ),
+    ]
@@ -1,4 +1,15 @@
-from django.db import models
+import copy
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import MISSING, object_cache
+from .replicas import may_be_stale
+from .shards import ShardedManager
 
 ROLE_CHOICES = (
     (0, "user"),
@@ -13,18 +24,133 @@ TIME_CHOICES = (
     (3, "dinner"),
 )
 
+EQUALITY = ["eq", "in"]
+COMPARISON = ["eq", "lt", "lte", "gt", "gte"]
+
 
 class Model:
+    """Mixin shared by every model; it must come before `models.Model` in the bases.
+
+    Besides the cached lookups, it remembers the column values an instance was
+    loaded with, so `save()` on a loaded row writes only the columns that
+    changed and skips the query entirely when nothing did.
+    """
+
     objects = models.Manager()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)  # type: ignore
+        instance._snapshot()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using, fields, **kwargs)  # type: ignore
+        if fields is None or not hasattr(self, "_loaded"):
+            return self._snapshot()
+        # Loading a deferred field must not mark pending changes as saved.
+        attnames = [self._meta.get_field(name).attname for name in fields]  # type: ignore
+        self._loaded = {
+            **self._loaded,
+            **{
+                attname: copy.deepcopy(self.__dict__[attname])
+                for attname in attnames
+                if attname in self.__dict__
+            },
+        }
+
+    def _snapshot(self):
+        # Always a new dict: cached copies of this row share the old one.
+        self._loaded = {
+            field.attname: copy.deepcopy(self.__dict__[field.attname])
+            for field in self._meta.concrete_fields  # type: ignore
+            if field.attname in self.__dict__
+        }
+
+    def get_changed_fields(self) -> list[str]:
+        loaded = getattr(self, "_loaded", {})
+        return [
+            field.name
+            for field in self._meta.concrete_fields  # type: ignore
+            if field.attname in self.__dict__
+            and (
+                field.attname not in loaded
+                or self.__dict__[field.attname] != loaded[field.attname]
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        tracked = (
+            hasattr(self, "_loaded")
+            and not self._state.adding  # type: ignore
+            and not args
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        )
+        if tracked:
+            changed = self.get_changed_fields()
+            if not changed:
+                return
+            changed += [
+                field.name
+                for field in self._meta.concrete_fields  # type: ignore
+                if getattr(field, "auto_now", False) and field.name not in changed
+            ]
+            kwargs["update_fields"] = changed
+        super().save(*args, **kwargs)  # type: ignore
+        self._snapshot()
+
+    def save_changes(self, *related: "Model"):
+        """Saves the changed columns of this row and of `related` in one transaction."""
+        with transaction.atomic():
+            for instance in related:
+                if instance is not None:
+                    instance.save()
+            self.save()
+
     @classmethod
     def secure_get(cls, multiple: bool = False, **kwargs):
         if multiple:
             return cls.objects.filter(**kwargs).all()
-        return cls.objects.filter(**kwargs).first()
 
+        pk = cls._get_pk_lookup(kwargs)
+        if pk is None:
+            return cls.objects.filter(**kwargs).first()
+        return cls.cached_get(pk)
+
+    @classmethod
+    def cached_get(cls, pk):
+        if not object_cache.enabled:
+            return cls.objects.filter(pk=pk).first()
+
+        instance = object_cache.get(cls, pk)
+        if instance is not MISSING:
+            return instance
 
-class User(models.Model, Model):
+        instance = cls.objects.filter(pk=pk).first()
+        if instance is not None and not may_be_stale():
+            # A row read inside a transaction may be one it wrote and later
+            # rolls back; on_commit drops the callback with the rollback.
+            transaction.on_commit(
+                partial(object_cache.set, object_cache.detach(instance)),
+                using=instance._state.db,
+            )
+        return instance
+
+    @classmethod
+    def _get_pk_lookup(cls, kwargs: dict):
+        if len(kwargs) != 1:
+            return None
+        key, value = next(iter(kwargs.items()))
+        if key not in ["pk", cls._meta.pk.name]:  # type: ignore
+            return None
+        try:
+            return cls._meta.pk.to_python(value)  # type: ignore
+        except Exception:
+            return None
+
+
+class User(Model, models.Model):
     user_id = models.CharField(primary_key=True, max_length=16)
     email = models.EmailField(unique=True)
     password = models.CharField(max_length=60)
@@ -35,12 +161,20 @@ class User(models.Model, Model):
     blood_pressure = models.IntegerField(null=True, blank=True)
     heart_rate = models.IntegerField(null=True, blank=True)
     oxygen_level = models.IntegerField(null=True, blank=True)
-    role = models.SmallIntegerField(default=0)  # type: ignore
+    role = models.SmallIntegerField(default=0, db_index=True)  # type: ignore
     date_of_birth = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     last_seen_at = models.DateTimeField(auto_now_add=True)
 
+    FILTERS = {
+        "user_id": [*EQUALITY, "startswith"],
+        "email": EQUALITY,
+        "role": EQUALITY,
+        "created_at": COMPARISON,
+    }
+    ORDERING = ["user_id", "role", "created_at", "last_seen_at"]
+
     class Meta:
         db_table = "User"
 
@@ -49,59 +183,174 @@ class User(models.Model, Model):
         return f"@{self.user_id}:{self.password}"
 
 
-class Profile(models.Model, Model):
+# Profiles and vitals may live on a shard (see api.shards), where the tables they
+# point to do not exist, so their foreign keys have no database constraints.
+
+
+class Profile(Model, models.Model):
     profile_id = models.BigAutoField(primary_key=True)
     preferences = models.JSONField(default=dict)
-    fk_diet = models.ForeignKey("Diet", on_delete=models.CASCADE, null=True, blank=True)
+    fk_diet = models.ForeignKey(
+        "Diet", on_delete=models.CASCADE, null=True, blank=True, db_constraint=False
+    )
     fk_nutrition = models.ForeignKey(
-        "Nutrition", on_delete=models.SET_NULL, null=True, blank=True
+        "Nutrition",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
     )
-    fk_user = models.ForeignKey("User", on_delete=models.CASCADE)
+    fk_user = models.ForeignKey("User", on_delete=models.CASCADE, db_constraint=False)
+
+    objects = ShardedManager()
 
     class Meta:
         db_table = "Profile"
 
 
-class Diet(models.Model, Model):
+class Vital(Model, models.Model):
+    vital_id = models.BigAutoField(primary_key=True)
+    fk_user = models.ForeignKey("User", on_delete=models.CASCADE, db_constraint=False)
+    blood_pressure = models.IntegerField()
+    heart_rate = models.IntegerField()
+    oxygen_level = models.IntegerField()
+    recorded_at = models.DateTimeField(default=timezone.now)
+
+    objects = ShardedManager()
+
+    class Meta:
+        db_table = "Vital"
+        indexes = [
+            models.Index(fields=["fk_user", "recorded_at"], name="vital_history_idx")
+        ]
+
+
+class Diet(Model, models.Model):
     diet_id = models.BigAutoField(primary_key=True)
-    name = models.CharField(max_length=32)
+    name = models.CharField(max_length=32, db_index=True)
     description = models.TextField(default="", blank=True)
     photo_url = models.TextField()
 
+    FILTERS = {"diet_id": EQUALITY, "name": [*EQUALITY, "startswith"]}
+    ORDERING = ["diet_id", "name"]
+
     class Meta:
         db_table = "Diet"
 
 
-class MealPlan(models.Model, Model):
+class MealPlan(Model, models.Model):
     meal_plan_id = models.BigAutoField(primary_key=True)
-    time = models.SmallIntegerField(default=0, choices=TIME_CHOICES)  # type: ignore
+    time = models.SmallIntegerField(default=0, choices=TIME_CHOICES, db_index=True)  # type: ignore
     fk_diet = models.ForeignKey("Diet", on_delete=models.CASCADE)
     foods = models.TextField()
 
+    FILTERS = {"meal_plan_id": EQUALITY, "time": EQUALITY, "diet": EQUALITY}
+    ORDERING = ["meal_plan_id", "time"]
+
     class Meta:
         db_table = "MealPlan"
 
-    def get_foods(self) -> list["Food"]:
-        diets = [
-            Food.secure_get(food_id=int(i)) for i in str(self.foods).split(",") if i
-        ]
+    @property
+    def food_ids(self) -> list[int]:
+        return [int(i) for i in str(self.foods).split(",") if i]
+
+    def get_foods(self, loader=None) -> list["Food"]:
+        if loader is not None:
+            return [i for i in loader.load_many(Food, self.food_ids) if i]
+        diets = [Food.secure_get(food_id=i) for i in self.food_ids]
         return [i for i in diets if i]
 
 
-class Submission(models.Model, Model):
+class Submission(Model, models.Model):
     submission_id = models.BigAutoField(primary_key=True)
     note = models.TextField()
-    reviewer = models.CharField(max_length=16, null=True, blank=True)
+    fk_reviewer = models.ForeignKey(
+        "User",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="reviewed_submissions",
+    )
     fk_user = models.ForeignKey("User", on_delete=models.CASCADE)
     is_accepted = models.BooleanField(default=False)  # type: ignore
+    fk_claimer = models.ForeignKey(
+        "User",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="claimed_submissions",
+    )
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    FILTERS = {
+        "submission_id": COMPARISON,
+        "is_accepted": ["eq"],
+        "reviewer": [*EQUALITY, "isnull"],
+        "user": EQUALITY,
+    }
+    ORDERING = ["submission_id"]
 
     class Meta:
         db_table = "Submission"
+        indexes = [
+            models.Index(
+                fields=["is_accepted", "submission_id"], name="submission_status_idx"
+            ),
+            # Backs the review queue: only pending rows, already in queue order.
+            models.Index(
+                fields=["submission_id"],
+                condition=Q(is_accepted=False),
+                name="submission_pending_idx",
+            ),
+        ]
+
+    @classmethod
+    def get_queue(cls, user: User):
+        """Pending submissions, oldest first, that `user` may work on."""
+        return (
+            cls.objects.filter(is_accepted=False)
+            .filter(Q(fk_claimer=None) | Q(fk_claimer=user) | cls._claim_expired())
+            .order_by("submission_id")
+        )
+
+    @classmethod
+    def claim(cls, user: User, count: int, attempts: int = 3) -> list[int]:
+        """Atomically claims up to `count` of the oldest unclaimed submissions.
+
+        The claimable condition is repeated in the UPDATE itself, so a row
+        claimed by another reviewer between picking ids and writing is skipped
+        rather than taken over; the shortfall is picked up on the next attempt.
+        """
+        claimed = []
+        for _ in range(attempts):
+            claimable = cls.objects.filter(is_accepted=False).filter(
+                Q(fk_claimer=None) | cls._claim_expired()
+            )
+            ids = list(
+                claimable.order_by("submission_id").values_list("pk", flat=True)[
+                    : count - len(claimed)
+                ]
+            )
+            if not ids:
+                break
+            now = timezone.now()
+            claimable.filter(pk__in=ids).update(fk_claimer=user, claimed_at=now)
+            claimed += cls.objects.filter(
+                pk__in=ids, fk_claimer=user, claimed_at=now
+            ).values_list("pk", flat=True)
+            if len(claimed) >= count:
+                break
+        return sorted(claimed)
+
+    @staticmethod
+    def _claim_expired():
+        ttl = timedelta(seconds=settings.SUBMISSION_CLAIM_TTL)
+        return Q(claimed_at__lt=timezone.now() - ttl)
 
 
-class Food(models.Model, Model):
+class Food(Model, models.Model):
     food_id = models.BigAutoField(primary_key=True)
-    name = models.CharField(max_length=32)
+    name = models.CharField(max_length=32, db_index=True)
     description = models.TextField()
     photo_url = models.TextField()
     carbs = models.FloatField()
@@ -110,11 +359,22 @@ class Food(models.Model, Model):
     calories = models.FloatField()
     fk_nutrition = models.ForeignKey("Nutrition", on_delete=models.SET_NULL, null=True)
 
+    FILTERS = {
+        "food_id": ["in", *COMPARISON],
+        "name": [*EQUALITY, "startswith"],
+        "calories": COMPARISON,
+        "protein": COMPARISON,
+        "carbs": COMPARISON,
+        "fat": COMPARISON,
+    }
+    ORDERING = ["food_id", "name", "calories", "protein", "carbs", "fat"]
+
     class Meta:
         db_table = "Food"
+        indexes = [models.Index(fields=["calories"], name="food_calories_idx")]
 
 
-class Nutrition(models.Model, Model):
+class Nutrition(Model, models.Model):
     nutrition_id = models.BigAutoField(primary_key=True)
     vitamins = models.JSONField(default=dict)
     minerals = models.JSONField(default=dict)
@@ -122,3 +382,42 @@ class Nutrition(models.Model, Model):
 
     class Meta:
         db_table = "Nutrition"
+
+
+class TableVersion(Model, models.Model):
+    table = models.CharField(primary_key=True, max_length=32)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "TableVersion"
+
+    @classmethod
+    def bump(cls, table: str):
+        update = {"version": F("version") + 1, "updated_at": timezone.now()}
+        if cls.objects.filter(table=table).update(**update):
+            return
+        _, created = cls.objects.get_or_create(table=table, defaults={"version": 1})
+        if not created:
+            cls.objects.filter(table=table).update(**update)
+
+    @classmethod
+    def get_versions(cls, tables: list[str]) -> dict[str, tuple[int, object]]:
+        return {
+            table: (version, updated_at)
+            for table, version, updated_at in cls.objects.filter(
+                table__in=tables
+            ).values_list("table", "version", "updated_at")
+        }
+
+
+class PendingRender(Model, models.Model):
+    """A changed catalog row whose pre-rendered pages are out of date."""
+
+    pending_render_id = models.BigAutoField(primary_key=True)
+    table = models.CharField(max_length=32)
+    object_id = models.CharField(max_length=64)
+    queued_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "PendingRender"
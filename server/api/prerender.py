@@ -0,0 +1,205 @@
+import json
+import os
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional
+
+from django.test import Client
+
+from .models import Diet, Food, MealPlan, PendingRender
+from .utils.lang import TRANSLATIONS
+
+# Anonymous catalog routes with a static copy, by the model they list.
+LIST_ROUTES = {"food/all": Food, "diet/all": Diet}
+QUERY_ROUTES = {"food/query": Food, "diet/query": Diet}
+MANIFEST = "prerender.json"
+
+
+class RenderError(Exception):
+    pass
+
+
+class Graph:
+    """Which catalog rows each food and diet response is built from."""
+
+    def __init__(self):
+        self.nutrition = dict(Food.objects.values_list("food_id", "fk_nutrition"))
+        self.plans: dict[int, list[tuple[int, list[int]]]] = defaultdict(list)
+        self.plan_diets: dict[int, int] = {}
+        for plan_id, diet_id, foods in MealPlan.objects.values_list(
+            "meal_plan_id", "fk_diet", "foods"
+        ):
+            food_ids = [int(i) for i in foods.split(",") if i]
+            self.plans[diet_id].append((plan_id, food_ids))
+            self.plan_diets[plan_id] = diet_id
+
+    def get_dependencies(self, model, ids: list[int]) -> dict[str, list]:
+        tables = {"Food": set(), "Nutrition": set(), "Diet": set(), "MealPlan": set()}
+        food_ids = set(ids) if model is Food else set()
+        if model is Diet:
+            tables["Diet"].update(ids)
+            for diet_id in ids:
+                for plan_id, plan_foods in self.plans.get(diet_id, []):
+                    tables["MealPlan"].add(plan_id)
+                    food_ids.update(plan_foods)
+        tables["Food"] = food_ids
+        tables["Nutrition"] = {
+            self.nutrition[i] for i in food_ids if self.nutrition.get(i) is not None
+        }
+        return {table: sorted(pks) for table, pks in tables.items() if pks}
+
+
+class Prerenderer:
+    """Writes anonymous catalog responses as files, one per language and page.
+
+    Pages are rendered through the URLconf, so they are byte-for-byte what the
+    live API returns. A manifest next to them records the rows every page was
+    built from; `update` uses it to re-render only pages touched by the rows
+    queued in PendingRender since the last run.
+    """
+
+    def __init__(self, directory: str, page_size: int, langs: Optional[list] = None):
+        self.directory = Path(directory)
+        self.page_size = page_size
+        self.langs = langs or list(TRANSLATIONS)
+        self.client = Client(HTTP_ACCEPT="application/json")
+        self.rendered = 0
+        self.removed = 0
+
+    def get_list_pages(self, route: str, count: int) -> list[str]:
+        size = self.page_size
+        return [f"{route}/@{i}:{size}" for i in range(0, max(count, 1), size)]
+
+    def get_file(self, lang: str, page: str) -> Path:
+        return self.directory / "api" / lang / page
+
+    def render(self, page: str, graph: Graph) -> dict[str, list]:
+        bodies = {}
+        for lang in self.langs:
+            response = self.client.get(f"/api/{lang}/{page}")
+            if response.status_code != 200:
+                raise RenderError(f"{page} returned {response.status_code}")
+            bodies[lang] = response.content
+        for lang, body in bodies.items():
+            write_file(self.get_file(lang, page), body)
+        self.rendered += 1
+
+        route, _ = page.rsplit("/", 1)
+        payload = json.loads(bodies[self.langs[0]])
+        if route in LIST_ROUTES:
+            model = LIST_ROUTES[route]
+            items = payload["results"]
+        else:
+            model = QUERY_ROUTES[route]
+            items = [payload]
+        pk = model._meta.pk.name
+        return graph.get_dependencies(model, [item[pk] for item in items])
+
+    def remove(self, page: str):
+        for lang in self.langs:
+            try:
+                os.remove(self.get_file(lang, page))
+            except FileNotFoundError:
+                pass
+        self.removed += 1
+
+    def get_ids(self) -> dict[str, list[int]]:
+        return {
+            model._meta.db_table: list(
+                model.objects.order_by("pk").values_list("pk", flat=True)
+            )
+            for model in QUERY_ROUTES.values()
+        }
+
+    def render_all(self):
+        # Rows changed while rendering stay queued for the next `update`.
+        last = PendingRender.objects.order_by("-pk").values_list("pk", flat=True)
+        last = last.first() or 0
+        graph, ids = Graph(), self.get_ids()
+        pages = {}
+        for route, model in LIST_ROUTES.items():
+            for page in self.get_list_pages(route, len(ids[model._meta.db_table])):
+                pages[page] = self.render(page, graph)
+        for route, model in QUERY_ROUTES.items():
+            for pk in ids[model._meta.db_table]:
+                page = f"{route}/@{pk}"
+                pages[page] = self.render(page, graph)
+
+        old = self.load_manifest()
+        for page in set(old["pages"] if old else ()) - set(pages):
+            self.remove(page)
+        self.save_manifest(ids, pages)
+        PendingRender.objects.filter(pk__lte=last).delete()
+
+    def update(self):
+        """Re-renders the pages affected by queued changes."""
+        manifest = self.load_manifest()
+        if manifest is None or manifest["page_size"] != self.page_size:
+            return self.render_all()
+        queued = list(
+            PendingRender.objects.order_by("pk").values_list("pk", "table", "object_id")
+        )
+        if not queued:
+            return
+        changed: dict[str, set] = defaultdict(set)
+        for _, table, object_id in queued:
+            changed[table].add(int(object_id))
+
+        graph, ids = Graph(), self.get_ids()
+        # A plan that moved to another diet is in the old diet's dependencies;
+        # the new diet is found through the plan's current row.
+        changed["Diet"].update(
+            graph.plan_diets[i] for i in changed["MealPlan"] if i in graph.plan_diets
+        )
+        pages: dict[str, dict] = manifest["pages"]
+        stale = {
+            page
+            for page, dependencies in pages.items()
+            if any(changed[table] & set(pks) for table, pks in dependencies.items())
+        }
+        for route, model in QUERY_ROUTES.items():
+            table = model._meta.db_table
+            old, new = set(manifest["ids"][table]), set(ids[table])
+            for pk in (changed[table] & new) | (new - old):
+                stale.add(f"{route}/@{pk}")
+            for pk in old - new:
+                stale.discard(f"{route}/@{pk}")
+                pages.pop(f"{route}/@{pk}", None)
+                self.remove(f"{route}/@{pk}")
+            if old == new:
+                continue
+            # Rows were added or removed: every page's overflow count changes.
+            list_route = next(r for r, m in LIST_ROUTES.items() if m is model)
+            list_pages = self.get_list_pages(list_route, len(new))
+            for page in [p for p in pages if p.startswith(f"{list_route}/")]:
+                if page not in list_pages:
+                    stale.discard(page)
+                    pages.pop(page)
+                    self.remove(page)
+            stale.update(list_pages)
+
+        for page in sorted(stale):
+            pages[page] = self.render(page, graph)
+        self.save_manifest(ids, pages)
+        PendingRender.objects.filter(pk__lte=queued[-1][0]).delete()
+
+    def load_manifest(self) -> Optional[dict]:
+        try:
+            with open(self.directory / MANIFEST) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def save_manifest(self, ids: dict, pages: dict):
+        manifest = {"page_size": self.page_size, "ids": ids, "pages": pages}
+        write_file(self.directory / MANIFEST, json.dumps(manifest).encode())
+
+
+def write_file(path: Path, content: bytes):
+    # Replace atomically, so the host never serves a half-written page.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile("wb", dir=path.parent, delete=False) as file:
+        file.write(content)
+    os.chmod(file.name, 0o644)
+    os.replace(file.name, path)
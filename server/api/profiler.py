@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+from django.conf import settings
+
+from .timing import get_current
+
+logger = logging.getLogger("api.profiler")
+
+PROFILE_ID = re.compile(r"^[\w.-]+$")
+
+
+class Sampler(threading.Thread):
+    """Records the call stack of one thread every `interval` seconds."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="api-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                names.append(
+                    f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+                )
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Profiler:
+    """Statistical profiler for single requests, writing folded stacks to disk.
+
+    Profiles are written as `<id>.folded` (input for flamegraph.pl, speedscope
+    and similar) next to `<id>.json` holding the request's timing data. Only the
+    newest `max_profiles` are kept, and at most `max_concurrent` requests per
+    process are profiled at once, so a sampling rate can stay on in production.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        sample_rate: float = 0.0,
+        interval: float = 0.005,
+        max_profiles: int = 100,
+        max_concurrent: int = 1,
+    ):
+        self.directory = str(directory)
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_profiles = max_profiles
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    def sample(self) -> bool:
+        return bool(self.sample_rate) and random.random() < self.sample_rate
+
+    @contextmanager
+    def profile(self, route: str):
+        if not self._slots.acquire(blocking=False):
+            yield None
+            return
+        meta = {"route": route, "started_at": time.time()}
+        sampler = Sampler(threading.get_ident(), self.interval)
+        sampler.start()
+        try:
+            yield meta
+        finally:
+            sampler.stop()
+            self._slots.release()
+            timings = get_current()
+            if timings is not None:
+                meta["timings"] = timings.as_dict()
+            meta["samples"] = sum(sampler.stacks.values())
+            try:
+                self._save(meta, sampler.stacks)
+            except OSError:
+                logger.exception("Could not save profile of %s", route)
+
+    def _save(self, meta: dict, stacks: Counter):
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = "-".join(
+            [
+                time.strftime("%Y%m%d%H%M%S", time.gmtime(meta["started_at"])),
+                meta["route"].replace("/", "."),
+                uuid.uuid4().hex[:8],
+            ]
+        )
+        with open(self.get_path(profile_id, ".folded"), "w") as file:
+            file.writelines(f"{stack} {n}\n" for stack, n in stacks.most_common())
+        with open(self.get_path(profile_id, ".json"), "w") as file:
+            json.dump({"id": profile_id, **meta}, file)
+        self._trim()
+
+    def _trim(self):
+        for profile_id in self.list_ids()[self.max_profiles :]:
+            for extension in (".folded", ".json"):
+                try:
+                    os.remove(self.get_path(profile_id, extension))
+                except FileNotFoundError:
+                    pass
+
+    def get_path(self, profile_id: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}{extension}")
+
+    def list_ids(self) -> list[str]:
+        """Ids of stored profiles, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            (
+                i[: -len(".json")]
+                for i in os.listdir(self.directory)
+                if i.endswith(".json")
+            ),
+            reverse=True,
+        )
+
+    def get_meta(self, profile_id: str) -> Optional[dict]:
+        if not PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(self.get_path(profile_id, ".json")) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def get_folded(self, profile_id: str) -> Optional[str]:
+        if not PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(self.get_path(profile_id, ".folded")) as file:
+                return file.read()
+        except OSError:
+            return None
+
+
+def _build_profiler():
+    options = getattr(settings, "PROFILER", {})
+    return Profiler(
+        directory=options.get(
+            "DIRECTORY", os.path.join(tempfile.gettempdir(), "api-profiles")
+        ),
+        sample_rate=options.get("SAMPLE_RATE", 0.0),
+        interval=options.get("INTERVAL", 0.005),
+        max_profiles=options.get("MAX_PROFILES", 100),
+        max_concurrent=options.get("MAX_CONCURRENT", 1),
+    )
+
+
+profiler = _build_profiler()
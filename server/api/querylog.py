@@ -0,0 +1,26 @@
+import json
+import threading
+from typing import Iterator
+
+_lock = threading.Lock()
+
+
+class QueryLogger:
+    """`connection.execute_wrapper` that appends each statement to a JSON-lines log."""
+
+    def __init__(self, path: str, route: str):
+        self.path = path
+        self.route = route
+
+    def __call__(self, execute, sql, params, many, context):
+        entry = {"route": self.route, "sql": sql, "params": params, "many": many}
+        with _lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(entry, default=str) + "\n")
+        return execute(sql, params, many, context)
+
+
+def read_query_log(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,158 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY = DEFAULT_DB_ALIAS
+
+# Cache validators and the render queue must see the latest writes.
+PRIMARY_ONLY_TABLES = {"TableVersion", "PendingRender"}
+
+
+@dataclass
+class ReadTarget:
+    alias: str
+    # True once the replica is known to have every write the request depends on.
+    is_current: bool = False
+
+
+_target: ContextVar[Optional[ReadTarget]] = ContextVar("read_target", default=None)
+_synced: dict[str, tuple[float, dict[str, int]]] = {}
+
+
+class ReplicaRouter:
+    """Sends reads to the replica picked for the current request, if any, and
+    everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        target = _target.get()
+        if target is None or model._meta.db_table in PRIMARY_ONLY_TABLES:
+            return PRIMARY
+        return target.alias
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema with the data from `sync_replicas`.
+        return db == PRIMARY
+
+
+def get_aliases() -> list[str]:
+    return settings.REPLICAS["ALIASES"]
+
+
+def check_pin_cache():
+    """Pins must be seen by every worker, or a write pinned on one worker does
+    not keep the writer's reads on the primary when another one serves them."""
+    if get_aliases() and isinstance(
+        caches[settings.REPLICAS["PIN_CACHE"]], LocMemCache
+    ):
+        raise ImproperlyConfigured(
+            "REPLICAS['PIN_CACHE'] must be a cache shared between workers, "
+            "not a local-memory cache."
+        )
+
+
+@contextmanager
+def reading_from(alias: Optional[str]):
+    token = _target.set(ReadTarget(alias) if alias else None)
+    try:
+        yield
+    finally:
+        _target.reset(token)
+
+
+def _get_pin_keys(keys: list[str]) -> list[str]:
+    return [f"replica-pin:{key}" for key in keys]
+
+
+def pin(keys: list[str]):
+    """Keeps reads of `keys` (a user, a client address) on the primary for
+    PIN_SECONDS, long enough for the replicas to catch up with their write."""
+    if not get_aliases() or not keys:
+        return
+    cache = caches[settings.REPLICAS["PIN_CACHE"]]
+    cache.set_many(
+        dict.fromkeys(_get_pin_keys(keys), True), settings.REPLICAS["PIN_SECONDS"]
+    )
+
+
+def choose(keys: list[str]) -> Optional[str]:
+    """A replica for a read-only request, or None for the primary."""
+    aliases = get_aliases()
+    if not aliases:
+        return None
+    cache = caches[settings.REPLICAS["PIN_CACHE"]]
+    if keys and cache.get_many(_get_pin_keys(keys)):
+        return None
+    return random.choice(aliases)
+
+
+def get_synced_versions(alias: str) -> dict[str, int]:
+    """Table versions of the replica's last completed sync."""
+    path = f"{connections[alias].settings_dict['NAME']}.versions.json"
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return {}
+    cached = _synced.get(alias)
+    if cached is None or cached[0] != mtime:
+        with open(path) as file:
+            cached = _synced[alias] = (mtime, json.load(file))
+    return cached[1]
+
+
+def check_current(versions: dict[str, int]) -> bool:
+    """Moves the request to the primary unless its replica has the current
+    `versions` of the tables it depends on."""
+    target = _target.get()
+    if target is None or target.alias == PRIMARY:
+        return True
+    synced = get_synced_versions(target.alias)
+    if all(synced.get(table, 0) == version for table, version in versions.items()):
+        target.is_current = True
+    else:
+        target.alias, target.is_current = PRIMARY, True
+    return target.alias != PRIMARY
+
+
+def may_be_stale() -> bool:
+    """Whether reads of this request may miss recent writes; such rows must not
+    be put into shared caches."""
+    target = _target.get()
+    return target is not None and not target.is_current
+
+
+def sync_replica(alias: str) -> dict[str, int]:
+    """Copies the primary into the replica with SQLite's online backup, which
+    gives a consistent snapshot while the primary keeps serving writes."""
+    primary = sqlite3.connect(connections[PRIMARY].settings_dict["NAME"], timeout=30)
+    path = connections[alias].settings_dict["NAME"]
+    replica = sqlite3.connect(path, timeout=30)
+    try:
+        primary.backup(replica)
+        versions = dict(replica.execute('SELECT "table", version FROM "TableVersion"'))
+    finally:
+        primary.close()
+        replica.close()
+    # Written after the copy: the replica is never older than its versions say.
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as file:
+        json.dump(versions, file)
+    os.replace(file.name, f"{path}.versions.json")
+    return versions
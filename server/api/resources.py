@@ -0,0 +1,70 @@
+from import_export import resources
+
+from . import shards
+from .models import (
+    Diet,
+    Food,
+    MealPlan,
+    Nutrition,
+    Profile,
+    Submission,
+    User,
+    Vital,
+)
+
+
+class ShardedResource(resources.ModelResource):
+    """Exports rows from the primary and every shard."""
+
+    def export(self, queryset=None, **kwargs):
+        if queryset is None:
+            queryset = shards.gather(self.get_queryset().order_by("pk"))
+        return super().export(queryset, **kwargs)
+
+
+class UserResource(resources.ModelResource):
+    class Meta:
+        model = User
+        import_id_fields = ("user_id",)
+
+
+class DietResource(resources.ModelResource):
+    class Meta:
+        model = Diet
+        import_id_fields = ("diet_id",)
+
+
+class FoodResource(resources.ModelResource):
+    class Meta:
+        model = Food
+        import_id_fields = ("food_id",)
+
+
+class ProfileResource(ShardedResource):
+    class Meta:
+        model = Profile
+        import_id_fields = ("profile_id",)
+
+
+class MealPlanResource(resources.ModelResource):
+    class Meta:
+        model = MealPlan
+        import_id_fields = ("meal_plan_id",)
+
+
+class NutritionResource(resources.ModelResource):
+    class Meta:
+        model = Nutrition
+        import_id_fields = ("nutrition_id",)
+
+
+class SubmissionResource(resources.ModelResource):
+    class Meta:
+        model = Submission
+        import_id_fields = ("submission_id",)
+
+
+class VitalResource(ShardedResource):
+    class Meta:
+        model = Vital
+        import_id_fields = ("vital_id",)
@@ -1,18 +1,73 @@
 import statistics
+from typing import Optional
 
 from django.http.response import json
 from rest_framework.serializers import ModelSerializer, SerializerMethodField
 
+from .loader import Loader
 from .models import Diet, Food, MealPlan, Nutrition, Profile, Submission, User
+from .timing import phase
+from .utils.fields import Fields
 from .utils.lang import Lang
 
 
-class UserSerializer(ModelSerializer):
-    role = SerializerMethodField()
-
-    def __init__(self, lang: Lang, data):
+class Serializer(ModelSerializer):
+    def __init__(
+        self,
+        lang: Lang,
+        data,
+        loader: Optional[Loader] = None,
+        fields: Optional[Fields] = None,
+    ):
         self._lang = lang
+        self._loader = loader or Loader()
+        self._fields = fields or Fields()
         super().__init__(data)
+        if not self._fields.is_default:
+            for name in list(self.fields):
+                if not self.includes(self._fields, name):
+                    self.fields.pop(name)
+
+    @property
+    def data(self):
+        with phase("serialization"):
+            return super().data
+
+    @classmethod
+    def includes(cls, fields: Fields, name: str) -> bool:
+        return fields.includes(name, name in getattr(cls.Meta, "expandable", []))
+
+    @classmethod
+    def get_only(cls, fields: Fields) -> Optional[list[str]]:
+        if fields.is_default:
+            return None
+        model = cls.Meta.model
+        relations = getattr(cls.Meta, "relations", {})
+        concrete = [field.name for field in model._meta.concrete_fields]
+        only = [model._meta.pk.name]
+        for name in cls.Meta.fields:
+            if not cls.includes(fields, name):
+                continue
+            if name in relations:
+                only.append(relations[name])
+            elif name in concrete:
+                only.append(name)
+        return only
+
+    @classmethod
+    def prime(cls, loader: Loader, instances: list, fields: Fields):
+        pass
+
+    def nested(self, serializer: type["Serializer"], name: str, instance):
+        fields = self._fields.nested(name)
+        return self._loader.memo(
+            (serializer, self._lang.code, fields.key, instance.pk),
+            lambda: serializer(self._lang, instance, self._loader, fields).data,
+        )
+
+
+class UserSerializer(Serializer):
+    role = SerializerMethodField()
 
     class Meta:
         model = User
@@ -37,15 +92,11 @@ class UserSerializer(ModelSerializer):
         return {"id": obj.role, "name": self._lang.translate(f"role.{obj.role}")}
 
 
-class NutritionSerializer(ModelSerializer):
+class NutritionSerializer(Serializer):
     vitamins = SerializerMethodField()
     minerals = SerializerMethodField()
     amino_acids = SerializerMethodField()
 
-    def __init__(self, lang: Lang, data):
-        self._lang = lang
-        super().__init__(data)
-
     class Meta:
         model = Nutrition
         fields = [
@@ -68,15 +119,11 @@ class NutritionSerializer(ModelSerializer):
         return json.loads(obj.amino_acids)  # type: ignore
 
 
-class ProfileSerializer(ModelSerializer):
+class ProfileSerializer(Serializer):
     diet = SerializerMethodField()
     nutrition = SerializerMethodField()
     user = SerializerMethodField()
 
-    def __init__(self, lang: Lang, data):
-        self._lang = lang
-        super().__init__(data)
-
     class Meta:
         model = Profile
         fields = [
@@ -86,25 +133,34 @@ class ProfileSerializer(ModelSerializer):
             "nutrition",
             "user",
         ]
+        expandable = ["nutrition", "user"]
+        relations = {"nutrition": "fk_nutrition", "user": "fk_user"}
 
     @staticmethod
     def get_diet(obj: Profile):
         return None
 
+    @classmethod
+    def prime(cls, loader: Loader, instances: list[Profile], fields: Fields):
+        for name, relation in cls.Meta.relations.items():
+            if cls.includes(fields, name):
+                loader.prime_related(instances, relation)
+
     def get_nutrition(self, obj: Profile):
-        return NutritionSerializer(self._lang, obj.fk_nutrition).data
+        nutrition = self._loader.get_related(obj, "fk_nutrition")
+        if nutrition is None:
+            return NutritionSerializer(self._lang, None).data
+        return self.nested(NutritionSerializer, "nutrition", nutrition)
 
     def get_user(self, obj: Profile):
-        return UserSerializer(self._lang, obj.fk_user).data
+        return self.nested(
+            UserSerializer, "user", self._loader.get_related(obj, "fk_user")
+        )
 
 
-class FoodSerializer(ModelSerializer):
+class FoodSerializer(Serializer):
     nutrition = SerializerMethodField()
 
-    def __init__(self, lang: Lang, data):
-        self._lang = lang
-        super().__init__(data)
-
     class Meta:
         model = Food
         fields = [
@@ -118,19 +174,25 @@ class FoodSerializer(ModelSerializer):
             "calories",
             "nutrition",
         ]
+        expandable = ["nutrition"]
+        relations = {"nutrition": "fk_nutrition"}
 
-    def get_nutrition(self, obj: Profile):
-        return NutritionSerializer(self._lang, obj.fk_nutrition).data
+    @classmethod
+    def prime(cls, loader: Loader, instances: list[Food], fields: Fields):
+        if cls.includes(fields, "nutrition"):
+            loader.prime_related(instances, "fk_nutrition")
+
+    def get_nutrition(self, obj: Food):
+        nutrition = self._loader.get_related(obj, "fk_nutrition")
+        if nutrition is None:
+            return NutritionSerializer(self._lang, None).data
+        return self.nested(NutritionSerializer, "nutrition", nutrition)
 
 
-class SubmissionSerializer(ModelSerializer):
+class SubmissionSerializer(Serializer):
     reviewer = SerializerMethodField()
     user = SerializerMethodField()
 
-    def __init__(self, lang: Lang, data):
-        self._lang = lang
-        super().__init__(data)
-
     class Meta:
         model = Submission
         fields = [
@@ -140,26 +202,31 @@ class SubmissionSerializer(ModelSerializer):
             "user",
             "is_accepted",
         ]
+        expandable = ["reviewer", "user"]
+        relations = {"reviewer": "fk_reviewer", "user": "fk_user"}
+
+    @classmethod
+    def prime(cls, loader: Loader, instances: list[Submission], fields: Fields):
+        if cls.includes(fields, "reviewer"):
+            loader.prime_related(instances, "fk_reviewer")
+        if cls.includes(fields, "user"):
+            loader.prime_related(instances, "fk_user")
 
     def get_reviewer(self, obj: Submission):
-        if obj.reviewer is None:
-            return None
-        user = User.secure_get(user_id=obj.reviewer)
+        user = self._loader.get_related(obj, "fk_reviewer")
         if user is None:
             return None
-        return UserSerializer(self._lang, user).data
+        return self.nested(UserSerializer, "reviewer", user)
 
     def get_user(self, obj: Submission):
-        return UserSerializer(self._lang, obj.fk_user).data
+        return self.nested(
+            UserSerializer, "user", self._loader.get_related(obj, "fk_user")
+        )
 
 
-class DietSerializer(ModelSerializer):
+class DietSerializer(Serializer):
     average_intake = SerializerMethodField()
 
-    def __init__(self, lang: Lang, data):
-        self._lang = lang
-        super().__init__(data)
-
     class Meta:
         model = Diet
         fields = [
@@ -169,12 +236,33 @@ class DietSerializer(ModelSerializer):
             "photo_url",
             "average_intake",
         ]
+        expandable = ["average_intake"]
+
+    @classmethod
+    def prime(cls, loader: Loader, instances: list[Diet], fields: Fields):
+        if not cls.includes(fields, "average_intake") or loader.catalog is not None:
+            return
+        loader.prime_children(MealPlan, "fk_diet", [obj.diet_id for obj in instances])
+        plans = [
+            plan
+            for obj in instances
+            for plan in loader.children(MealPlan, "fk_diet", obj.diet_id)
+        ]
+        loader.prime(Food, [food_id for plan in plans for food_id in plan.food_ids])
 
     def get_average_intake(self, obj: Diet):
+        if self._loader.catalog is not None:
+            return self._loader.catalog.get_average_intake(obj.diet_id)
+        return self._loader.memo(
+            ("average_intake", obj.diet_id),
+            lambda: self._get_average_intake(obj),
+        )
+
+    def _get_average_intake(self, obj: Diet):
         def get(property: str):
             return statistics.mean(
                 [
-                    statistics.mean([getattr(food, property) for food in plan.get_foods()] or [0.0])  # type: ignore
+                    statistics.mean([getattr(food, property) for food in plan.get_foods(self._loader)] or [0.0])  # type: ignore
                     for plan in meal_plans
                 ]
                 or [0.0]
@@ -183,7 +271,7 @@ class DietSerializer(ModelSerializer):
         def get_nutrition(property: str):
             data: dict[str, tuple[float, int]] = {}
             for plan in meal_plans:
-                for food in plan.get_foods():
+                for food in plan.get_foods(self._loader):
                     for key, value in json.loads(
                         getattr(food.fk_nutrition, property)
                     ).items():
@@ -193,7 +281,9 @@ class DietSerializer(ModelSerializer):
                             data[key] = (data[key][0] + value, data[key][1] + 1)
             return {k: v[0] / v[1] for k, v in data.items()}
 
-        meal_plans: list[MealPlan] = MealPlan.objects.filter(fk_diet_id=obj).all()
+        meal_plans: list[MealPlan] = self._loader.children(
+            MealPlan, "fk_diet", obj.diet_id
+        )
         return {
             "carbs": get("carbs"),
             "protein": get("protein"),
@@ -205,13 +295,9 @@ class DietSerializer(ModelSerializer):
         }
 
 
-class MealPlanSerializer(ModelSerializer):
+class MealPlanSerializer(Serializer):
     diet = SerializerMethodField()
 
-    def __init__(self, lang: Lang, data):
-        self._lang = lang
-        super().__init__(data)
-
     class Meta:
         model = MealPlan
         fields = [
@@ -219,6 +305,20 @@ class MealPlanSerializer(ModelSerializer):
             "time",
             "diet",
         ]
+        expandable = ["diet"]
+        relations = {"diet": "fk_diet"}
+
+    @classmethod
+    def prime(cls, loader: Loader, instances: list[MealPlan], fields: Fields):
+        if not cls.includes(fields, "diet"):
+            return
+        loader.prime_related(instances, "fk_diet")
+        diets = [loader.get_related(obj, "fk_diet") for obj in instances]
+        DietSerializer.prime(
+            loader, [diet for diet in diets if diet is not None], fields.nested("diet")
+        )
 
     def get_diet(self, obj: MealPlan):
-        return DietSerializer(self._lang, obj.fk_diet).data
+        return self.nested(
+            DietSerializer, "diet", self._loader.get_related(obj, "fk_diet")
+        )
@@ -0,0 +1,261 @@
+import hashlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+
+PRIMARY = DEFAULT_DB_ALIAS
+
+# Per-user tables; every row lives on the shard of its `fk_user`.
+SHARDED_TABLES = {"Profile", "Vital"}
+USER_LOOKUPS = {"fk_user", "fk_user_id", "fk_user__pk", "fk_user__user_id"}
+
+# Ids on shard k start at k << ID_BITS, so they are unique across shards and
+# name the file a row was created in. Rows on the primary keep ids below that.
+ID_BITS = 40
+
+T = TypeVar("T")
+
+
+def get_aliases() -> list[str]:
+    return settings.SHARDING["ALIASES"]
+
+
+def get_locations() -> list[str]:
+    """Every database that can hold per-user rows: the primary keeps rows that
+    `rebalance_shards` has not moved yet."""
+    return [PRIMARY, *get_aliases()]
+
+
+def is_sharded(model) -> bool:
+    return bool(get_aliases()) and model._meta.db_table in SHARDED_TABLES
+
+
+def get_models() -> list:
+    return [
+        model
+        for model in apps.get_app_config("api").get_models()
+        if model._meta.db_table in SHARDED_TABLES
+    ]
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Lamping and Veach's jump consistent hash. Going from n to n + 1 buckets
+    moves 1/(n + 1) of the keys, all of them into the new bucket."""
+    bucket, j = -1, 0
+    while j < buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for(user_id) -> str:
+    """The alias that stores the per-user rows of `user_id`."""
+    aliases = get_aliases()
+    if not aliases:
+        return PRIMARY
+    digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+    return aliases[jump_hash(int.from_bytes(digest, "little"), len(aliases))]
+
+
+def alias_for_id(pk) -> Optional[str]:
+    """The shard a row with this id was created on, or None for the primary."""
+    try:
+        index = int(pk) >> ID_BITS
+    except (TypeError, ValueError):
+        return None
+    aliases = get_aliases()
+    return aliases[index - 1] if 0 < index <= len(aliases) else None
+
+
+class ShardRouter:
+    """Sends per-user rows to the shard of their user, and rows of shared tables
+    reached from a sharded row back to the primary. Anything else is left to
+    the next router."""
+
+    def _get_shard(self, model, hints) -> Optional[str]:
+        instance = hints.get("instance")
+        if instance is None:
+            return None
+        if isinstance(instance, model):
+            if instance._state.db and not instance._state.adding:
+                return instance._state.db
+            return shard_for(instance.fk_user_id)
+        if instance._meta.db_table == "User":
+            return shard_for(instance.pk)
+        return None
+
+    def _route(self, model, hints) -> Optional[str]:
+        if is_sharded(model):
+            return self._get_shard(model, hints)
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db in get_aliases():
+            return PRIMARY
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db not in get_aliases():
+            return None
+        return app_label == "api" and model_name in {
+            table.lower() for table in SHARDED_TABLES
+        }
+
+
+class ShardedQuerySet(models.QuerySet):
+    """Picks the shard from the lookups, so `filter(fk_user=...)`, `get(pk=...)`,
+    `create(fk_user=...)` and `bulk_create` work unchanged. Queries that name
+    neither a user nor a shard id go to the primary; use `scatter` for those."""
+
+    def _get_alias(self, kwargs: dict) -> Optional[str]:
+        if self._db is not None or not get_aliases():
+            return None
+        for key, value in kwargs.items():
+            if key in USER_LOOKUPS:
+                return shard_for(getattr(value, "pk", value))
+            if key in ("pk", self.model._meta.pk.name):
+                return alias_for_id(value)
+        return None
+
+    def filter(self, *args, **kwargs):
+        alias = self._get_alias(kwargs)
+        queryset = self.using(alias) if alias else self
+        return super(ShardedQuerySet, queryset).filter(*args, **kwargs)
+
+    def create(self, **kwargs):
+        alias = self._get_alias(kwargs)
+        queryset = self.using(alias) if alias else self
+        return super(ShardedQuerySet, queryset).create(**kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if self._db is not None or not get_aliases():
+            return super().bulk_create(objs, *args, **kwargs)
+        objs = list(objs)
+        groups = defaultdict(list)
+        for obj in objs:
+            groups[shard_for(obj.fk_user_id)].append(obj)
+        for alias, group in groups.items():
+            self.using(alias).bulk_create(group, *args, **kwargs)
+        return objs
+
+
+ShardedManager = models.Manager.from_queryset(ShardedQuerySet)
+
+
+def reserve_ids(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Moves the id sequences of a migrated shard to its range (`post_migrate`)."""
+    aliases = get_aliases()
+    if using not in aliases:
+        return
+    start = (aliases.index(using) + 1) << ID_BITS
+    with connections[using].cursor() as cursor:
+        for table in sorted(SHARDED_TABLES):
+            cursor.execute(
+                "UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s",
+                [start, table, start],
+            )
+            cursor.execute(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)",
+                [table, start, table],
+            )
+
+
+def scatter(fn: Callable[[str], T], aliases: Optional[list] = None) -> dict[str, T]:
+    """Calls `fn(alias)` for every location at once and returns the results by
+    alias. Each call runs in its own thread with its own connections."""
+    aliases = aliases or get_locations()
+    if len(aliases) == 1:
+        return {aliases[0]: fn(aliases[0])}
+
+    def run(alias: str) -> T:
+        try:
+            return fn(alias)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=len(aliases)) as pool:
+        return dict(zip(aliases, pool.map(run, aliases)))
+
+
+def gather(queryset) -> list:
+    """Rows of `queryset` from every location."""
+    results = scatter(lambda alias: list(queryset.using(alias)))
+    return [row for rows in results.values() for row in rows]
+
+
+def aggregate(model, **expressions) -> dict[str, dict]:
+    """`model.objects.aggregate(**expressions)` on every location, by alias."""
+    return scatter(lambda alias: model.objects.using(alias).aggregate(**expressions))
+
+
+def delete_references(model, pk) -> dict:
+    """Applies `on_delete` of sharded foreign keys to a deleted shared row, since
+    shards have no constraints into the primary. Returns the ids of rows that
+    were set to null, by model; deleted rows send their own signals."""
+    updated = defaultdict(list)
+    for alias in get_aliases():
+        for sharded in get_models():
+            for field in sharded._meta.concrete_fields:
+                if not field.many_to_one or field.related_model is not model:
+                    continue
+                rows = sharded.objects.using(alias).filter(**{field.attname: pk})
+                if field.remote_field.on_delete is models.CASCADE:
+                    rows.delete()
+                elif field.remote_field.on_delete is models.SET_NULL:
+                    pks = list(rows.values_list("pk", flat=True))
+                    rows.filter(pk__in=pks).update(**{field.attname: None})
+                    updated[sharded].extend(pks)
+    return updated
+
+
+def rebalance(model, batch_size: int = 1000, dry_run: bool = False) -> dict:
+    """Moves rows of `model` that are not on the shard of their user there, and
+    returns the number moved by (source, target).
+
+    Rows are inserted into the target before they are deleted from the source,
+    and the target commits first: an interrupted run can leave a row in both
+    places, but never loses one. Moved rows get new ids in the target's range.
+    """
+    moved = defaultdict(int)
+    for source in get_locations():
+        last = 0
+        while True:
+            batch = list(
+                model.objects.using(source)
+                .filter(pk__gt=last)
+                .order_by("pk")[:batch_size]
+            )
+            if not batch:
+                break
+            last = batch[-1].pk
+            groups = defaultdict(list)
+            for row in batch:
+                target = shard_for(row.fk_user_id)
+                if target != source:
+                    groups[target].append(row)
+            for target, rows in groups.items():
+                moved[(source, target)] += len(rows)
+                if dry_run:
+                    continue
+                pks = [row.pk for row in rows]
+                with transaction.atomic(using=source):
+                    with transaction.atomic(using=target):
+                        for row in rows:
+                            row.pk = None
+                            row._state.adding = True
+                        model.objects.using(target).bulk_create(rows)
+                    model.objects.using(source).filter(pk__in=pks).delete()
+    return dict(moved)
@@ -0,0 +1,112 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import shards
+from .cache import object_cache, response_cache
+from .models import (
+    Diet,
+    Food,
+    MealPlan,
+    Nutrition,
+    PendingRender,
+    Profile,
+    Submission,
+    TableVersion,
+    User,
+)
+
+CACHED_MODELS = [User, Profile, Diet, MealPlan, Submission, Food, Nutrition]
+
+# Rows that pre-rendered catalog pages are built from.
+PRERENDERED_MODELS = [Food, Nutrition, Diet, MealPlan]
+
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_invalidation():
+    """Collects invalidations inside the block and runs them once per model.
+
+    Bulk writes would otherwise evict and bump the table version once per row.
+    Nothing runs when the block raises: its writes are rolled back.
+    """
+    if getattr(_deferred, "pending", None) is not None:
+        yield
+        return
+    pending = _deferred.pending = defaultdict(set)
+    try:
+        yield
+    finally:
+        _deferred.pending = None
+    for model, pks in pending.items():
+        invalidate(model, pks)
+
+
+@cache
+def get_versioned_tables() -> frozenset[str]:
+    """Tables whose version someone reads: `@depends_on` routes (ETags, replica
+    freshness) and the catalog snapshot. Writes to other tables, such as users
+    on every IoT update or login, skip the version bump."""
+    from . import views  # noqa: F401 - defines the routes
+    from .catalog import TABLES
+    from .utils import View
+
+    return frozenset(TABLES).union(
+        *(
+            getattr(fn, "depends_on", ())
+            for cls in View.__subclasses__()
+            for _, fn in cls._get_locals()
+        )
+    )
+
+
+def invalidate(model, pks):
+    pending = getattr(_deferred, "pending", None)
+    if pending is not None:
+        pending[model].update(pks)
+        return
+
+    def evict():
+        for pk in pks:
+            object_cache.delete(model, pk)
+        response_cache.invalidate(model._meta.db_table)
+
+    # Evict now so this request sees fresh rows, and again after commit so a
+    # concurrent reader cannot re-populate the cache with pre-commit data.
+    evict()
+    transaction.on_commit(evict)
+    if model._meta.db_table in get_versioned_tables():
+        TableVersion.bump(model._meta.db_table)
+    if model in PRERENDERED_MODELS and settings.PRERENDER["DIRECTORY"]:
+        PendingRender.objects.bulk_create(
+            PendingRender(table=model._meta.db_table, object_id=str(pk)) for pk in pks
+        )
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def on_model_change(sender, instance, **kwargs):
+    if sender not in CACHED_MODELS:
+        return
+    invalidate(sender, [instance.pk])
+
+
+@receiver(post_delete)
+def on_shared_row_delete(sender, instance, **kwargs):
+    # Shards have no foreign keys into the primary, so their rows are not in
+    # the deletion's cascade; delete or detach them once the deletion commits.
+    if not shards.get_aliases() or sender in shards.get_models():
+        return
+
+    def cascade():
+        for model, pks in shards.delete_references(sender, instance.pk).items():
+            invalidate(model, pks)
+
+    transaction.on_commit(cascade, using=instance._state.db)
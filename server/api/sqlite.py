@@ -0,0 +1,144 @@
+import fcntl
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger("api.sqlite")
+
+CHECKPOINT_MODES = ["passive", "full", "restart", "truncate"]
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Applies SQLITE["PRAGMAS"] to a new connection (`connection_created`)."""
+    if connection.vendor != "sqlite":
+        return
+    # The raw connection, so request timing does not count these statements.
+    for name, value in settings.SQLITE["PRAGMAS"].items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
+
+
+def run_maintenance(vacuum_pages: int = 1000, checkpoint: str = "passive") -> dict:
+    """Checkpoints the WAL, refreshes planner statistics and returns up to
+    `vacuum_pages` free pages to the file system."""
+    if checkpoint not in CHECKPOINT_MODES:
+        raise ValueError(f"Unknown checkpoint mode {checkpoint!r}")
+    stats = {}
+    with connection.cursor() as cursor:
+        started = time.perf_counter()
+        cursor.execute(f"PRAGMA wal_checkpoint({checkpoint.upper()})")
+        busy, wal_pages, checkpointed = cursor.fetchone()
+        stats["checkpoint"] = {
+            "busy": bool(busy),
+            "wal_pages": wal_pages,
+            "checkpointed": checkpointed,
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+        started = time.perf_counter()
+        # Sample at most ~1000 rows per index, so this stays cheap on big tables.
+        cursor.execute("PRAGMA analysis_limit = 1000")
+        cursor.execute("ANALYZE")
+        stats["analyze"] = {"ms": round((time.perf_counter() - started) * 1000, 1)}
+
+        started = time.perf_counter()
+        cursor.execute("PRAGMA auto_vacuum")
+        (auto_vacuum,) = cursor.fetchone()
+        cursor.execute("PRAGMA freelist_count")
+        (free_pages,) = cursor.fetchone()
+        freed = 0
+        if auto_vacuum == 2 and free_pages and vacuum_pages:
+            cursor.execute(f"PRAGMA incremental_vacuum({int(vacuum_pages)})")
+            cursor.fetchall()
+            freed = min(free_pages, vacuum_pages)
+        stats["vacuum"] = {
+            "incremental": auto_vacuum == 2,
+            "free_pages": free_pages,
+            "freed_pages": freed,
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+    return stats
+
+
+def enable_incremental_vacuum():
+    """Switches an existing database to incremental auto-vacuum. This rewrites
+    the whole file with VACUUM, so run it during a quiet period."""
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.execute("VACUUM")
+
+
+class MaintenanceLock:
+    """Non-blocking file lock, so only one process runs maintenance at a time."""
+
+    def __init__(self):
+        self.path = f"{connection.settings_dict['NAME']}-maintenance.lock"
+        self._file = None
+
+    def acquire(self) -> bool:
+        self._file = open(self.path, "a")
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._file.close()
+            self._file = None
+            return False
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class MaintenanceScheduler(threading.Thread):
+    """Runs `run_maintenance` every `interval` seconds in a daemon thread."""
+
+    def __init__(self, interval: float):
+        super().__init__(name="sqlite-maintenance", daemon=True)
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.run_once()
+
+    def run_once(self) -> Optional[dict]:
+        lock = MaintenanceLock()
+        if not lock.acquire():
+            return None
+        try:
+            stats = run_maintenance()
+            logger.info("SQLite maintenance %s", stats)
+            return stats
+        except Exception:
+            logger.exception("SQLite maintenance failed")
+            return None
+        finally:
+            lock.release()
+            connection.close()
+
+    def stop(self):
+        self._stopped.set()
+
+
+_scheduler: Optional[MaintenanceScheduler] = None
+
+
+def start_scheduler():
+    """Starts the maintenance thread of this process, if the profile has one."""
+    global _scheduler
+    interval = settings.SQLITE["MAINTENANCE_INTERVAL"]
+    if _scheduler is not None or not interval or settings.SERVERLESS:
+        return
+    if connection.vendor != "sqlite" or not os.path.exists(
+        connection.settings_dict["NAME"]
+    ):
+        return
+    _scheduler = MaintenanceScheduler(interval)
+    _scheduler.start()
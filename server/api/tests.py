@@ -1,3 +1,1690 @@
-from django.test import TestCase
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import timing
+from .cache import LRUCache, SingleFlight, object_cache, response_cache
+from .catalog import catalog_file
+from .metrics import ALL, LIVE, Metrics, MmapValues
+from .models import (
+    Diet,
+    Food,
+    MealPlan,
+    Nutrition,
+    Profile,
+    Submission,
+    TableVersion,
+    User,
+    Vital,
+)
+from .prerender import Prerenderer
+from .profiler import profiler
+from .replicas import check_pin_cache
+from .signals import deferred_invalidation, invalidate
+from .sqlite import configure_connection, run_maintenance
+from .utils import Lang, View, query, transform_name
+
+
+def create_food(name: str = "Apple") -> Food:
+    nutrition = Nutrition(
+        vitamins=json.dumps({"vitamin_c": 4.6}),
+        minerals=json.dumps({"potassium": 107.0}),
+        amino_acids=json.dumps({"valine": 0.012}),
+    )
+    nutrition.save()
+    food = Food(
+        name=name,
+        description="",
+        photo_url="https://example.com/food.png",
+        carbs=13.8,
+        protein=0.3,
+        fat=0.2,
+        calories=52.0,
+        fk_nutrition=nutrition,
+    )
+    food.save()
+    return food
+
+
+def create_user(user_id: str = "manager", role: int = 1) -> User:
+    return User.objects.create(
+        user_id=user_id,
+        email=f"{user_id}@example.com",
+        password="$2b$12$notarealhash",
+        first_name="Test",
+        last_name="User",
+        date_of_birth="2000-01-01",
+        role=role,
+    )
+
+
+FOOD_BODY = {
+    "description": "",
+    "photo_url": "https://example.com/food.png",
+    "carbs": "1",
+    "protein": "2",
+    "fat": "3",
+    "calories": "4",
+    "vitamins": {"vitamin_c": 1.0},
+    "minerals": {"iron": 1.0},
+    "amino_acids": {"valine": 1.0},
+}
+
+
+class BatchLoadingTest(TestCase):
+    def setUp(self):
+        object_cache.clear()
+        response_cache.clear()
+        foods = [create_food(f"Food {i}") for i in range(10)]
+        diets = [Diet.objects.create(name=f"Diet {i}", photo_url="") for i in range(5)]
+        for i in range(50):
+            MealPlan.objects.create(
+                fk_diet=diets[i % len(diets)],
+                time=i % 4,
+                foods=",".join(str(food.food_id) for food in foods[i % 7 :][:4]),
+            )
+
+    def count_queries(self, url: str) -> int:
+        response_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_sparse_fieldsets_skip_unrequested_relations(self):
+        full = self.count_queries("/api/us/mealplan/all/@0:50")
+        sparse = self.count_queries("/api/us/mealplan/all/@0:50?expand=diet")
+        bare = self.count_queries("/api/us/mealplan/all/@0:50?fields=meal_plan_id,time")
+
+        self.assertLess(sparse, full)
+        self.assertLess(bare, sparse)
+        self.assertEqual(
+            self.client.get("/api/us/food/all/@0:1?fields=name").json()["results"],
+            [{"name": "Food 0"}],
+        )
+
+    def test_meal_plan_page_uses_a_handful_of_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/us/mealplan/all/@0:50")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 50)
+        self.assertLessEqual(len(queries), 8)
+
+
+class BatchFetchTest(TestCase):
+    def setUp(self):
+        object_cache.clear()
+        response_cache.clear()
+        self.foods = [create_food(f"Food {i}") for i in range(3)]
+
+    def test_results_keep_request_order_with_not_found_markers(self):
+        ids = [self.foods[2].food_id, 999, self.foods[0].food_id]
+
+        response = self.client.get(f"/api/us/food/many/@{','.join(map(str, ids))}")
+
+        results = response.json()["results"]
+        self.assertEqual(results[0]["food_id"], ids[0])
+        self.assertEqual(results[1], {"id": "999", "error": "Not found."})
+        self.assertEqual(results[2]["food_id"], ids[2])
+
+    def test_foods_and_nutrition_are_fetched_in_one_query(self):
+        ids = ",".join(str(food.food_id) for food in self.foods)
+
+        with self.assertNumQueries(2):  # table versions + foods
+            self.client.get(f"/api/us/food/many/@{ids}")
+
+
+class ConditionalRequestTest(TestCase):
+    def setUp(self):
+        object_cache.clear()
+        response_cache.clear()
+        self.food = create_food()
+
+    def test_etag_and_last_modified_are_sent(self):
+        response = self.client.get("/api/us/food/all/@0:10")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["ETag"].startswith('"'))
+        self.assertIn("Last-Modified", response.headers)
+
+    def test_not_modified_only_checks_version(self):
+        etag = self.client.get("/api/us/food/all/@0:10").headers["ETag"]
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/api/us/food/all/@0:10", HTTP_IF_NONE_MATCH=etag
+            )
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+
+    def test_etag_changes_after_write(self):
+        etag = self.client.get(f"/api/us/food/query/@{self.food.food_id}").headers[
+            "ETag"
+        ]
+
+        self.food.name = "Pear"
+        self.food.save()
+        response = self.client.get(
+            f"/api/us/food/query/@{self.food.food_id}", HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.json()["name"], "Pear")
+
+    def test_etag_depends_on_language(self):
+        us = self.client.get("/api/us/food/all/@0:10").headers["ETag"]
+        ua = self.client.get("/api/ua/food/all/@0:10").headers["ETag"]
+
+        self.assertNotEqual(us, ua)
+
+
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        object_cache.clear()
+        response_cache.clear()
+        self.food = create_food()
+        self.url = f"/api/us/food/query/@{self.food.food_id}"
+
+    def test_cached_hit_does_not_touch_the_database(self):
+        first = self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first.headers["ETag"], second.headers["ETag"])
+
+    def test_languages_are_cached_separately(self):
+        self.client.get(self.url)
+        self.client.get(f"/api/ua/food/query/@{self.food.food_id}")
+
+        self.assertEqual(response_cache.stats()["size"], 2)
+
+    def test_write_invalidates_cached_response(self):
+        self.client.get(self.url)
+
+        self.food.name = "Pear"
+        self.food.save()
+
+        self.assertEqual(response_cache.stats()["size"], 0)
+        self.assertEqual(self.client.get(self.url).json()["name"], "Pear")
+
+    def test_only_tables_read_by_routes_are_versioned(self):
+        user = create_user()
+        user.first_name = "Changed"
+        user.save()
+        self.food.name = "Pear"
+        self.food.save()
+
+        versions = TableVersion.get_versions(["User", "Food"])
+        self.assertNotIn("User", versions)
+        self.assertIn("Food", versions)
+
+    def test_write_after_reading_versions_is_not_cached(self):
+        get_versions = TableVersion.get_versions
+
+        def get_versions_then_write(tables):
+            versions = get_versions(tables)
+            response_cache.invalidate("Food")
+            return versions
+
+        with mock.patch.object(
+            TableVersion, "get_versions", side_effect=get_versions_then_write
+        ):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        self.assertEqual(response_cache.stats()["size"], 0)
+
+
+class SingleFlightTest(SimpleTestCase):
+    def run_concurrently(self, flight: SingleFlight, fn, count: int = 8):
+        results, errors = [], []
+
+        def call():
+            try:
+                results.append(flight.do("key", fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_callers_share_one_computation(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return "result"
+
+        results, errors = self.run_concurrently(SingleFlight(), compute)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["result"] * 8)
+        self.assertEqual(errors, [])
+
+    def test_errors_are_propagated_to_waiters(self):
+        def compute():
+            time.sleep(0.1)
+            raise ValueError("boom")
+
+        results, errors = self.run_concurrently(SingleFlight(), compute)
+
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 8)
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+
+    def test_waiters_time_out(self):
+        results, errors = self.run_concurrently(
+            SingleFlight(timeout=0.05), lambda: time.sleep(0.3) or "late", count=3
+        )
+
+        self.assertEqual(results, ["late"])
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(all(isinstance(e, TimeoutError) for e in errors))
+
+
+class ObjectCacheTest(TestCase):
+    def setUp(self):
+        object_cache.clear()
+        self.user = create_user()
+
+    def cache(self, model, pk):
+        with self.captureOnCommitCallbacks(execute=True):
+            return model.secure_get(pk=pk)
+
+    def test_lru_evicts_least_recent_and_expired_entries(self):
+        with mock.patch("api.cache.time.monotonic", return_value=100.0) as now:
+            lru = LRUCache(max_size=2, ttl=10)
+            lru.set("a", 1)
+            lru.set("b", 2)
+            lru.get("a")
+            lru.set("c", 3)
+            self.assertEqual([lru.get(key, None) for key in "abc"], [1, None, 3])
+
+            now.return_value = 111.0
+            self.assertIsNone(lru.get("a", None))
+        self.assertEqual((lru.hits, lru.misses), (3, 2))
+
+    def test_reads_hit_until_a_write_invalidates(self):
+        self.cache(User, self.user.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(User.secure_get(pk=self.user.pk).first_name, "Test")
+        self.assertEqual(len(queries), 0)
+
+        self.user.first_name = "Changed"
+        self.user.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(User.secure_get(pk=self.user.pk).first_name, "Changed")
+        self.assertEqual(len(queries), 1)
+
+    def test_json_values_are_not_shared_with_callers(self):
+        profile = Profile.objects.create(fk_user=self.user, preferences={"a": 1})
+        self.cache(Profile, profile.pk)
+
+        Profile.secure_get(pk=profile.pk).preferences["a"] = 2
+
+        self.assertEqual(Profile.secure_get(pk=profile.pk).preferences, {"a": 1})
+
+    def test_authentication_does_not_trust_cached_users(self):
+        self.cache(User, self.user.pk)
+        # Another worker changes the password; this one never sees a signal.
+        User.objects.filter(pk=self.user.pk).update(password="changed")
+
+        response = self.client.get(
+            "/api/us/system/cache", HTTP_AUTHORIZATION=self.user.token
+        )
+
+        self.assertEqual(response.status_code, 401)
+
+
+class BatchOperationTest(TestCase):
+    def setUp(self):
+        object_cache.clear()
+        response_cache.clear()
+        self.user = create_user()
+
+    def post_batch(self, operations: list):
+        return self.client.post(
+            "/api/us/system/batch",
+            {"operations": operations},
+            content_type="application/json",
+            HTTP_AUTHORIZATION=self.user.token,
+        )
+
+    def test_operations_can_reference_earlier_results(self):
+        response = self.post_batch(
+            [
+                {
+                    "route": "diet/create",
+                    "body": {
+                        "name": "Keto",
+                        "description": "",
+                        "photo_url": "https://x",
+                    },
+                },
+                {"route": "food/create", "body": {"name": "Egg", **FOOD_BODY}},
+                {"route": "food/create", "body": {"name": "Bacon", **FOOD_BODY}},
+                {
+                    "route": "mealplan/create",
+                    "body": {
+                        "time": 0,
+                        "diet_id": "$0.diet_id",
+                        "foods": "$1.food_id,$2.food_id",
+                    },
+                },
+            ]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        statuses = [result["status"] for result in response.json()["results"]]
+        self.assertEqual(statuses, [200, 200, 200, 200])
+        meal_plan = MealPlan.objects.get()
+        self.assertEqual(meal_plan.fk_diet.name, "Keto")  # type: ignore
+        self.assertEqual(
+            [food.name for food in meal_plan.get_foods()], ["Egg", "Bacon"]
+        )
+
+    def test_failed_operation_rolls_back_the_batch(self):
+        response = self.post_batch(
+            [
+                {"route": "food/create", "body": {"name": "Egg", **FOOD_BODY}},
+                {
+                    "route": "mealplan/create",
+                    "body": {"time": 0, "diet_id": "999", "foods": ""},
+                },
+            ]
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["results"][1]["status"], 404)
+        self.assertFalse(Food.objects.exists())
+        self.assertFalse(Nutrition.objects.exists())
+
+    def test_rolled_back_rows_are_not_cached(self):
+        response = self.post_batch(
+            [
+                {
+                    "route": "diet/create",
+                    "body": {
+                        "name": "Ghost",
+                        "description": "",
+                        "photo_url": "https://x",
+                    },
+                },
+                {
+                    "route": "mealplan/create",
+                    "body": {"time": 0, "diet_id": "$0.diet_id", "foods": ""},
+                },
+                {"route": "diet/query", "query_id": "999"},
+            ]
+        )
+
+        self.assertEqual(response.status_code, 409)
+        diet_id = response.json()["results"][0]["body"]["diet_id"]
+        self.assertFalse(Diet.objects.exists())
+        self.assertIsNone(Diet.secure_get(diet_id=diet_id))
+        self.assertEqual(
+            self.client.get(f"/api/us/diet/query/@{diet_id}").status_code, 404
+        )
+
+    def test_query_ids_are_checked_like_url_segments(self):
+        food = create_food("Egg")
+
+        response = self.post_batch(
+            [
+                {"route": "food/query", "query_id": food.food_id},
+                {"route": "food/query", "query_id": "abc"},
+            ]
+        )
+
+        self.assertEqual(response.status_code, 409)
+        statuses = [result["status"] for result in response.json()["results"]]
+        self.assertEqual(statuses, [200, 400])
+
+    def test_raw_responses_are_returned_as_text(self):
+        User.objects.filter(pk=self.user.pk).update(role=2)
+
+        response = self.post_batch([{"route": "system/metrics"}])
+
+        self.assertEqual(response.status_code, 200)
+        result = response.json()["results"][0]
+        self.assertEqual(result["status"], 201)
+        self.assertIn("# TYPE", result["body"])
+
+
+class QueryLanguageTest(TestCase):
+    def setUp(self):
+        object_cache.clear()
+        response_cache.clear()
+        query._table_sizes.clear()
+        for i, name in enumerate(["Apple", "Banana", "Cherry", "Apricot"]):
+            food = create_food(name)
+            food.calories = 100 * (i + 1)
+            food.save()
+
+    def get_names(self, query: str) -> list:
+        response = self.client.get(f"/api/us/food/all/@0:10?{query}")
+        self.assertEqual(response.status_code, 200)
+        return [food["name"] for food in response.json()["results"]]
+
+    def test_filter_and_order(self):
+        self.assertEqual(
+            self.get_names("filter=calories:lt:350,name:startswith:A&order=-name"),
+            ["Apple"],
+        )
+        self.assertEqual(
+            self.get_names("order=-calories"), ["Apricot", "Cherry", "Banana", "Apple"]
+        )
+        self.assertEqual(
+            self.get_names("filter=name:in:Banana|Cherry&order=name"),
+            ["Banana", "Cherry"],
+        )
+
+    def test_foreign_keys_are_filtered_by_their_serialized_name(self):
+        author, reviewer = create_user("author"), create_user("reviewer")
+        Submission.objects.create(note="Open", fk_user=author)
+        Submission.objects.create(note="Done", fk_user=author, fk_reviewer=reviewer)
+
+        response = self.client.get(
+            "/api/us/submission/all/@0:10?filter=reviewer:eq:reviewer"
+        )
+
+        results = response.json()["results"]
+        self.assertEqual([item["note"] for item in results], ["Done"])
+        self.assertEqual(results[0]["reviewer"]["user_id"], "reviewer")
+        response = self.client.get(
+            "/api/us/submission/all/@0:10?filter=fk_reviewer:eq:reviewer"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_prefix_filters_search_the_index(self):
+        queryset, error = query.apply_query(
+            Food.objects.all(), {"filter": "name:startswith:Ap"}, Lang("us")
+        )
+
+        self.assertIsNone(error)
+        self.assertEqual([food.name for food in queryset], ["Apple", "Apricot"])
+        plan = queryset.explain()
+        self.assertIn("SEARCH Food USING INDEX", plan)
+        self.assertNotIn("SCAN Food", plan)
+
+    def test_unlisted_fields_and_bad_values_are_rejected(self):
+        for query in [
+            "filter=description:eq:x",
+            "filter=calories:startswith:1",
+            "filter=calories:lt:many",
+            "order=description",
+        ]:
+            response = self.client.get(f"/api/us/food/all/@0:10?{query}")
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_unindexed_columns_are_rejected_on_large_tables(self):
+        with self.settings(QUERY_SCAN_LIMIT=2):
+            response = self.client.get("/api/us/food/all/@0:10?order=protein")
+            self.assertEqual(response.status_code, 409)
+            self.assertIn("protein", response.json()["error"])
+
+            response = self.client.get("/api/us/food/all/@0:10?order=-food_id")
+            self.assertEqual(response.status_code, 200)
+
+
+class ExplainQueriesTest(TestCase):
+    def setUp(self):
+        object_cache.clear()
+        response_cache.clear()
+        create_food()
+        self.log = tempfile.NamedTemporaryFile(suffix=".log")
+
+    def tearDown(self):
+        self.log.close()
+
+    def explain(self, *urls: str) -> str:
+        with override_settings(QUERY_LOG=self.log.name):
+            for url in urls:
+                self.assertEqual(self.client.get(url).status_code, 200)
+        out = io.StringIO()
+        call_command("explain_queries", self.log.name, stdout=out)
+        return out.getvalue()
+
+    def test_indexed_filter_has_no_scan(self):
+        output = self.explain("/api/us/food/all/@0:10?filter=name:eq:Apple")
+
+        self.assertIn("No full scans found.", output)
+
+    def test_unindexed_filter_is_reported_per_route(self):
+        output = self.explain("/api/us/food/all/@0:10?filter=protein:gt:0")
+
+        self.assertIn("food/all", output)
+        self.assertIn("SCAN Food", output)
+
+    def test_full_index_scans_are_reported(self):
+        output = self.explain("/api/us/food/all/@0:10?order=name")
+
+        self.assertIn("SCAN Food USING", output)
+
+
+class ReviewQueueTest(TestCase):
+    def setUp(self):
+        object_cache.clear()
+        response_cache.clear()
+        self.author = create_user("author", role=0)
+        self.first = create_user("first")
+        self.second = create_user("second")
+        for i in range(5):
+            Submission.objects.create(
+                note=f"Note {i}", fk_user=self.author, is_accepted=i == 2
+            )
+
+    def get_queue(self, cursor: str, user: User):
+        return self.client.get(
+            f"/api/us/submission/queue/@{cursor}", HTTP_AUTHORIZATION=user.token
+        )
+
+    def claim(self, user: User, count: int) -> list[int]:
+        response = self.client.post(
+            "/api/us/submission/claim",
+            {"count": count},
+            content_type="application/json",
+            HTTP_AUTHORIZATION=user.token,
+        )
+        self.assertEqual(response.status_code, 200)
+        return [item["submission_id"] for item in response.json()["results"]]
+
+    def test_queue_pages_pending_submissions_oldest_first(self):
+        page = self.get_queue("0:2", self.first).json()
+        rest = self.get_queue(page["next"], self.first).json()
+
+        notes = [item["note"] for item in page["results"] + rest["results"]]
+        self.assertEqual(notes, ["Note 0", "Note 1", "Note 3", "Note 4"])
+        self.assertIsNone(rest["next"])
+
+    def test_claims_are_not_shared_between_reviewers(self):
+        first = self.claim(self.first, 3)
+        second = self.claim(self.second, 3)
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 1)
+        self.assertFalse(set(first) & set(second))
+        queue = self.get_queue("0:10", self.second).json()["results"]
+        self.assertEqual([item["submission_id"] for item in queue], second)
+
+    def test_releasing_an_unknown_claim_is_not_found(self):
+        claimed = self.claim(self.first, 1)
+
+        for query_id in ("abc", claimed[0], 999):
+            response = self.client.delete(
+                f"/api/us/submission/claim/@{query_id}",
+                HTTP_AUTHORIZATION=self.second.token,
+            )
+            self.assertEqual(response.status_code, 404)
+        response = self.client.delete(
+            f"/api/us/submission/claim/@{claimed[0]}",
+            HTTP_AUTHORIZATION=self.first.token,
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_regular_users_cannot_use_the_queue(self):
+        self.assertEqual(self.get_queue("0:10", self.author).status_code, 403)
+
+
+class DirtyTrackingTest(TestCase):
+    def setUp(self):
+        object_cache.clear()
+        response_cache.clear()
+        self.user = create_user()
+        self.food = create_food()
+
+    def test_unchanged_row_is_not_written(self):
+        food = Food.objects.get(pk=self.food.pk)
+
+        with self.assertNumQueries(0):
+            food.save()
+
+    def test_only_changed_columns_are_updated(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.heart_rate = 70  # type: ignore
+
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+
+        update = next(q["sql"] for q in queries if q["sql"].startswith("UPDATE"))
+        self.assertIn('"heart_rate"', update)
+        self.assertIn('"updated_at"', update)
+        self.assertNotIn('"email"', update)
+        self.assertEqual(User.objects.get(pk=self.user.pk).heart_rate, 70)
+
+    def test_food_edit_saves_food_and_nutrition(self):
+        response = self.client.post(
+            "/api/us/food/edit",
+            {
+                "food_id": self.food.food_id,
+                "name": "Pear",
+                "vitamins": {"vitamin_c": 9.0},
+            },
+            content_type="application/json",
+            HTTP_AUTHORIZATION=self.user.token,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        food = Food.objects.select_related("fk_nutrition").get(pk=self.food.pk)
+        self.assertEqual(food.name, "Pear")
+        self.assertEqual(json.loads(food.fk_nutrition.vitamins), {"vitamin_c": 9.0})  # type: ignore
+
+
+class BulkDeleteTest(TestCase):
+    def setUp(self):
+        object_cache.clear()
+        response_cache.clear()
+        self.user = create_user()
+        self.foods = [create_food(f"Food {i}") for i in range(3)]
+        self.diet = Diet.objects.create(name="Diet", photo_url="")
+        self.meal_plan = MealPlan.objects.create(
+            fk_diet=self.diet,
+            foods=",".join(str(food.food_id) for food in self.foods),
+        )
+
+    def post_bulk_delete(self, route: str, ids: list, user: User):
+        return self.client.post(
+            f"/api/us/{route}/bulk_delete",
+            {"ids": ids},
+            content_type="application/json",
+            HTTP_AUTHORIZATION=user.token,
+        )
+
+    def test_foods_are_removed_from_meal_plans(self):
+        ids = [self.foods[0].food_id, self.foods[2].food_id]
+
+        response = self.post_bulk_delete("food", ids, self.user)
+
+        self.assertEqual(
+            response.json(),
+            {"deleted": {"Food": 2, "Nutrition": 2}, "updated": {"MealPlan": 1}},
+        )
+        self.meal_plan.refresh_from_db()
+        self.assertEqual(self.meal_plan.food_ids, [self.foods[1].food_id])
+        self.assertEqual(Nutrition.objects.count(), 1)
+
+    def test_only_plans_listing_a_food_are_updated(self):
+        food_id = self.foods[0].food_id
+        other = MealPlan.objects.create(
+            fk_diet=self.diet, foods=f"{food_id}1,2{food_id},{food_id}0{food_id}"
+        )
+
+        response = self.post_bulk_delete("food", [food_id], self.user)
+
+        self.assertEqual(response.json()["updated"], {"MealPlan": 1})
+        other.refresh_from_db()
+        self.assertEqual(other.foods, f"{food_id}1,2{food_id},{food_id}0{food_id}")
+
+    def test_large_deletes_check_every_plan_in_memory(self):
+        ids = [self.foods[0].food_id, self.foods[2].food_id]
+        other = MealPlan.objects.create(fk_diet=self.diet, foods=f"{ids[0]}1")
+
+        with mock.patch("api.views.FOOD_ID_BATCH_SIZE", 1):
+            response = self.post_bulk_delete("food", ids, self.user)
+
+        self.assertEqual(response.json()["updated"], {"MealPlan": 1})
+        self.meal_plan.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.meal_plan.food_ids, [self.foods[1].food_id])
+        self.assertEqual(other.foods, f"{ids[0]}1")
+
+    def test_failed_block_skips_deferred_invalidation(self):
+        version = TableVersion.get_versions(["Food"]).get("Food")
+        with self.assertRaises(ValueError):
+            with deferred_invalidation():
+                invalidate(Food, [self.foods[0].pk])
+                raise ValueError
+
+        self.assertEqual(TableVersion.get_versions(["Food"]).get("Food"), version)
+
+    def test_diet_delete_reports_cascade(self):
+        response = self.post_bulk_delete("diet", [self.diet.diet_id], self.user)
+
+        self.assertEqual(response.json()["deleted"], {"Diet": 1, "MealPlan": 1})
+
+    def test_permissions_and_limits(self):
+        author = create_user("author", role=0)
+        self.assertEqual(self.post_bulk_delete("food", [1], author).status_code, 403)
+        self.assertEqual(
+            self.post_bulk_delete("account", ["x"], self.user).status_code, 403
+        )
+        self.assertEqual(self.post_bulk_delete("food", [], self.user).status_code, 400)
+
+
+class TimingTest(TestCase):
+    def setUp(self):
+        object_cache.clear()
+        response_cache.clear()
+        self.foods = [create_food(f"Food {i}") for i in range(3)]
+
+    def test_server_timing_header_reports_queries(self):
+        response = self.client.get("/api/us/food/all/@0:10")
+
+        header = response.headers["Server-Timing"]
+        self.assertIn("db;dur=", header)
+        self.assertIn('desc="4 queries"', header)  # versions, page, nutrition, count
+        self.assertIn("handler;dur=", header)
+        self.assertIn("serialization;dur=", header)
+        self.assertIn("total;dur=", header)
+
+    def test_repeated_query_shapes_are_flagged(self):
+        with timing.track() as timings:
+            for food in self.foods:
+                list(Food.objects.filter(pk__in=[food.pk, 0]))
+                Food.objects.filter(pk=food.pk).first()
+
+        self.assertEqual(timings.queries, 6)
+        self.assertEqual(sorted(timings.repeated(2).values()), [3, 3])
+        self.assertEqual(timings.repeated(3), {})
+
+    def test_savepoint_names_are_collapsed(self):
+        with timing.track() as timings:
+            with transaction.atomic():
+                with transaction.atomic():
+                    Food.objects.filter(pk=0).first()
+
+        self.assertIn('SAVEPOINT "savepoint"', timings.shapes)
+        self.assertIn('RELEASE SAVEPOINT "savepoint"', timings.shapes)
+
+    def test_n_plus_one_is_logged(self):
+        with self.settings(REQUEST_TIMING={"N_PLUS_ONE_THRESHOLD": 0}):
+            with self.assertLogs("api.timing", "WARNING") as logs:
+                self.client.get("/api/us/food/all/@0:10")
+
+        self.assertIn('"event": "n_plus_one"', logs.output[0])
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        object_cache.clear()
+        response_cache.clear()
+        self.admin = create_user("admin", role=2)
+        self.directory = tempfile.TemporaryDirectory()
+        self.metrics = Metrics(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_metrics_route_serves_text_format(self):
+        create_food()
+        self.client.get("/api/us/food/all/@0:10")
+
+        response = self.client.get(
+            "/api/us/system/metrics", HTTP_AUTHORIZATION=self.admin.token
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertIn("# TYPE api_request_duration_seconds histogram", body)
+        self.assertIn(
+            'api_requests_total{method="GET",route="food/all",status="200"}', body
+        )
+        self.assertIn('api_request_queries_bucket{le="+Inf",route="food/all"}', body)
+
+    def test_metrics_route_is_admin_only(self):
+        manager = create_user("manager", role=1)
+
+        response = self.client.get(
+            "/api/us/system/metrics", HTTP_AUTHORIZATION=manager.token
+        )
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_bcrypt_can_be_the_first_metric_of_a_process(self):
+        def hash_password():
+            with self.metrics.track_bcrypt():
+                pass
+
+        thread = threading.Thread(target=hash_password, daemon=True)
+        thread.start()
+        thread.join(timeout=5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertIn("api_bcrypt_in_flight 0.0", self.metrics.render())
+
+    def test_files_of_all_workers_are_summed(self):
+        self.metrics.observe_request("food/all", "GET", 200, 0.02, 3)
+        self.metrics.set("api_bcrypt_in_flight", {}, 2)
+        other = MmapValues(f"{self.directory.name}/999999999.db")  # not running
+        other.inc(self.metrics.make_key(ALL, "api_requests_total", {"route": "x"}), 5)
+        other.set(self.metrics.make_key(LIVE, "api_bcrypt_in_flight", {}), 7)
+        other.set(self.metrics.make_key(ALL, "api_cache_hits_total", {"cache": "x"}), 4)
+
+        body = self.metrics.render()
+
+        self.assertIn('api_requests_total{route="x"} 5.0', body)
+        self.assertIn('api_cache_hits_total{cache="x"} 4.0', body)
+        self.assertIn("api_bcrypt_in_flight 2.0", body)
+        self.assertIn(
+            'api_request_duration_seconds_bucket{le="0.01",route="food/all"} 0.0', body
+        )
+        self.assertIn(
+            'api_request_duration_seconds_bucket{le="0.025",route="food/all"} 1.0',
+            body,
+        )
+
+    def test_private_directory_is_removed_at_exit(self):
+        code = (
+            "from api.metrics import Metrics;"
+            "m = Metrics();"
+            "m.inc('api_requests_total', {});"
+            "print(m.directory)"
+        )
+        process = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "server.settings"},
+            capture_output=True,
+            text=True,
+        )
+
+        self.assertEqual(process.stderr, "")
+        self.assertFalse(os.path.exists(process.stdout.strip()))
+
+
+class ProfilerTest(TestCase):
+    def setUp(self):
+        object_cache.clear()
+        response_cache.clear()
+        self.admin = create_user("admin", role=2)
+        self.directory = tempfile.TemporaryDirectory()
+        self.original = profiler.directory, profiler.max_profiles
+        profiler.directory, profiler.max_profiles = self.directory.name, 2
+        self.food = create_food()
+
+    def tearDown(self):
+        profiler.directory, profiler.max_profiles = self.original
+        self.directory.cleanup()
+
+    def get(self, url: str, user: User, **headers):
+        return self.client.get(url, HTTP_AUTHORIZATION=user.token, **headers)
+
+    def test_admin_header_stores_a_profile(self):
+        self.get(
+            f"/api/us/food/query/@{self.food.food_id}", self.admin, HTTP_X_PROFILE="1"
+        )
+
+        results = self.get("/api/us/system/profiles", self.admin).json()["results"]
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["route"], "food/query")
+        self.assertEqual(results[0]["status"], 200)
+        self.assertIn("queries", results[0]["timings"])
+        response = self.get(f"/api/us/system/profile/@{results[0]['id']}", self.admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+
+    def test_header_is_ignored_for_other_users(self):
+        manager = create_user("manager", role=1)
+
+        self.get(
+            f"/api/us/food/query/@{self.food.food_id}", manager, HTTP_X_PROFILE="1"
+        )
+
+        self.assertEqual(profiler.list_ids(), [])
+
+    def test_retention_is_capped(self):
+        for _ in range(4):
+            self.get("/api/us/food/all/@0:10", self.admin, HTTP_X_PROFILE="1")
+
+        self.assertEqual(len(profiler.list_ids()), 2)
+        self.assertEqual(len(os.listdir(self.directory.name)), 4)
+
+
+class BenchmarkTest(SimpleTestCase):
+    def test_mixed_scenario_covers_every_route(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "results.json")
+            process = subprocess.run(
+                [
+                    sys.executable,
+                    "manage.py",
+                    "benchmark",
+                    "mixed",
+                    "--iterations",
+                    "20",
+                    "--concurrency",
+                    "2",
+                    "--scale",
+                    "5",
+                    "--output",
+                    output,
+                ],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+            )
+            self.assertEqual(process.returncode, 0, process.stderr)
+            with open(output) as file:
+                results = json.load(file)
+
+        self.assertEqual(list(results["scenarios"]), ["mixed"])
+        mixed = results["scenarios"]["mixed"]
+        self.assertGreaterEqual(mixed["requests"], 20)
+        self.assertEqual(mixed["errors"], 0)
+        for route in mixed["routes"].values():
+            self.assertEqual(route["errors"], 0)
+            self.assertEqual(sum(route["statuses"].values()), route["requests"])
+        self.assertEqual(results["uncovered_routes"], [])
+
+
+class GenerateDataTest(TestCase):
+    SIZES = {
+        "users": 20,
+        "foods": 10,
+        "diets": 3,
+        "meal_plans": 15,
+        "submissions": 5,
+        "vitals": 30,
+    }
+
+    def generate(self, **options):
+        call_command("generate_data", **self.SIZES, **options, stdout=io.StringIO())
+
+    def test_generates_requested_sizes_deterministically(self):
+        self.generate(seed=1)
+        foods = list(MealPlan.objects.values_list("foods", flat=True))
+
+        self.generate(seed=1, clear=True)
+
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Vital.objects.count(), 30)
+        self.assertEqual(MealPlan.objects.count(), 15)
+        self.assertEqual(list(MealPlan.objects.values_list("foods", flat=True)), foods)
+        response = self.client.get("/api/us/diet/all/@0:10")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 3)
+
+    def test_refuses_to_write_into_existing_data(self):
+        create_food()
+
+        with self.assertRaises(CommandError):
+            self.generate()
+
+
+class CatalogTest(TestCase):
+    PATHS = [
+        "/api/us/food/query/@3",
+        "/api/us/food/all/@0:10",
+        "/api/us/diet/query/@2",
+        "/api/us/diet/all/@0:10",
+        "/api/us/mealplan/query/@4",
+        "/api/us/mealplan/all/@1:5",
+    ]
+
+    def setUp(self):
+        sizes = {**GenerateDataTest.SIZES, "users": 0, "submissions": 0}
+        call_command("generate_data", **sizes, stdout=io.StringIO())
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "catalog.bin")
+        call_command("build_catalog", output=self.path, stdout=io.StringIO())
+        self.addCleanup(catalog_file.load, None)
+        self.addCleanup(response_cache.clear)
+
+    def get_all(self, max_queries: int) -> list:
+        responses = []
+        for path in self.PATHS:
+            response_cache.clear()
+            object_cache.clear()
+            with self.assertNumQueries(max_queries):
+                response = self.client.get(path)
+            self.assertEqual(response.status_code, 200, path)
+            responses.append(response.json())
+        return responses
+
+    def test_snapshot_serves_the_same_responses_as_the_database(self):
+        expected = [self.client.get(path).json() for path in self.PATHS]
+
+        catalog_file.load(self.path)
+
+        # Only the table versions behind the ETag are read.
+        self.assertEqual(self.get_all(max_queries=1), expected)
+
+    def test_stale_snapshot_falls_back_to_the_database(self):
+        catalog_file.load(self.path)
+        food = Food.objects.get(pk=3)
+        food.name = "Changed"
+        food.save()
+
+        response = self.client.get("/api/us/food/query/@3")
+
+        self.assertEqual(response.json()["name"], "Changed")
+        call_command("build_catalog", output=self.path, stdout=io.StringIO())
+        catalog_file.load(self.path)
+        response_cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/us/food/query/@3")
+        self.assertEqual(response.json()["name"], "Changed")
+
+
+class PrerenderTest(TestCase):
+    def setUp(self):
+        sizes = {**GenerateDataTest.SIZES, "users": 0, "submissions": 0}
+        call_command("generate_data", **sizes, stdout=io.StringIO())
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(
+            PRERENDER={"DIRECTORY": self.directory, "PAGE_SIZE": 4}
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def prerender(self, pending: bool = False) -> Prerenderer:
+        prerenderer = Prerenderer(self.directory, page_size=4)
+        if pending:
+            prerenderer.update()
+        else:
+            prerenderer.render_all()
+        return prerenderer
+
+    def assertMatchesLiveApi(self, page: str):
+        for lang in ["us", "ua"]:
+            with open(os.path.join(self.directory, "api", lang, page), "rb") as file:
+                self.assertEqual(
+                    file.read(), self.client.get(f"/api/{lang}/{page}").content, page
+                )
+
+    def test_renders_every_catalog_page(self):
+        prerenderer = self.prerender()
+
+        # 3 food list pages, 1 diet list page, 10 foods and 3 diets.
+        self.assertEqual(prerenderer.rendered, 17)
+        for page in [
+            "food/all/@8:4",
+            "diet/all/@0:4",
+            "food/query/@7",
+            "diet/query/@2",
+        ]:
+            self.assertMatchesLiveApi(page)
+
+    def test_pending_changes_rerender_only_affected_pages(self):
+        self.prerender()
+        food = Food.objects.get(pk=3)
+        food.name = "Renamed"
+        food.save()
+        diets = set(
+            MealPlan.objects.filter(foods__regex=r"(^|,)3(,|$)").values_list(
+                "fk_diet", flat=True
+            )
+        )
+
+        prerenderer = self.prerender(pending=True)
+
+        # The food, its list page, and diets (with their list page) using it.
+        self.assertEqual(prerenderer.rendered, 2 + len(diets) + bool(diets))
+        self.assertMatchesLiveApi("food/query/@3")
+        self.assertMatchesLiveApi("food/all/@0:4")
+        for diet_id in diets:
+            self.assertMatchesLiveApi(f"diet/query/@{diet_id}")
+        self.assertEqual(self.prerender(pending=True).rendered, 0)
+
+    def test_pending_deletes_remove_pages(self):
+        self.prerender()
+        Food.objects.filter(pk__in=[9, 10]).delete()
+
+        self.prerender(pending=True)
+
+        self.assertFalse(
+            os.path.exists(os.path.join(self.directory, "api/us/food/query/@9"))
+        )
+        self.assertFalse(
+            os.path.exists(os.path.join(self.directory, "api/us/food/all/@8:4"))
+        )
+        self.assertMatchesLiveApi("food/all/@4:4")
+
+
+class VitalHistoryTest(TestCase):
+    def test_iot_update_records_vitals_history(self):
+        user = create_user("patient", role=0)
+
+        for heart_rate in (60, 70):
+            self.client.post(
+                "/api/us/iot/update",
+                {
+                    "user_id": user.user_id,
+                    "blood_pressure": 120,
+                    "heart_rate": heart_rate,
+                    "oxygen_level": 98,
+                },
+                content_type="application/json",
+            )
+
+        self.assertEqual(
+            list(
+                Vital.objects.order_by("vital_id").values_list("heart_rate", flat=True)
+            ),
+            [60, 70],
+        )
+
+
+def budget(
+    path: str, body=None, user=None, setup=None, status=200, latency_ms=250
+) -> dict:
+    return {
+        "path": path,
+        "body": body,
+        "user": user,
+        "setup": setup,
+        "status": status,
+        "latency_ms": latency_ms,
+    }
+
+
+def claim_submission():
+    Submission.objects.filter(pk=1).update(
+        is_accepted=False, fk_claimer_id="user1", claimed_at=timezone.now()
+    )
+
+
+# Every route with the request used to measure it on the GenerateData dataset
+# below. "admin" is user0 and "manager" is user1 there.
+BUDGETS = {
+    "GET account/all": budget("account/all/@0:20"),
+    "GET account/query": budget("account/query/@user3"),
+    "GET account/many": budget("account/many/@user3,user4,user5"),
+    "GET account/profile": budget("account/profile/@user3"),
+    "POST account/register": budget(
+        "account/register",
+        {
+            "user_id": "newcomer",
+            "password": "Generated-Passw0rd",
+            "email": "newcomer@example.com",
+            "first_name": "New",
+            "last_name": "Comer",
+            "date_of_birth": "2000-01-01",
+        },
+        latency_ms=2000,
+    ),
+    "POST account/login": budget(
+        "account/login",
+        {"user_id": "user3", "password": "Generated-Passw0rd"},
+        latency_ms=2000,
+    ),
+    "POST account/edit": budget(
+        "account/edit", {"user_id": "user3", "last_name": "Edited"}, "admin"
+    ),
+    "DELETE account/delete": budget("account/delete/@user3", user="admin"),
+    "POST account/bulk_delete": budget(
+        "account/bulk_delete", {"ids": ["user3", "user4"]}, "admin"
+    ),
+    "GET food/all": budget("food/all/@0:20"),
+    "GET food/query": budget("food/query/@1"),
+    "GET food/many": budget("food/many/@1,2,3,4,5"),
+    "POST food/create": budget("food/create", {"name": "Pear", **FOOD_BODY}, "manager"),
+    "POST food/edit": budget(
+        "food/edit",
+        {"food_id": 1, "fat": "2", "vitamins": {"vitamin_c": 2.0}},
+        "manager",
+    ),
+    "DELETE food/delete": budget("food/delete/@1", user="manager"),
+    "POST food/bulk_delete": budget("food/bulk_delete", {"ids": [1, 2]}, "manager"),
+    "GET diet/all": budget("diet/all/@0:20"),
+    "GET diet/query": budget("diet/query/@1"),
+    "GET diet/many": budget("diet/many/@1,2,3"),
+    "POST diet/create": budget(
+        "diet/create",
+        {"name": "Keto", "description": "", "photo_url": "https://example.com/d.png"},
+        "manager",
+    ),
+    "POST diet/edit": budget("diet/edit", {"diet_id": 1, "name": "Paleo"}, "manager"),
+    "DELETE diet/delete": budget("diet/delete/@1", user="manager"),
+    "POST diet/bulk_delete": budget("diet/bulk_delete", {"ids": [1, 2]}, "manager"),
+    "GET mealplan/all": budget("mealplan/all/@0:20"),
+    "GET mealplan/query": budget("mealplan/query/@1"),
+    "GET mealplan/many": budget("mealplan/many/@1,2,3,4,5"),
+    "POST mealplan/create": budget(
+        "mealplan/create", {"time": 1, "diet_id": 1, "foods": "1,2,3"}, "manager"
+    ),
+    "DELETE mealplan/delete": budget("mealplan/delete/@1"),
+    "GET submission/all": budget("submission/all/@0:20"),
+    "GET submission/query": budget("submission/query/@1"),
+    "GET submission/many": budget("submission/many/@1,2,3,4,5"),
+    "GET submission/queue": budget("submission/queue/@0:20", user="manager"),
+    "POST submission/create": budget("submission/create", {"note": "Hi"}, "manager"),
+    "POST submission/edit": budget(
+        "submission/edit", {"submission_id": 1, "is_accepted": "true"}, "manager"
+    ),
+    "POST submission/claim": budget("submission/claim", {"count": 5}, "manager"),
+    "DELETE submission/claim": budget(
+        "submission/claim/@1", user="manager", setup=claim_submission
+    ),
+    "DELETE submission/delete": budget("submission/delete/@1", user="manager"),
+    "POST system/batch": budget(
+        "system/batch",
+        {"operations": [{"route": "submission/create", "body": {"note": "Hi"}}]},
+        "admin",
+    ),
+    "GET system/backup": budget("system/backup/@diets", user="admin"),
+    "POST system/rollback": budget(
+        "system/rollback",
+        {"resource": "diets", "data": "diet_id,name,description,photo_url\r\n"},
+        "admin",
+    ),
+    "GET system/cache": budget("system/cache", user="admin"),
+    "DELETE system/cache": budget("system/cache/@all", user="admin"),
+    "GET system/vitals": budget("system/vitals", user="admin"),
+    "GET system/metrics": budget("system/metrics", user="admin"),
+    "GET system/profiles": budget("system/profiles", user="admin"),
+    "GET system/profile": budget("system/profile/@missing", user="admin", status=404),
+    "POST iot/update": budget(
+        "iot/update",
+        {
+            "user_id": "user3",
+            "blood_pressure": 120,
+            "heart_rate": 70,
+            "oxygen_level": 98,
+        },
+    ),
+}
+
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), "query_budgets.json")
+
+
+class QueryBudgetTest(TestCase):
+    """Query-count and latency budgets per route, measured with cold caches.
+
+    Query budgets and their SQL shapes live in query_budgets.json; after an
+    intended change, rewrite it with UPDATE_QUERY_BUDGETS=1. Latency depends on
+    the machine, so it is only checked with CHECK_LATENCY_BUDGETS=1.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            "generate_data",
+            seed=0,
+            users=50,
+            foods=40,
+            diets=5,
+            meal_plans=30,
+            submissions=20,
+            vitals=100,
+            stdout=io.StringIO(),
+        )
+        cls.tokens = {
+            "admin": User.objects.get(pk="user0").token,
+            "manager": User.objects.get(pk="user1").token,
+        }
+
+    def measure(
+        self, route: str, spec: dict
+    ) -> tuple[int, "timing.RequestTimings", float]:
+        object_cache.clear()
+        response_cache.clear()
+        if spec["setup"]:
+            spec["setup"]()
+        method = route.split(" ")[0]
+        headers = {}
+        if spec["user"]:
+            headers["HTTP_AUTHORIZATION"] = self.tokens[spec["user"]]
+        url = f"/api/us/{spec['path']}"
+        start = time.perf_counter()
+        with timing.track() as timings:
+            if method == "POST":
+                response = self.client.post(
+                    url, spec["body"], content_type="application/json", **headers
+                )
+            elif method == "DELETE":
+                response = self.client.delete(url, **headers)
+            else:
+                response = self.client.get(url, **headers)
+        return response.status_code, timings, time.perf_counter() - start
+
+    def test_every_route_has_a_budget(self):
+        routes = {
+            f"{method} {cls._get_prefix()}/{name}"
+            for cls in View.__subclasses__()
+            for method, name in (transform_name(i) for i, _ in cls._get_locals())
+        }
+
+        self.assertEqual(sorted(routes - set(BUDGETS)), [])
+
+    def test_routes_stay_within_budget(self):
+        results = {}
+        for route, spec in BUDGETS.items():
+            with transaction.atomic():
+                results[route] = self.measure(route, spec)
+                transaction.set_rollback(True)
+
+        if os.environ.get("UPDATE_QUERY_BUDGETS"):
+            with open(BUDGET_FILE, "w") as file:
+                json.dump(
+                    {
+                        route: {
+                            "queries": timings.queries,
+                            "shapes": dict(sorted(timings.shapes.items())),
+                        }
+                        for route, (_, timings, _) in results.items()
+                    },
+                    file,
+                    indent=2,
+                    sort_keys=True,
+                )
+                file.write("\n")
+
+        with open(BUDGET_FILE) as file:
+            budgets = json.load(file)
+        for route, (status, timings, seconds) in results.items():
+            with self.subTest(route):
+                self.assertEqual(status, BUDGETS[route]["status"])
+                self.assertIn(route, budgets, "run with UPDATE_QUERY_BUDGETS=1")
+                added = timings.shapes - Counter(budgets[route]["shapes"])
+                self.assertLessEqual(
+                    timings.queries,
+                    budgets[route]["queries"],
+                    "queries over budget; added shapes:\n"
+                    + "\n".join(f"  {n}x {shape}" for shape, n in added.items()),
+                )
+                if os.environ.get("CHECK_LATENCY_BUDGETS"):
+                    self.assertLessEqual(
+                        seconds * 1000,
+                        BUDGETS[route]["latency_ms"],
+                        "latency over budget",
+                    )
+
+
+class SqliteProfileTest(TestCase):
+    @override_settings(SQLITE={**settings.SQLITE, "PRAGMAS": {"cache_size": -1234}})
+    def test_pragmas_are_applied_to_new_connections(self):
+        configure_connection(None, connection)
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA cache_size")
+            self.assertEqual(cursor.fetchone()[0], -1234)
+
+    def test_maintenance_reports_each_step(self):
+        stats = run_maintenance(vacuum_pages=10)
+
+        self.assertEqual(set(stats), {"checkpoint", "analyze", "vacuum"})
+        self.assertFalse(stats["checkpoint"]["busy"])
+        with self.assertRaises(ValueError):
+            run_maintenance(checkpoint="everything")
+
+
+REPLICA_CHILD = """
+import io, json, os, django
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "server.settings")
+django.setup()
+from django.core.management import call_command
+from django.db import connections, reset_queries
+from django.test import Client
+from api.cache import response_cache
+from api.models import Food, User
+
+def read(path, **headers):
+    reset_queries()
+    assert Client().get(path, **headers).status_code == 200, path
+    return sorted(alias for alias in connections if connections[alias].queries)
+
+token = "@user0:" + User.objects.get(pk="user0").password
+results = {"synced": read("/api/us/food/query/@1")}
+food = Food.objects.get(pk=1)
+food.name = "Changed"
+food.save()
+results["stale"] = read("/api/us/food/query/@1")
+results["anonymous"] = read("/api/us/account/query/@user1")
+Client().post(
+    "/api/us/account/edit",
+    {"user_id": "user0", "first_name": "Changed"},
+    content_type="application/json",
+    HTTP_AUTHORIZATION=token,
+    REMOTE_ADDR="10.0.0.1",
+)
+results["own_write"] = read(
+    "/api/us/account/query/@user0", HTTP_AUTHORIZATION=token, REMOTE_ADDR="10.0.0.2"
+)
+call_command("sync_replicas", stdout=io.StringIO())
+response_cache.clear()
+results["resynced"] = read("/api/us/food/query/@1")
+print(json.dumps(results))
+"""
+
+
+class ReplicaTest(SimpleTestCase):
+    def test_reads_go_to_current_replicas_except_after_own_writes(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        env = {
+            **os.environ,
+            "SQLITE_PATH": os.path.join(directory.name, "primary.sqlite3"),
+            "SQLITE_REPLICAS": os.path.join(directory.name, "replica.sqlite3"),
+            "REPLICA_PIN_DIR": os.path.join(directory.name, "pins"),
+        }
+
+        def run(*args):
+            process = subprocess.run(
+                [sys.executable, *args],
+                cwd=settings.BASE_DIR,
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            self.assertEqual(process.returncode, 0, process.stderr)
+            return process.stdout
+
+        run("manage.py", "migrate", "--verbosity", "0")
+        sizes = ["--users", "3", "--foods", "3", "--diets", "1", "--meal-plans", "2"]
+        run("manage.py", "generate_data", *sizes, "--submissions", "0", "--vitals", "0")
+        run("manage.py", "sync_replicas")
+        results = json.loads(run("-c", REPLICA_CHILD).splitlines()[-1])
+
+        # The primary always answers the table versions behind the ETag.
+        self.assertEqual(results["synced"], ["default", "replica1"])
+        self.assertEqual(results["stale"], ["default"])
+        self.assertEqual(results["anonymous"], ["replica1"])
+        self.assertEqual(results["own_write"], ["default"])
+        self.assertEqual(results["resynced"], ["default", "replica1"])
+
+    def test_pins_need_a_shared_cache(self):
+        local = {"ALIASES": ["replica1"], "PIN_SECONDS": 5.0, "PIN_CACHE": "default"}
+        with override_settings(REPLICAS=local):
+            with self.assertRaises(ImproperlyConfigured):
+                check_pin_cache()
+        with override_settings(REPLICAS={**local, "PIN_CACHE": "replica-pins"}):
+            check_pin_cache()
+
+
+SHARD_CHILD = """
+import json, os, sys, django
+from unittest import mock
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "server.settings")
+django.setup()
+from django.db import DatabaseError
+from django.test import Client
+from api import shards
+from api.models import Profile, User, Vital
+
+results = {"placement": {}}
+for alias in shards.get_locations():
+    for model in (Profile, Vital):
+        rows = model.objects.using(alias).values_list("pk", "fk_user_id")
+        results["placement"][f"{alias} {model._meta.db_table}"] = sorted(
+            (user_id, shards.alias_for_id(pk) or "default") for pk, user_id in rows
+        )
+results["expected"] = {
+    user_id: shards.shard_for(user_id)
+    for user_id in User.objects.values_list("user_id", flat=True)
+}
+
+if sys.argv[1:] == ["write"]:
+    token = "@user0:" + User.objects.get(pk="user0").password
+    client = Client(HTTP_AUTHORIZATION=token)
+    client.post(
+        "/api/us/iot/update",
+        {"user_id": "user3", "blood_pressure": 1, "heart_rate": 2, "oxygen_level": 3},
+        content_type="application/json",
+    )
+    results["latest"] = list(
+        Vital.objects.filter(fk_user_id="user3")
+        .order_by("-recorded_at")
+        .values_list("heart_rate", flat=True)[:1]
+    )
+    vitals = lambda: Vital.objects.filter(fk_user_id="user3").count()
+    before = vitals()
+    with mock.patch.object(User, "save", side_effect=DatabaseError):
+        try:
+            client.post(
+                "/api/us/iot/update",
+                {
+                    "user_id": "user3",
+                    "blood_pressure": 1,
+                    "heart_rate": 9,
+                    "oxygen_level": 3,
+                },
+                content_type="application/json",
+            )
+        except DatabaseError:
+            pass
+    results["failed"] = [before, vitals()]
+    profile = client.get("/api/us/account/profile/@user3").json()
+    results["profile"] = Profile.secure_get(pk=profile["profile_id"]).fk_user_id
+    results["vitals"] = client.get("/api/us/system/vitals").json()
+    results["backup"] = client.get("/api/us/system/backup/@profiles").content.decode()
+    counts = lambda: [
+        model.objects.filter(fk_user_id="user5").count() for model in (Profile, Vital)
+    ]
+    before = counts()
+    client.post(
+        "/api/us/system/batch",
+        {
+            "operations": [
+                {"route": "account/delete", "query_id": "user5"},
+                {"route": "diet/query", "query_id": "999"},
+            ]
+        },
+        content_type="application/json",
+    )
+    results["aborted"] = [before, counts()]
+    client.delete("/api/us/account/delete/@user5")
+    results["deleted"] = counts()
+print(json.dumps(results))
+"""
+
+
+class ShardTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+
+    def run_with_shards(self, count: int, *args) -> str:
+        env = {
+            **os.environ,
+            "SQLITE_PATH": os.path.join(self.path, "primary.sqlite3"),
+            "SQLITE_SHARDS": ",".join(
+                os.path.join(self.path, f"shard{i + 1}.sqlite3") for i in range(count)
+            ),
+        }
+        process = subprocess.run(
+            [sys.executable, *args],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(process.returncode, 0, process.stderr)
+        return process.stdout
+
+    def assertPlacedByUser(self, results: dict):
+        for location, rows in results["placement"].items():
+            alias = location.split()[0]
+            for user_id, created_on in rows:
+                self.assertEqual(results["expected"][user_id], alias)
+                self.assertEqual(created_on, alias)
+
+    def test_per_user_rows_follow_their_user_across_shards(self):
+        for alias in ["default", "shard1", "shard2"]:
+            self.run_with_shards(2, "manage.py", "migrate", "--database", alias)
+        sizes = ["--users", "8", "--foods", "3", "--diets", "2", "--meal-plans", "2"]
+        self.run_with_shards(
+            2,
+            "manage.py",
+            "generate_data",
+            *sizes,
+            "--submissions",
+            "0",
+            "--vitals",
+            "40",
+        )
+        results = json.loads(self.run_with_shards(2, "-c", SHARD_CHILD, "write"))
+
+        self.assertPlacedByUser(results)
+        self.assertEqual(results["placement"]["default Vital"], [])
+        self.assertEqual(len(set(results["expected"].values())), 2)
+        self.assertEqual(results["latest"], [2])
+        self.assertEqual(results["failed"][0], results["failed"][1])
+        self.assertEqual(results["profile"], "user3")
+        self.assertEqual(
+            sorted(results["vitals"]["shards"]), ["default", "shard1", "shard2"]
+        )
+        self.assertEqual(results["vitals"]["total"]["vitals"], 41)
+        self.assertEqual(results["backup"].count("\n"), 9)
+        self.assertEqual(results["aborted"][0][0], 1)
+        self.assertEqual(results["aborted"][0], results["aborted"][1])
+        self.assertEqual(results["deleted"], [0, 0])
+
+        # A third shard only takes rows over; none move between the old two.
+        self.run_with_shards(3, "manage.py", "migrate", "--database", "shard3")
+        before = json.loads(self.run_with_shards(3, "-c", SHARD_CHILD))
+        self.run_with_shards(3, "manage.py", "rebalance_shards")
+        after = json.loads(self.run_with_shards(3, "-c", SHARD_CHILD))
+
+        self.assertPlacedByUser(after)
+        moved = {
+            user_id
+            for user_id, alias in before["expected"].items()
+            if alias != results["expected"].get(user_id, alias)
+        }
+        self.assertEqual({before["expected"][user_id] for user_id in moved}, {"shard3"})
+        self.assertEqual(
+            sum(len(rows) for rows in before["placement"].values()),
+            sum(len(rows) for rows in after["placement"].values()),
+        )
+
+
+class StartupTest(SimpleTestCase):
+    def test_lean_start_defers_heavy_imports(self):
+        code = (
+            "import sys, server.wsgi, django.urls;"
+            "django.urls.get_resolver().urlconf_module;"
+            "print(sorted({'bcrypt', 'tablib', 'import_export'} & set(sys.modules)))"
+        )
+        process = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, "SERVERLESS": "1"},
+            capture_output=True,
+            text=True,
+        )
+
+        self.assertEqual(process.stderr, "")
+        self.assertEqual(process.stdout.strip(), "[]")
+
+    def test_routes_are_built_once(self):
+        self.assertIs(View.get_routes(), View.get_routes())
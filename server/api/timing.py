@@ -0,0 +1,105 @@
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from django.db import connections
+
+PLACEHOLDER_LIST = re.compile(r"%s(?:\s*,\s*%s)+")
+NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+WHITESPACE = re.compile(r"\s+")
+# Django names savepoints after the thread id and a counter.
+SAVEPOINT_NAME = re.compile(r"\bs\d+_x\d+\b")
+
+
+def get_shape(sql: str) -> str:
+    """SQL with literals, savepoint names and variable-length `IN (...)` lists
+    collapsed."""
+    sql = SAVEPOINT_NAME.sub("savepoint", PLACEHOLDER_LIST.sub("%s, ...", sql))
+    return WHITESPACE.sub(" ", NUMBER.sub("?", sql)).strip()
+
+
+class RequestTimings:
+    """Query count, DB time and phase durations collected for one request.
+
+    Installed as a `connection.execute_wrapper`, so every statement run while
+    it is active is counted, whatever `DEBUG` is set to.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.route: Optional[str] = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.phases: dict[str, float] = defaultdict(float)
+        self.shapes: Counter[str] = Counter()
+        self.depth: Counter[str] = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.shapes[get_shape(sql)] += 1
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def repeated(self, threshold: int) -> dict[str, int]:
+        return {shape: n for shape, n in self.shapes.items() if n > threshold}
+
+    def as_dict(self) -> dict:
+        return {
+            "queries": self.queries,
+            "db_ms": round(self.db_time * 1000, 3),
+            **{f"{name}_ms": round(t * 1000, 3) for name, t in self.phases.items()},
+            "total_ms": round(self.total * 1000, 3),
+        }
+
+    def get_header(self) -> str:
+        metrics = [f'db;dur={self.db_time * 1000:.3f};desc="{self.queries} queries"']
+        metrics += [f"{name};dur={t * 1000:.3f}" for name, t in self.phases.items()]
+        metrics.append(f"total;dur={self.total * 1000:.3f}")
+        return ", ".join(metrics)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("timings", default=None)
+
+
+def get_current() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+@contextmanager
+def track():
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings))
+            yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def phase(name: str):
+    """Adds the time spent in the block to `name`; nested blocks count once."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    timings.depth[name] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.depth[name] -= 1
+        if not timings.depth[name]:
+            timings.phases[name] += time.perf_counter() - start
@@ -2,3 +2,5 @@ from .view import *
 from .lang import *
 from .validators import *
 from .password import *
+from .fields import *
+from .query import *
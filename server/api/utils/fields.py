@@ -0,0 +1,67 @@
+from typing import Optional
+
+
+def _split(value: Optional[str]) -> Optional[set[str]]:
+    if value is None:
+        return None
+    return {i.strip() for i in value.split(",") if i.strip()}
+
+
+class Fields:
+    """Sparse fieldset parsed from `?fields=a,b.c&expand=b,b.d`.
+
+    `fields` limits which keys are rendered, `expand` limits which relations and
+    computed fields are embedded. Either one left out means "everything", which
+    keeps responses unchanged for clients that send neither.
+    """
+
+    def __init__(
+        self, fields: Optional[set[str]] = None, expand: Optional[set[str]] = None
+    ):
+        self.fields = fields
+        self.expand = expand
+
+    @classmethod
+    def from_request(cls, request):
+        params = getattr(request, "query_params", request.GET)
+        return cls(_split(params.get("fields")), _split(params.get("expand")))
+
+    @property
+    def is_default(self):
+        return self.fields is None and self.expand is None
+
+    @property
+    def key(self):
+        return tuple(
+            None if names is None else tuple(sorted(names))
+            for names in (self.fields, self.expand)
+        )
+
+    def includes(self, name: str, expandable: bool = False) -> bool:
+        if self.fields is not None and not _mentions(self.fields, name):
+            return False
+        if expandable and self.expand is not None:
+            return _mentions(self.expand, name)
+        return True
+
+    def nested(self, name: str) -> "Fields":
+        # `fields=diet` keeps every field of the diet, while `expand=diet` embeds
+        # it without expanding anything inside unless `diet.<field>` is listed.
+        return Fields(
+            _children(self.fields, name, None), _children(self.expand, name, set())
+        )
+
+
+def _mentions(names: set[str], name: str) -> bool:
+    return name in names or any(i.startswith(f"{name}.") for i in names)
+
+
+def _children(
+    names: Optional[set[str]], name: str, whole: Optional[set[str]]
+) -> Optional[set[str]]:
+    if names is None:
+        return None
+    children = {i[len(name) + 1 :] for i in names if i.startswith(f"{name}.")}
+    if children:
+        return children
+    return whole if name in names else set()
@@ -10,6 +10,15 @@ TRANSLATIONS = {
         "user.not_authenticated": "You must be authenticated to access this page.",
         "user.no_permission": "You don't have permissions to access this page.",
         "generic.not_found": "Not found.",
+        "generic.unavailable": "Service is busy, try again later.",
+        "batch.failed": "Operation #{} failed, no changes were saved.",
+        "batch.bad_reference": "Reference '{}' does not point to an earlier result.",
+        "batch.bad_query_id": "Query id '{}' is not valid for this route.",
+        "query.bad_filter": "Filter '{}' is not supported, must be: `field:op:value`.",
+        "query.bad_order": "Ordering by '{}' is not supported.",
+        "query.unindexed": "Filtering or ordering by '{}' is not indexed on a table this large.",
+        "queue.bad_cursor": "Invalid format, must be: `[after]:[size]`.",
+        "bulk.bad_ids": "Ids must be a non-empty list of at most {} ids.",
         "role.0": "User",
         "role.1": "Manager",
         "role.2": "Admin",
@@ -23,6 +32,15 @@ TRANSLATIONS = {
         "user.not_authenticated": "Вам потрібно автентифікуватися, щоб отримати доступ до цієї сторінки.",
         "user.no_permission": "У вас немає прав доступу до цієї сторінки.",
         "generic.not_found": "Не знайдено.",
+        "generic.unavailable": "Сервіс зайнятий, спробуйте пізніше.",
+        "batch.failed": "Операція #{} не вдалася, жодних змін не збережено.",
+        "batch.bad_reference": "Посилання '{}' не вказує на попередній результат.",
+        "batch.bad_query_id": "Ідентифікатор запиту '{}' недійсний для цього маршруту.",
+        "query.bad_filter": "Фільтр '{}' не підтримується, має бути: `field:op:value`.",
+        "query.bad_order": "Сортування за '{}' не підтримується.",
+        "query.unindexed": "Фільтрування або сортування за '{}' не індексоване для такої великої таблиці.",
+        "queue.bad_cursor": "Недійсний формат, має бути: `[after]:[size]`.",
+        "bulk.bad_ids": "Ідентифікатори мають бути непорожнім списком з не більше ніж {} елементів.",
         "role.0": "Користувач",
         "role.1": "Керівник",
         "role.2": "Адміністратор",
@@ -32,6 +50,7 @@ TRANSLATIONS = {
 
 class Lang:
     def __init__(self, lang: str):
+        self.code = lang if lang in TRANSLATIONS else "us"
         self.table = cast(dict, TRANSLATIONS.get(lang, TRANSLATIONS.get("us")))
 
     def translate(self, key: str, *args, **kwargs):
@@ -1,13 +1,19 @@
-import bcrypt
+from api.metrics import metrics
 
 
 class Password:
     @staticmethod
     def encrypt(password: str) -> bytes:
-        return bcrypt.hashpw(bytes(password, encoding="utf-8"), bcrypt.gensalt())
+        import bcrypt  # loaded on first use to keep cold starts short
+
+        with metrics.track_bcrypt():
+            return bcrypt.hashpw(bytes(password, encoding="utf-8"), bcrypt.gensalt())
 
     @staticmethod
     def compare(hashed: str, password: str) -> bool:
-        return bcrypt.checkpw(
-            bytes(password, encoding="utf-8"), bytes(hashed, encoding="utf-8")
-        )
+        import bcrypt
+
+        with metrics.track_bcrypt():
+            return bcrypt.checkpw(
+                bytes(password, encoding="utf-8"), bytes(hashed, encoding="utf-8")
+            )
@@ -0,0 +1,124 @@
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import QuerySet
+
+from api.cache import MISSING, LRUCache
+
+from .lang import Lang
+
+LOOKUPS = {
+    "eq": "exact",
+    "lt": "lt",
+    "lte": "lte",
+    "gt": "gt",
+    "gte": "gte",
+    "in": "in",
+    "startswith": "startswith",
+    "isnull": "isnull",
+}
+
+_table_sizes = LRUCache(max_size=64, ttl=60)
+
+
+def is_indexed(model, name: str) -> bool:
+    field = model._meta.get_field(name)
+    if field.primary_key or field.unique or field.db_index:
+        return True
+    for index in model._meta.indexes:
+        if index.condition is None and index.fields:
+            if index.fields[0].lstrip("-") == name:
+                return True
+    return False
+
+
+def get_table_size(model) -> int:
+    size = _table_sizes.get(model._meta.db_table)
+    if size is MISSING:
+        size = model.objects.count()
+        _table_sizes.set(model._meta.db_table, size)
+    return size
+
+
+def get_field(model, name: str):
+    """Field behind a filter name; foreign keys go by their serialized name,
+    without the `fk_` prefix."""
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return model._meta.get_field(f"fk_{name}")
+
+
+def _parse_value(field, lookup: str, value: str):
+    if lookup == "isnull":
+        return {"true": True, "false": False}[value.lower()]
+    if lookup == "in":
+        return [field.to_python(i) for i in value.split("|")]
+    return field.to_python(value)
+
+
+def _get_conditions(field, lookup: str, value: str) -> dict:
+    if lookup != "startswith":
+        return {f"{field.attname}__{lookup}": _parse_value(field, lookup, value)}
+    # SQLite runs `startswith` as a case-insensitive LIKE, which cannot use the
+    # column's index; the same prefix as a range can.
+    conditions = {f"{field.attname}__gte": value}
+    if value:
+        conditions[f"{field.attname}__lt"] = value[:-1] + chr(ord(value[-1]) + 1)
+    return conditions
+
+
+def apply_query(
+    queryset: QuerySet, params, lang: Lang
+) -> tuple[QuerySet, Optional[tuple[int, dict]]]:
+    """Apply `?filter=field:op:value,...&order=-field,...` to a list queryset.
+
+    Only fields whitelisted in the model's FILTERS / ORDERING are accepted, and
+    columns without a supporting index are refused once the table grows past
+    QUERY_SCAN_LIMIT rows instead of silently falling back to a full scan.
+    `startswith` is a case-sensitive range, so it can use the column's index.
+    """
+    model = queryset.model
+    filters = getattr(model, "FILTERS", {})
+    ordering = getattr(model, "ORDERING", [])
+    columns = []
+
+    for condition in [i for i in params.get("filter", "").split(",") if i]:
+        parts = condition.split(":", 2)
+        if len(parts) != 3 or parts[1] not in filters.get(parts[0], []):
+            return queryset, (
+                400,
+                {"error": lang.translate("query.bad_filter", condition)},
+            )
+        name, op, value = parts
+        try:
+            field = get_field(model, name)
+            queryset = queryset.filter(**_get_conditions(field, LOOKUPS[op], value))
+        except (FieldDoesNotExist, KeyError, ValidationError, ValueError):
+            return queryset, (
+                400,
+                {"error": lang.translate("query.bad_filter", condition)},
+            )
+        columns.append(field.name)
+
+    order = [i for i in params.get("order", "").split(",") if i]
+    for name in order:
+        if name.lstrip("-") not in ordering:
+            return queryset, (400, {"error": lang.translate("query.bad_order", name)})
+        columns.append(name.lstrip("-"))
+    # Always end on the primary key so pages stay stable whichever index the
+    # database picks for the filter.
+    pk = model._meta.pk.name
+    queryset = queryset.order_by(
+        *order, *([pk] if pk not in [i.lstrip("-") for i in order] else [])
+    )
+
+    unindexed = [name for name in columns if not is_indexed(model, name)]
+    if unindexed and get_table_size(model) > settings.QUERY_SCAN_LIMIT:
+        return queryset, (
+            409,
+            {"error": lang.translate("query.unindexed", ", ".join(unindexed))},
+        )
+
+    return queryset, None
@@ -1,12 +1,27 @@
-from typing import Callable
+import hashlib
+import time
+from functools import cache
+from typing import Callable, Optional, cast
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
 
-from api.models import User
+from api import replicas
+from api.cache import MISSING, CachedResponse, response_cache, single_flight
+from api.catalog import catalog_file
+from api.loader import Loader
+from api.models import TableVersion, User
+from api.profiler import profiler
+from api.querylog import QueryLogger
+from api.timing import get_current, phase
 from django.urls import path
 from rest_framework.decorators import api_view
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from .fields import Fields
 from .lang import Lang
 
 
@@ -24,6 +39,22 @@ def is_token_valid(token: str):
     return len(token.split(":")) == 2
 
 
+def depends_on(*models):
+    def decorator(fn: Callable):
+        setattr(fn, "depends_on", [model._meta.db_table for model in models])
+        return fn
+
+    return decorator
+
+
+def cache_response(ttl: Optional[float] = None):
+    def decorator(fn: Callable):
+        setattr(fn, "cache_ttl", ttl)
+        return fn
+
+    return decorator
+
+
 class GenClass:
     @classmethod
     def _get_locals(cls):
@@ -83,6 +114,13 @@ class View(GenClass):
         self.request = request
         self._body = request.data
         self.lang = Lang(lang)
+        self.loader = Loader()
+        self.fields = Fields.from_request(request)
+        self._versions: Optional[dict[str, int]] = None
+
+    @classmethod
+    def _get_prefix(cls):
+        return cls.__name__.lower().replace("view", "")
 
     @classmethod
     def _get_path(cls, fn: Callable, method: str, name: str):
@@ -93,7 +131,7 @@ class View(GenClass):
         ):
             params.append(f"@<{fn.__annotations__['query_id'].__name__}:query_id>")
         return path(
-            "/".join([cls.__name__.lower().replace("view", ""), name, *params]),
+            "/".join([cls._get_prefix(), name, *params]),
             api_view([method])(
                 lambda request, lang, *args, **kwargs: cls(
                     name, request, lang
@@ -102,27 +140,104 @@ class View(GenClass):
             name=name,
         )
 
+    # Routes only change when a View subclass is defined, so both tables are
+    # built once per process instead of on every batch request or URL reload.
     @classmethod
+    @cache
     def get_url_patterns(cls):
         return [
             cls._get_path(fn, *transform_name(name)) for name, fn in cls._get_locals()
         ]
 
+    @staticmethod
+    @cache
+    def get_routes() -> dict[str, tuple[type["View"], str, str]]:
+        routes = {}
+        for cls in View.__subclasses__():
+            prefix = cls._get_prefix()
+            for name, _ in cls._get_locals():
+                method, route = transform_name(name)
+                routes[f"{prefix}/{route}"] = (cls, method.lower(), route)
+        return routes
+
+    def _authenticate(self) -> Optional[User]:
+        token = self.request.headers.get("Authorization")
+        if not token or not is_token_valid(token):
+            return None
+        user_id, password = token.split(":")
+        # Not through the object cache: other workers would keep accepting a
+        # deleted user or an old password until their copy expires.
+        user = User.objects.filter(user_id=user_id[1:]).first()
+        if not user or user.password != password:
+            return None
+        return user
+
+    def _call(self, method: str, fn: Callable, args, kwargs):
+        if method == "post":
+            view_args: Args = fn.__annotations__["post"](self.lang)
+            with phase("validation"):
+                view_args.validate_all(self._body)
+            if view_args.is_cancelled:
+                return 400, {"error": view_args.error}
+            args = [view_args, *args]
+        with phase("handler"):
+            return fn(*args, **kwargs)
+
     def _respond(self, method: str, *args, **kwargs):
+        route = f"{self._get_prefix()}/{self.name}"
+        timings = get_current()
+        if timings is not None:
+            timings.route = route
+        if not self._should_profile():
+            return self._run(route, method, *args, **kwargs)
+
+        with profiler.profile(route) as profile:
+            response = self._run(route, method, *args, **kwargs)
+            if profile is not None:
+                profile["method"] = method.upper()
+                profile["status"] = response.status_code
+        return response
+
+    def _should_profile(self) -> bool:
+        if profiler.sample():
+            return True
+        if "X-Profile" not in self.request.headers:
+            return False
+        user = self._authenticate()
+        return user is not None and user.role == 2
+
+    def _run(self, route: str, method: str, *args, **kwargs):
+        keys = self._get_client_keys()
+        with replicas.reading_from(replicas.choose(keys) if method == "get" else None):
+            response = self._run_logged(route, method, *args, **kwargs)
+        if method != "get" and response.status_code < 400:
+            replicas.pin(keys)
+        return response
+
+    def _run_logged(self, route: str, method: str, *args, **kwargs):
+        query_log = getattr(settings, "QUERY_LOG", None)
+        if not query_log:
+            return self._dispatch(method, *args, **kwargs)
+        with connection.execute_wrapper(QueryLogger(query_log, route)):
+            return self._dispatch(method, *args, **kwargs)
+
+    def _get_client_keys(self) -> list[str]:
+        # Read-your-writes needs no user lookup: the token names the user, and
+        # the address covers requests made before there is a token.
+        keys = []
+        token = self.request.headers.get("Authorization")
+        if token and is_token_valid(token):
+            keys.append(f"user:{token.split(':')[0][1:]}")
+        if self.request.META.get("REMOTE_ADDR"):
+            keys.append(f"addr:{self.request.META['REMOTE_ADDR']}")
+        return keys
+
+    def _dispatch(self, method: str, *args, **kwargs):
         fn: Callable = getattr(self, "_".join([method, self.name]))
 
-        # Authenticate
         if fn.__annotations__.get("user"):
-            token = self.request.headers.get("Authorization")
-            if not token or not is_token_valid(token):
-                return Response(
-                    {"error": self.lang.translate("user.not_authenticated")},
-                    status=401,
-                    headers={"Access-Control-Allow-Origin": "*"},
-                )
-            user_id, password = token.split(":")
-            user = User.secure_get(user_id=user_id[1:], password=password)
-            if not user:
+            user = self._authenticate()
+            if user is None:
                 return Response(
                     {"error": self.lang.translate("user.not_authenticated")},
                     status=401,
@@ -130,16 +245,141 @@ class View(GenClass):
                 )
             args = [user, *args]
 
-        if method == "post":
-            view_args: Args = fn.__annotations__["post"](self.lang)
-            if view_args.validate_all(self._body).is_cancelled:
-                code, response = 400, {"error": view_args.error}
-            else:
-                code, response = fn(view_args, *args, **kwargs)
+        cache_key, validators = None, None
+        if method == "get" and getattr(fn, "depends_on", None):
+            cache_key = self._get_cache_key(args, kwargs)
+            if self._is_cacheable(fn):
+                cached = response_cache.get(cache_key)
+                if cached is not MISSING:
+                    return self._respond_cached(cached)
+            # Read before the versions: a write between the two must keep
+            # the response out of the cache, not store it under an old ETag.
+            epoch = response_cache.epoch
+            validators = self._get_validators(fn, cache_key)
+            if self._is_not_modified(*validators):
+                return self._respond_not_modified(validators[0])
+
+        if validators and self._is_cacheable(fn):
+            try:
+                code, response, cached = single_flight.do(
+                    validators[0],
+                    lambda: self._compute_cached(
+                        fn, args, kwargs, cast(str, cache_key), validators, epoch
+                    ),
+                )
+            except TimeoutError:
+                return Response(
+                    {"error": self.lang.translate("generic.unavailable")},
+                    status=503,
+                    headers={"Access-Control-Allow-Origin": "*", "Retry-After": "1"},
+                )
+            if cached is not None:
+                return self._respond_cached(cached)
         else:
-            code, response = fn(*args, **kwargs)
+            code, response = self._call(method, fn, args, kwargs)
+        headers = {"Access-Control-Allow-Origin": "*"}
+        if validators and code == 200:
+            headers["ETag"] = validators[0]
+            if validators[1]:
+                headers["Last-Modified"] = http_date(validators[1])
         if code == 201:
-            return HttpResponse(response, headers={"Access-Control-Allow-Origin": "*"})  # type: ignore
-        return Response(
-            response, status=code, headers={"Access-Control-Allow-Origin": "*"}
+            if isinstance(response, HttpResponse):
+                for name, value in headers.items():
+                    response[name] = value
+                return response
+            return HttpResponse(response, headers=headers)  # type: ignore
+        return Response(response, status=code, headers=headers)
+
+    def _compute_cached(
+        self, fn: Callable, args, kwargs, cache_key: str, validators, epoch: int
+    ):
+        with phase("handler"):
+            code, response = fn(*args, **kwargs)
+        if code != 200:
+            return code, response, None
+
+        with phase("serialization"):
+            body = JSONRenderer().render(response)
+        cached = CachedResponse(
+            body=body,
+            etag=validators[0],
+            last_modified=validators[1],
+            tables=getattr(fn, "depends_on"),
+            created_at=time.time(),
+        )
+        response_cache.set(cache_key, cached, epoch, getattr(fn, "cache_ttl"))
+        return code, response, cached
+
+    @staticmethod
+    def _is_cacheable(fn: Callable):
+        return (
+            response_cache.enabled
+            and hasattr(fn, "cache_ttl")
+            and not fn.__annotations__.get("user")
+        )
+
+    def _respond_cached(self, cached: CachedResponse):
+        if self._is_not_modified(cached.etag, cached.last_modified):
+            return self._respond_not_modified(cached.etag)
+        headers = {"ETag": cached.etag, "Access-Control-Allow-Origin": "*"}
+        if cached.last_modified:
+            headers["Last-Modified"] = http_date(cached.last_modified)
+        return HttpResponse(
+            cached.body, content_type="application/json", headers=headers
+        )
+
+    @staticmethod
+    def _respond_not_modified(etag: str):
+        return HttpResponseNotModified(
+            headers={"ETag": etag, "Access-Control-Allow-Origin": "*"}
+        )
+
+    def _get_cache_key(self, args, kwargs):
+        return "|".join(
+            [
+                self.__class__.__name__,
+                self.name,
+                self.lang.code,
+                repr(args),
+                repr(sorted(kwargs.items())),
+                self.request.GET.urlencode(),
+            ]
+        )
+
+    def _get_validators(self, fn: Callable, cache_key: str):
+        tables = getattr(fn, "depends_on")
+        versions = TableVersion.get_versions(tables)
+        self._versions = {table: versions.get(table, (0, None))[0] for table in tables}
+        replicas.check_current(self._versions)
+        key = "|".join(
+            [
+                cache_key,
+                *[f"{table}={versions.get(table, (0, None))[0]}" for table in tables],
+            ]
+        )
+        etag = f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+        last_modified = max(
+            [updated_at.timestamp() for _, updated_at in versions.values()],
+            default=None,
+        )
+        return etag, last_modified
+
+    def _use_catalog(self) -> bool:
+        """Points the loader at the catalog snapshot if it matches the versions
+        this request was validated against, so reads cost no extra query."""
+        if self._versions is not None:
+            self.loader.catalog = catalog_file.get(self._versions, list(self._versions))
+        return self.loader.catalog is not None
+
+    def _is_not_modified(self, etag: str, last_modified):
+        if_none_match = self.request.headers.get("If-None-Match")
+        if if_none_match:
+            etags = [i.removeprefix("W/") for i in parse_etags(if_none_match)]
+            return "*" in etags or etag in etags
+
+        if_modified_since = parse_http_date_safe(
+            self.request.headers.get("If-Modified-Since") or ""
         )
+        if if_modified_since and last_modified:
+            return int(last_modified) <= if_modified_since
+        return False
@@ -1,13 +1,52 @@
+import re
+from collections import Counter
 from typing import Union
 
-import tablib
-from rest_framework.serializers import ModelSerializer
-
-from .admin import *
-from .models import Diet, Food, MealPlan, Nutrition, Profile, Submission
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Count, Q, QuerySet, Sum
+from django.urls.converters import get_converters
+
+from . import shards
+from .cache import object_cache, response_cache, single_flight
+from .metrics import metrics
+from .models import (
+    Diet,
+    Food,
+    MealPlan,
+    Model,
+    Nutrition,
+    Profile,
+    Submission,
+    User,
+    Vital,
+)
+from .profiler import profiler
+from .signals import deferred_invalidation, invalidate
 from .serializers import *
 from .utils import *
 
+MAX_BATCH_SIZE = 100
+MAX_QUEUE_PAGE = 100
+MAX_CLAIM = 20
+MAX_BULK_DELETE = 10_000
+BULK_BATCH_SIZE = 500
+# Most food ids matched against meal plans in SQL; each adds four LIKE terms.
+FOOD_ID_BATCH_SIZE = 100
+BATCH_REFERENCE = re.compile(r"\$(\d+)\.(\w+)")
+
+
+class BatchAborted(Exception):
+    pass
+
+
+def load_resources():
+    # import_export and tablib are slow to import and only backups use them,
+    # so cold starts skip them until the first backup or rollback.
+    from . import resources
+
+    return resources
+
 
 def get_user(user_id: str, lang) -> tuple[int, Union[dict, User]]:
     query_user: User = User.secure_get(user_id=user_id)
@@ -19,22 +58,208 @@ def get_user(user_id: str, lang) -> tuple[int, Union[dict, User]]:
 
 
 def get_all(
-    query_id: str, results: list, serializer: type[ModelSerializer], lang: Lang
+    query_id: str,
+    results: QuerySet,
+    serializer: type[Serializer],
+    view: View,
 ):
+    lang, loader, fields = view.lang, view.loader, view.fields
     parts = query_id.split(":")
     if len(parts) != 2 and [True for part in parts if not part.isnumeric()]:
         return 409, {
             "error": "Invalid format, must be: `[page]:[size]`",
         }
     page, size = int(parts[0]), int(parts[1])
+    params = view.request.query_params
+    if not (params.get("filter") or params.get("order")) and view._use_catalog():
+        catalog = view.loader.catalog
+        if catalog.covers(results.model):
+            items = catalog.page(results.model, page, size)
+            loader.add(items)
+            return 200, {
+                "overflow": max(0, catalog.count(results.model) - (page * size) - size),
+                "results": [
+                    serializer(lang, item, loader, fields).data for item in items
+                ],
+            }
+    results, error = apply_query(results, view.request.query_params, lang)
+    if error:
+        return error
+    only = serializer.get_only(fields)
+    items = list((results.only(*only) if only else results)[page : page + size])
+    loader.add(items)
+    serializer.prime(loader, items, fields)
+    return 200, {
+        "overflow": max(0, results.count() - (page * size) - size),
+        "results": [serializer(lang, item, loader, fields).data for item in items],
+    }
+
+
+def get_object(view: View, model: type[Model], pk):
+    """Row by primary key, read from the catalog snapshot when it is current."""
+    if view._use_catalog() and view.loader.catalog.covers(model):
+        try:
+            return view.loader.load(model, pk)
+        except ValidationError:
+            return None
+    return model.secure_get(**{model._meta.pk.name: pk})
+
+
+def get_many(
+    query_id: str,
+    model: type[Model],
+    serializer: type[Serializer],
+    view: View,
+):
+    lang, loader, fields = view.lang, view.loader, view.fields
+    invalid = 409, {
+        "error": f"Invalid format, must be: `[id],[id],...` (at most {MAX_BATCH_SIZE})",
+    }
+    ids = [i for i in query_id.split(",") if i]
+    if not ids or len(ids) > MAX_BATCH_SIZE:
+        return invalid
+    try:
+        instances = loader.load_many(model, ids)
+    except ValidationError:
+        return invalid
+    serializer.prime(loader, [i for i in instances if i is not None], fields)
     return 200, {
-        "overflow": max(0, len(results) - (page * size) - size),
         "results": [
-            serializer(lang, food).data for food in results[page : page + size]
+            (
+                serializer(lang, instance, loader, fields).data
+                if instance is not None
+                else {"id": id, "error": lang.translate("generic.not_found")}
+            )
+            for id, instance in zip(ids, instances)
         ],
     }
 
 
+def lists_food(food_id: int) -> Q:
+    # `foods` is a comma-separated list such as "1,2,3".
+    return (
+        Q(foods=str(food_id))
+        | Q(foods__startswith=f"{food_id},")
+        | Q(foods__endswith=f",{food_id}")
+        | Q(foods__contains=f",{food_id},")
+    )
+
+
+def strip_food_ids(food_ids: set) -> int:
+    queryset = MealPlan.objects.values_list("meal_plan_id", "foods")
+    # Every LIKE term is tested against every row, so only a few ids are
+    # matched in SQL; larger sets read each plan once and check it here.
+    if len(food_ids) <= FOOD_ID_BATCH_SIZE:
+        matches = Q()
+        for food_id in food_ids:
+            matches |= lists_food(food_id)
+        queryset = queryset.filter(matches)
+    changed = []
+    for meal_plan_id, foods in queryset.iterator(chunk_size=BULK_BATCH_SIZE):
+        ids = [i for i in str(foods).split(",") if i]
+        kept = [i for i in ids if int(i) not in food_ids]
+        if len(kept) != len(ids):
+            changed.append((",".join(kept), meal_plan_id))
+    # One prepared UPDATE per plan; bulk_update would build a CASE per row.
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {quote(MealPlan._meta.db_table)} SET {quote('foods')} = %s "
+            f"WHERE {quote(MealPlan._meta.pk.column)} = %s",
+            changed,
+        )
+    invalidate(MealPlan, [meal_plan_id for _, meal_plan_id in changed])
+    return len(changed)
+
+
+def bulk_delete(model: type[Model], ids, lang) -> tuple[int, dict]:
+    if not isinstance(ids, list) or not 0 < len(ids) <= MAX_BULK_DELETE:
+        return 400, {"error": lang.translate("bulk.bad_ids", MAX_BULK_DELETE)}
+    try:
+        pks = list({model._meta.pk.to_python(i) for i in ids})  # type: ignore
+    except ValidationError:
+        return 400, {"error": lang.translate("bulk.bad_ids", MAX_BULK_DELETE)}
+
+    deleted, updated = Counter(), Counter()
+    with transaction.atomic(), deferred_invalidation():
+        food_ids = set()
+        for i in range(0, len(pks), BULK_BATCH_SIZE):
+            queryset = model.objects.filter(pk__in=pks[i : i + BULK_BATCH_SIZE])
+            nutrition_ids = []
+            if model is Food:
+                rows = list(queryset.values_list("food_id", "fk_nutrition_id"))
+                food_ids.update(food_id for food_id, _ in rows)
+                nutrition_ids = [i for _, i in rows if i is not None]
+            deleted.update(queryset.delete()[1])
+            if nutrition_ids:
+                deleted.update(
+                    Nutrition.objects.filter(pk__in=nutrition_ids).delete()[1]
+                )
+        if food_ids:
+            updated["MealPlan"] = strip_food_ids(food_ids)
+
+    return 200, {
+        "deleted": {
+            label.split(".")[-1]: count for label, count in deleted.items() if count
+        },
+        "updated": {name: count for name, count in updated.items() if count},
+    }
+
+
+def resolve_references(value, results: list):
+    def lookup(match: re.Match):
+        index, key = int(match.group(1)), match.group(2)
+        if index >= len(results) or not isinstance(results[index]["body"], dict):
+            raise KeyError(match.group(0))
+        return results[index]["body"][key]
+
+    if isinstance(value, dict):
+        return {k: resolve_references(v, results) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve_references(v, results) for v in value]
+    if not isinstance(value, str):
+        return value
+    match = BATCH_REFERENCE.fullmatch(value)
+    if match:
+        return lookup(match)
+    return BATCH_REFERENCE.sub(lambda m: str(lookup(m)), value)
+
+
+def run_operation(
+    parent: View, routes: dict, user: User, operation: dict, results: list
+):
+    lang = parent.lang
+    route = routes.get(operation.get("route", ""))
+    if route is None or route[0] is SystemView and route[2] == "batch":
+        return 404, {
+            "error": lang.translate("generic.not_found", operation.get("route"))
+        }
+
+    cls, method, name = route
+    try:
+        body = resolve_references(operation.get("body", {}), results)
+        query_id = resolve_references(operation.get("query_id"), results)
+    except KeyError as e:
+        return 400, {"error": lang.translate("batch.bad_reference", e.args[0])}
+
+    view = cls(name, parent.request, lang.code)
+    view._body = body
+    fn = getattr(view, f"{method}_{name}")
+    args = [user] if fn.__annotations__.get("user") else []
+    kwargs = {}
+    if "query_id" in fn.__annotations__:
+        # Same check and conversion as the `@<type:query_id>` URL segment.
+        converter = get_converters()[fn.__annotations__["query_id"].__name__]
+        if not re.fullmatch(converter.regex, str(query_id)):
+            return 400, {"error": lang.translate("batch.bad_query_id", query_id)}
+        kwargs["query_id"] = converter.to_python(str(query_id))
+    code, response = view._call(method, fn, args, kwargs)
+    if isinstance(response, HttpResponse):
+        # Metrics and profiles render their own text; the batch carries it as is.
+        response = response.content.decode(response.charset)
+    return code, response
+
+
 class AccountView(View):
     class Register(Args):
         user_id: str = ValidString(16)  # type: ignore
@@ -82,15 +307,27 @@ class AccountView(View):
         cast(User, query).delete()
         return 200, {}
 
+    class BulkDelete(Args):
+        ids: list = ValidJson({}, arbitrary=True)  # type: ignore
+
+    def post_bulk_delete(self, post: BulkDelete, user: User):
+        if not user.role == 2:
+            return 403, {"error": self.lang.translate("user.no_permission")}
+
+        return bulk_delete(User, post.ids, self.lang)
+
     def get_query(self, query_id: str):
         code, query = get_user(query_id, self.lang)
         if code != 200:
             return code, query
 
-        return 200, UserSerializer(self.lang, query).data
+        return 200, UserSerializer(self.lang, query, self.loader, self.fields).data
 
     def get_all(self, query_id: str):
-        return get_all(query_id, User.objects.all(), UserSerializer, self.lang)
+        return get_all(query_id, User.objects.all(), UserSerializer, self)
+
+    def get_many(self, query_id: str):
+        return get_many(query_id, User, UserSerializer, self)
 
     class Edit(Args):
         user_id: str = ValidString(16)  # type: ignore
@@ -135,7 +372,7 @@ class AccountView(View):
             profile = Profile(fk_user=query)
             profile.save()
 
-        return 200, ProfileSerializer(self.lang, profile).data
+        return 200, ProfileSerializer(self.lang, profile, self.loader, self.fields).data
 
 
 class FoodView(View):
@@ -161,22 +398,30 @@ class FoodView(View):
             minerals=json.dumps(post.minerals),
             amino_acids=json.dumps(post.amino_acids),
         )
-        nutrition.save()
+        with transaction.atomic():
+            nutrition.save()
 
-        food.fk_nutrition = nutrition  # type: ignore
-        food.save()
+            food.fk_nutrition = nutrition  # type: ignore
+            food.save()
         return 200, FoodSerializer(self.lang, food).data
 
+    @depends_on(Food, Nutrition)
+    @cache_response()
     def get_query(self, query_id: int):
-        food = Food.secure_get(food_id=query_id)
+        food = get_object(self, Food, query_id)
 
         if food is None:
             return 404, {"error": self.lang.translate("generic.not_found", query_id)}
 
-        return 200, FoodSerializer(self.lang, food).data
+        return 200, FoodSerializer(self.lang, food, self.loader, self.fields).data
 
+    @depends_on(Food, Nutrition)
     def get_all(self, query_id: str):
-        return get_all(query_id, Food.objects.all(), FoodSerializer, self.lang)
+        return get_all(query_id, Food.objects.all(), FoodSerializer, self)
+
+    @depends_on(Food, Nutrition)
+    def get_many(self, query_id: str):
+        return get_many(query_id, Food, FoodSerializer, self)
 
     def delete_delete(self, user: User, query_id: int):
         if user.role == 0:
@@ -187,11 +432,19 @@ class FoodView(View):
         if food is None:
             return 404, {"error": self.lang.translate("generic.not_found", query_id)}
 
-        food.fk_nutrition.delete()  # type: ignore
-        food.delete()
+        bulk_delete(Food, [food.food_id], self.lang)
 
         return 200, {}
 
+    class BulkDelete(Args):
+        ids: list = ValidJson({}, arbitrary=True)  # type: ignore
+
+    def post_bulk_delete(self, post: BulkDelete, user: User):
+        if user.role == 0:
+            return 403, {"error": self.lang.translate("user.no_permission")}
+
+        return bulk_delete(Food, post.ids, self.lang)
+
     class Edit(Args):
         food_id: str = ValidInteger()  # type: ignore
         name: str = ValidString(32, is_optional=True)  # type: ignore
@@ -235,6 +488,7 @@ class FoodView(View):
             food.fk_nutrition.minerals = json.dumps(post.minerals)  # type: ignore
         if post.amino_acids:
             food.fk_nutrition.amino_acids = json.dumps(post.amino_acids)  # type: ignore
+        food.save_changes(food.fk_nutrition)
 
         return 200, FoodSerializer(self.lang, food).data
 
@@ -255,12 +509,72 @@ class SubmissionView(View):
         if submission is None:
             return 404, {"error": self.lang.translate("generic.not_found", query_id)}
 
-        return 200, SubmissionSerializer(self.lang, submission).data
+        return (
+            200,
+            SubmissionSerializer(self.lang, submission, self.loader, self.fields).data,
+        )
 
     def get_all(self, query_id: str):
-        return get_all(
-            query_id, Submission.objects.all(), SubmissionSerializer, self.lang
-        )
+        return get_all(query_id, Submission.objects.all(), SubmissionSerializer, self)
+
+    def get_many(self, query_id: str):
+        return get_many(query_id, Submission, SubmissionSerializer, self)
+
+    def get_queue(self, user: User, query_id: str):
+        if user.role == 0:
+            return 403, {"error": self.lang.translate("user.no_permission")}
+
+        parts = query_id.split(":")
+        if len(parts) != 2 or not all(part.isnumeric() for part in parts):
+            return 409, {"error": self.lang.translate("queue.bad_cursor")}
+        after, size = int(parts[0]), min(int(parts[1]), MAX_QUEUE_PAGE)
+
+        queryset = Submission.get_queue(user).filter(submission_id__gt=after)
+        only = SubmissionSerializer.get_only(self.fields)
+        items = list((queryset.only(*only) if only else queryset)[: size + 1])
+        has_next = len(items) > size
+        items = items[:size]
+        self.loader.add(items)
+        SubmissionSerializer.prime(self.loader, items, self.fields)
+        return 200, {
+            "next": f"{items[-1].pk}:{size}" if has_next else None,
+            "results": [
+                SubmissionSerializer(self.lang, item, self.loader, self.fields).data
+                for item in items
+            ],
+        }
+
+    class Claim(Args):
+        count: str = ValidInteger()  # type: ignore
+
+    def post_claim(self, post: Claim, user: User):
+        if user.role == 0:
+            return 403, {"error": self.lang.translate("user.no_permission")}
+
+        ids = Submission.claim(user, max(1, min(int(post.count), MAX_CLAIM)))
+        invalidate(Submission, ids)
+        items = list(Submission.objects.filter(pk__in=ids).order_by("submission_id"))
+        self.loader.add(items)
+        SubmissionSerializer.prime(self.loader, items, self.fields)
+        return 200, {
+            "results": [
+                SubmissionSerializer(self.lang, item, self.loader, self.fields).data
+                for item in items
+            ]
+        }
+
+    def delete_claim(self, user: User, query_id: str):
+        if not query_id.isnumeric():
+            return 404, {"error": self.lang.translate("generic.not_found", query_id)}
+
+        released = Submission.objects.filter(
+            submission_id=query_id, fk_claimer=user
+        ).update(fk_claimer=None, claimed_at=None)
+        if not released:
+            return 404, {"error": self.lang.translate("generic.not_found", query_id)}
+
+        invalidate(Submission, [query_id])
+        return 200, {}
 
     def delete_delete(self, user: User, query_id: str):
         submission: Submission = Submission.secure_get(submission_id=query_id)
@@ -293,10 +607,12 @@ class SubmissionView(View):
             submission.note = post.note  # type: ignore
         if post.is_accepted:
             if post.is_accepted:
-                submission.reviewer = user.user_id
+                submission.fk_reviewer = user  # type: ignore
             if not post.is_accepted:
-                submission.reviewer = None  # type: ignore
+                submission.fk_reviewer = None  # type: ignore
             submission.is_accepted = post.is_accepted  # type: ignore
+            submission.fk_claimer = None  # type: ignore
+            submission.claimed_at = None  # type: ignore
         submission.save()
 
         return 200, SubmissionSerializer(self.lang, submission).data
@@ -317,16 +633,32 @@ class DietView(View):
 
         return 200, DietSerializer(self.lang, diet).data
 
+    @depends_on(Diet, MealPlan, Food, Nutrition)
+    @cache_response()
     def get_query(self, query_id: str):
-        diet = Diet.secure_get(diet_id=query_id)
+        diet = get_object(self, Diet, query_id)
 
         if diet is None:
             return 404, {"error": self.lang.translate("generic.not_found", query_id)}
 
-        return 200, DietSerializer(self.lang, diet).data
+        return 200, DietSerializer(self.lang, diet, self.loader, self.fields).data
 
+    @depends_on(Diet, MealPlan, Food, Nutrition)
     def get_all(self, query_id: str):
-        return get_all(query_id, Diet.objects.all(), DietSerializer, self.lang)
+        return get_all(query_id, Diet.objects.all(), DietSerializer, self)
+
+    @depends_on(Diet, MealPlan, Food, Nutrition)
+    def get_many(self, query_id: str):
+        return get_many(query_id, Diet, DietSerializer, self)
+
+    class BulkDelete(Args):
+        ids: list = ValidJson({}, arbitrary=True)  # type: ignore
+
+    def post_bulk_delete(self, post: BulkDelete, user: User):
+        if user.role == 0:
+            return 403, {"error": self.lang.translate("user.no_permission")}
+
+        return bulk_delete(Diet, post.ids, self.lang)
 
     class Edit(Args):
         diet_id: str = ValidInteger()  # type: ignore
@@ -394,16 +726,26 @@ class MealPlanView(View):
 
         return 200, MealPlanSerializer(self.lang, meal_plan).data
 
+    @depends_on(Diet, MealPlan, Food, Nutrition)
     def get_query(self, query_id: str):
-        meal_plan = MealPlan.secure_get(meal_plan_id=query_id)
+        meal_plan = get_object(self, MealPlan, query_id)
 
         if meal_plan is None:
             return 404, {"error": self.lang.translate("generic.not_found", query_id)}
 
-        return 200, MealPlanSerializer(self.lang, meal_plan).data
+        return (
+            200,
+            MealPlanSerializer(self.lang, meal_plan, self.loader, self.fields).data,
+        )
 
+    @depends_on(Diet, MealPlan, Food, Nutrition)
+    @cache_response()
     def get_all(self, query_id: str):
-        return get_all(query_id, MealPlan.objects.all(), MealPlanSerializer, self.lang)
+        return get_all(query_id, MealPlan.objects.all(), MealPlanSerializer, self)
+
+    @depends_on(Diet, MealPlan, Food, Nutrition)
+    def get_many(self, query_id: str):
+        return get_many(query_id, MealPlan, MealPlanSerializer, self)
 
     def delete_delete(self, query_id: str):
         meal_plan = MealPlan.secure_get(meal_plan_id=query_id)
@@ -417,25 +759,63 @@ class MealPlanView(View):
 
 
 class SystemView(View):
+    class Batch(Args):
+        operations: list = ValidJson({}, arbitrary=True)  # type: ignore
+
+    def post_batch(self, post: Batch, user: User):
+        routes = View.get_routes()
+        operations = post.operations
+        if (
+            not isinstance(operations, list)
+            or not 0 < len(operations) <= MAX_BATCH_SIZE
+            or not all(isinstance(op, dict) for op in operations)
+        ):
+            return 400, {
+                "error": {
+                    "operations": self.lang.translate(
+                        "arg.invalid_value", "Json", f"max_length={MAX_BATCH_SIZE}"
+                    )
+                }
+            }
+
+        results = []
+        try:
+            with transaction.atomic():
+                for index, operation in enumerate(operations):
+                    code, response = run_operation(
+                        self, routes, user, operation, results
+                    )
+                    results.append({"status": code, "body": response})
+                    if code >= 400:
+                        raise BatchAborted(index)
+        except BatchAborted as e:
+            return 409, {
+                "error": self.lang.translate("batch.failed", e.args[0]),
+                "results": results,
+            }
+
+        return 200, {"results": results}
+
     def get_backup(self, user: User, query_id: str):
         if user.role != 2:
             return 403, {"error": self.lang.translate("user.no_permission")}
 
+        resources = load_resources()
         match query_id:
             case "users":
-                return 201, UserResource().export(format="csv").csv  # type: ignore
+                return 201, resources.UserResource().export(format="csv").csv  # type: ignore
             case "profiles":
-                return 201, ProfileResource().export(format="csv").csv  # type: ignore
+                return 201, resources.ProfileResource().export(format="csv").csv  # type: ignore
             case "diets":
-                return 201, DietResource().export(format="csv").csv  # type: ignore
+                return 201, resources.DietResource().export(format="csv").csv  # type: ignore
             case "meal_plans":
-                return 201, MealPlanResource().export(format="csv").csv  # type: ignore
+                return 201, resources.MealPlanResource().export(format="csv").csv  # type: ignore
             case "submissions":
-                return 201, SubmissionResource().export(format="csv").csv  # type: ignore
+                return 201, resources.SubmissionResource().export(format="csv").csv  # type: ignore
             case "foods":
-                return 201, FoodResource().export(format="csv").csv  # type: ignore
+                return 201, resources.FoodResource().export(format="csv").csv  # type: ignore
             case "nutritions":
-                return 201, NutritionResource().export(format="csv").csv  # type: ignore
+                return 201, resources.NutritionResource().export(format="csv").csv  # type: ignore
             case _:
                 return 201, ""
 
@@ -447,41 +827,133 @@ class SystemView(View):
         if user.role != 2:
             return 403, {"error": self.lang.translate("user.no_permission")}
 
+        import tablib
+
+        resources = load_resources()
         data = tablib.Dataset()
         data.csv = post.data  # type: ignore
 
         match post.resource:
             case "users":
                 return 200, {
-                    "has_errors": UserResource().import_data(data).has_errors()  # type: ignore
+                    "has_errors": resources.UserResource().import_data(data).has_errors()  # type: ignore
                 }
             case "profiles":
                 return 200, {
-                    "has_errors": ProfileResource().import_data(data).has_errors()  # type: ignore
+                    "has_errors": resources.ProfileResource().import_data(data).has_errors()  # type: ignore
                 }
             case "diets":
                 return 200, {
-                    "has_errors": DietResource().import_data(data).has_errors()  # type: ignore
+                    "has_errors": resources.DietResource().import_data(data).has_errors()  # type: ignore
                 }
             case "meal_plans":
                 return 200, {
-                    "has_errors": MealPlanResource().import_data(data).has_errors()  # type: ignore
+                    "has_errors": resources.MealPlanResource().import_data(data).has_errors()  # type: ignore
                 }
             case "submissions":
                 return 200, {
-                    "has_errors": SubmissionResource().import_data(data).has_errors()  # type: ignore
+                    "has_errors": resources.SubmissionResource().import_data(data).has_errors()  # type: ignore
                 }
             case "foods":
                 return 200, {
-                    "has_errors": FoodResource().import_data(data).has_errors()  # type: ignore
+                    "has_errors": resources.FoodResource().import_data(data).has_errors()  # type: ignore
                 }
             case "nutritions":
                 return 200, {
-                    "has_errors": NutritionResource().import_data(data).has_errors()  # type: ignore
+                    "has_errors": resources.NutritionResource().import_data(data).has_errors()  # type: ignore
                 }
             case _:
                 return 201, ""
 
+    def get_cache(self, user: User):
+        if user.role != 2:
+            return 403, {"error": self.lang.translate("user.no_permission")}
+
+        return 200, {
+            "objects": object_cache.stats(),
+            "responses": response_cache.stats(),
+            "coalescing": single_flight.stats(),
+        }
+
+    def get_vitals(self, user: User):
+        if user.role != 2:
+            return 403, {"error": self.lang.translate("user.no_permission")}
+
+        columns = ["blood_pressure", "heart_rate", "oxygen_level"]
+        locations = shards.aggregate(
+            Vital,
+            users=Count("fk_user", distinct=True),
+            vitals=Count("pk"),
+            **{name: Sum(name) for name in columns},
+        )
+        # Users live on one shard, so per-shard counts add up.
+        total = {
+            key: sum(row[key] or 0 for row in locations.values())
+            for key in ["users", "vitals", *columns]
+        }
+
+        def summarize(row: dict):
+            return {
+                "users": row["users"],
+                "vitals": row["vitals"],
+                **{
+                    name: row[name] / row["vitals"] if row["vitals"] else None
+                    for name in columns
+                },
+            }
+
+        return 200, {
+            "shards": {alias: summarize(row) for alias, row in locations.items()},
+            "total": summarize(total),
+        }
+
+    def get_metrics(self, user: User):
+        if user.role != 2:
+            return 403, {"error": self.lang.translate("user.no_permission")}
+
+        return 201, HttpResponse(
+            metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+    def get_profiles(self, user: User):
+        if user.role != 2:
+            return 403, {"error": self.lang.translate("user.no_permission")}
+
+        return 200, {
+            "results": [
+                profiler.get_meta(profile_id) for profile_id in profiler.list_ids()
+            ]
+        }
+
+    def get_profile(self, user: User, query_id: str):
+        if user.role != 2:
+            return 403, {"error": self.lang.translate("user.no_permission")}
+
+        folded = profiler.get_folded(query_id)
+        if folded is None:
+            return 404, {"error": self.lang.translate("generic.not_found", query_id)}
+
+        return 201, HttpResponse(folded, content_type="text/plain; charset=utf-8")
+
+    def delete_cache(self, user: User, query_id: str):
+        if user.role != 2:
+            return 403, {"error": self.lang.translate("user.no_permission")}
+
+        match query_id:
+            case "objects":
+                object_cache.clear()
+            case "responses":
+                response_cache.clear()
+            case "all":
+                object_cache.clear()
+                response_cache.clear()
+            case _:
+                return 404, {
+                    "error": self.lang.translate("generic.not_found", query_id)
+                }
+
+        return 200, {}
+
 
 class IotView(View):
     class Update(Args):
@@ -498,6 +970,18 @@ class IotView(View):
         query_user.heart_rate = post.heart_rate  # type: ignore
         query_user.oxygen_level = post.oxygen_level  # type: ignore
         query_user.blood_pressure = post.blood_pressure  # type: ignore
-        query_user.save()
+        # The vital may live on a shard, so both databases need a transaction;
+        # without shards the inner block is part of the outer one.
+        with (
+            transaction.atomic(),
+            transaction.atomic(using=shards.shard_for(query_user.pk), savepoint=False),
+        ):
+            Vital.objects.create(
+                fk_user=query_user,
+                blood_pressure=post.blood_pressure,
+                heart_rate=post.heart_rate,
+                oxygen_level=post.oxygen_level,
+            )
+            query_user.save()
 
         return 200, UserSerializer(self.lang, query_user).data
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middle.TimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -59,6 +62,29 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Serverless deployments (Vercel sets VERCEL=1) pay for every import on a cold
+# start, so they run without the admin and its import/export integration, and
+# without the session and message middleware only the admin needs.
+
+SERVERLESS = os.environ.get("SERVERLESS", os.environ.get("VERCEL", "")) == "1"
+
+ADMIN_ONLY_APPS = [
+    "django.contrib.admin",
+    "django.contrib.sessions",
+    "django.contrib.messages",
+    "import_export",
+]
+
+ADMIN_ONLY_MIDDLEWARE = [
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "django.contrib.messages.middleware.MessageMiddleware",
+]
+
+if SERVERLESS:
+    INSTALLED_APPS = [i for i in INSTALLED_APPS if i not in ADMIN_ONLY_APPS]
+    MIDDLEWARE = [i for i in MIDDLEWARE if i not in ADMIN_ONLY_MIDDLEWARE]
+
 ROOT_URLCONF = "server.urls"
 
 TEMPLATES = [
@@ -106,8 +132,207 @@ CORS_ALLOW_METHODS = ("GET", "DELETE", "POST", "OPTIONS")
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": os.environ.get("SQLITE_PATH", BASE_DIR / "db.sqlite3"),
+    }
+}
+
+# SQLite tuning, picked with env SQLITE_PROFILE. "production" switches to WAL
+# (readers and the single writer stop blocking each other), applies PRAGMAS to
+# every new connection, keeps connections open for CONN_MAX_AGE seconds and
+# waits up to TIMEOUT seconds for a lock instead of failing. WSGI workers also
+# run `manage.py sqlite_maintenance` every MAINTENANCE_INTERVAL seconds in a
+# background thread. "default" leaves SQLite and Django as they are.
+
+SQLITE_PROFILES = {
+    "default": {
+        "PRAGMAS": {},
+        "CONN_MAX_AGE": 0,
+        "TIMEOUT": 5,
+        "MAINTENANCE_INTERVAL": None,
+    },
+    "production": {
+        "PRAGMAS": {
+            "journal_mode": "wal",
+            "synchronous": "normal",  # durable at checkpoints; safe with WAL
+            "cache_size": -64_000,  # KiB
+            "mmap_size": 256 * 1024 * 1024,
+            "temp_store": "memory",
+            "wal_autocheckpoint": 1000,
+        },
+        "CONN_MAX_AGE": 600,
+        "TIMEOUT": 20,
+        "MAINTENANCE_INTERVAL": 3600,
+    },
+}
+
+SQLITE = SQLITE_PROFILES[os.environ.get("SQLITE_PROFILE", "default")]
+DATABASES["default"].update(
+    CONN_MAX_AGE=SQLITE["CONN_MAX_AGE"],
+    CONN_HEALTH_CHECKS=bool(SQLITE["CONN_MAX_AGE"]),
+    OPTIONS={"timeout": SQLITE["TIMEOUT"]},
+)
+
+# Read replicas: env SQLITE_REPLICAS lists SQLite files (comma-separated) that
+# `manage.py sync_replicas` keeps as copies of the primary. GET routes read from
+# a random replica, POST and DELETE routes use the primary. After a write, the
+# writer's reads (by user and by client address) stay on the primary for
+# PIN_SECONDS; pins live in the PIN_CACHE cache alias, which has to be shared
+# between workers (startup fails on a local-memory cache). The default is a
+# file cache in env REPLICA_PIN_DIR, shared by the workers of one host; point
+# PIN_CACHE at Redis or Memcached when workers run on several hosts. Routes
+# with `@depends_on` only read from a replica whose last sync has the
+# primary's versions of those tables.
+
+REPLICAS = {
+    "ALIASES": [],
+    "PIN_SECONDS": 5.0,
+    "PIN_CACHE": "replica-pins",
+}
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "replica-pins": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get(
+            "REPLICA_PIN_DIR", Path(tempfile.gettempdir()) / "api-replica-pins"
+        ),
+    },
+}
+
+for i, path in enumerate(
+    filter(None, os.environ.get("SQLITE_REPLICAS", "").split(","))
+):
+    DATABASES[f"replica{i + 1}"] = {
+        **DATABASES["default"],
+        "NAME": path,
+        "TEST": {"MIRROR": "default"},
     }
+    REPLICAS["ALIASES"].append(f"replica{i + 1}")
+
+# Per-user tables (profiles, vitals history) split across the SQLite files listed
+# in env SQLITE_SHARDS (comma-separated) by a jump consistent hash of the user
+# id. Shards are numbered by position, so only ever append to the list; then
+# run `manage.py migrate --database shardN` for the new file and `manage.py
+# rebalance_shards` to move the rows whose shard changed. Queries that name a
+# user or a row id go to one shard; admin aggregates run on all of them.
+
+SHARDING = {
+    "ALIASES": [],
+}
+
+for i, path in enumerate(filter(None, os.environ.get("SQLITE_SHARDS", "").split(","))):
+    DATABASES[f"shard{i + 1}"] = {**DATABASES["default"], "NAME": path}
+    SHARDING["ALIASES"].append(f"shard{i + 1}")
+
+# Shards first: the replica router would send sharded rows to the primary.
+DATABASE_ROUTERS = []
+if SHARDING["ALIASES"]:
+    DATABASE_ROUTERS.append("api.shards.ShardRouter")
+if REPLICAS["ALIASES"]:
+    DATABASE_ROUTERS.append("api.replicas.ReplicaRouter")
+
+
+# Read-through cache in front of primary-key lookups (`Model.secure_get`).
+# Set "SHARED" to {"ALIAS": "<cache alias>"} to add a second tier shared
+# between workers; the default LocMemCache alias works as a local stand-in.
+
+OBJECT_CACHE = {
+    "ENABLED": True,
+    "MAX_SIZE": 4096,
+    "TTL": 300,
+    "SHARED": None,
+}
+
+
+# Pre-encoded responses of hot catalog GET routes, keyed by route, arguments and
+# language. Writes in this process evict entries immediately; TTL bounds how long
+# other workers may serve a response after a write they did not see. Concurrent
+# misses for the same response share one computation; waiters give up with a 503
+# after COALESCE_TIMEOUT seconds.
+
+RESPONSE_CACHE = {
+    "ENABLED": True,
+    "MAX_ENTRIES": 1024,
+    "MAX_BYTES": 16 * 1024 * 1024,
+    "TTL": 30,
+    "COALESCE_TIMEOUT": 10.0,
+}
+
+
+# `?filter=` / `?order=` on list routes may only touch unindexed columns while
+# the table has at most this many rows.
+
+QUERY_SCAN_LIMIT = 10_000
+
+
+# Path of a JSON-lines file that every SQL statement run by an API route is
+# appended to, for `manage.py explain_queries`. Leave as None in production.
+
+QUERY_LOG = None
+
+
+# Seconds a reviewer keeps a submission claimed from the review queue before
+# it is handed out to someone else.
+
+SUBMISSION_CLAIM_TTL = 15 * 60
+
+
+# Per-request query count, DB time and view phase timings, sent as a
+# `Server-Timing` header and logged as JSON to the `api.timing` logger (INFO per
+# request, WARNING when one SQL shape repeats more than N_PLUS_ONE_THRESHOLD
+# times in a request, which usually means an N+1 query).
+
+REQUEST_TIMING = {
+    "ENABLED": True,
+    "N_PLUS_ONE_THRESHOLD": 10,
+}
+
+
+# Prometheus metrics served on `system/metrics`. Each worker process writes to
+# its own memory-mapped file in DIRECTORY and a scrape sums every file there, so
+# point all workers of a node at the same (empty at startup) directory. With
+# DIRECTORY None every process only reports itself.
+
+METRICS = {
+    "ENABLED": True,
+    "DIRECTORY": None,
+}
+
+
+# Sampling profiler around API views. A request is profiled when an admin sends
+# an `X-Profile` header, or at random with SAMPLE_RATE (e.g. 0.001). Folded
+# stacks and timing data are kept in DIRECTORY, newest MAX_PROFILES only, and
+# listed on `system/profiles`.
+
+PROFILER = {
+    "SAMPLE_RATE": 0.0,
+    "INTERVAL": 0.005,
+    "DIRECTORY": Path(tempfile.gettempdir()) / "api-profiles",
+    "MAX_PROFILES": 100,
+    "MAX_CONCURRENT": 1,
+}
+
+# Read-only snapshot of foods, nutrition, diets and meal plans written by
+# `manage.py build_catalog` and memory-mapped by every worker. It serves the
+# catalog routes only while its table versions match the database; after a
+# write those fall back to queries until the next build replaces the file,
+# which workers notice within CHECK_INTERVAL seconds. PATH None disables it.
+
+CATALOG = {
+    "PATH": os.environ.get("CATALOG_PATH"),
+    "CHECK_INTERVAL": 5.0,
+}
+
+# Static copies of the anonymous catalog responses (`food/all`, `diet/all`,
+# `food/query`, `diet/query` in every language) written by `manage.py
+# prerender` for the host to serve without starting a worker. With DIRECTORY
+# set, writes to foods, nutrition, diets and meal plans are queued, and
+# `manage.py prerender --pending` re-renders only the pages built from them.
+# List pages cover PAGE_SIZE rows each (`@0:20`, `@20:20`, ...).
+
+PRERENDER = {
+    "DIRECTORY": os.environ.get("PRERENDER_DIR"),
+    "PAGE_SIZE": 20,
 }
 
 